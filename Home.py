@@ -123,7 +123,10 @@ def show_main_app():
 
     # Quick stats (if data exists)
     from database.db_manager import DatabaseManager
+    from services.cluster_refresh import get_refresh_scheduler
     db = DatabaseManager()
+    # Keeps stored batches aged to the current day
+    get_refresh_scheduler()
     latest_batch = db.get_latest_batch_id(auth.get_current_user_id())
 
     if latest_batch:
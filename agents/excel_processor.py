@@ -1,15 +1,21 @@
 """Excel file processor with validation."""
 
+import hashlib
+import math
+import numpy as np
 import pandas as pd
-from typing import Tuple, List, Dict, Optional
+from itertools import chain, islice
+from typing import Tuple, List, Dict, Optional, Iterator
+from openpyxl import load_workbook
 from utils.validators import (
-    validate_phone_number,
-    validate_date_format,
-    validate_date_range,
-    validate_customer_name,
+    MAX_FILE_SIZE_MB,
+    STREAMING_MAX_FILE_SIZE_MB,
     validate_file_size,
     validate_file_extension
 )
+from utils.column_validators import parse_date_column, validate_member_columns
+from utils.xlsx_columns import UnsupportedSheet, read_column
+from utils import tracing
 
 
 class ExcelProcessor:
@@ -22,13 +28,22 @@ class ExcelProcessor:
         'end_date': ['subscription end date', 'end date', 'expiry date', 'expiry', 'end']
     }
 
+    # Rows per chunk in streaming mode
+    CHUNK_SIZE = 10000
+
+    # Bytes read at a time when hashing an upload
+    HASH_CHUNK_BYTES = 1024 * 1024
+
     def __init__(self):
         """Initialize processor."""
         self.df = None
         self.errors = []
         self.warnings = []
+        self.total_rows = 0
+        self.expected_rows = 0
+        self.content_hash = None
 
-    def validate_file(self, uploaded_file) -> Tuple[bool, str]:
+    def validate_file(self, uploaded_file, max_size_mb: Optional[int] = None) -> Tuple[bool, str]:
         """
         Validate uploaded file.
         Returns (is_valid, error_message).
@@ -39,12 +54,32 @@ class ExcelProcessor:
             return False, error
 
         # Check file size
-        is_valid, error = validate_file_size(uploaded_file.size)
+        is_valid, error = validate_file_size(uploaded_file.size, max_size_mb or MAX_FILE_SIZE_MB)
         if not is_valid:
             return False, error
 
         return True, ""
 
+    def hash_content(self, uploaded_file) -> str:
+        """
+        SHA-256 of the uploaded bytes, read in HASH_CHUNK_BYTES blocks.
+
+        The file is read from the start and left where it was, so parsing
+        can follow. The digest is also kept in self.content_hash.
+        """
+        position = uploaded_file.tell()
+        uploaded_file.seek(0)
+
+        digest = hashlib.sha256()
+        try:
+            for block in iter(lambda: uploaded_file.read(self.HASH_CHUNK_BYTES), b''):
+                digest.update(block)
+        finally:
+            uploaded_file.seek(position)
+
+        self.content_hash = digest.hexdigest()
+        return self.content_hash
+
     def find_column(self, possible_names: List[str], df_columns: List[str]) -> Optional[str]:
         """Find matching column name (case-insensitive)."""
         df_columns_lower = [col.lower().strip() for col in df_columns]
@@ -57,6 +92,23 @@ class ExcelProcessor:
 
         return None
 
+    def resolve_columns(self, columns: List[str]) -> Tuple[Dict[str, str], List[str]]:
+        """
+        Map REQUIRED_COLUMNS to the file's header names.
+        Returns (column_mapping, missing_columns).
+        """
+        column_mapping = {}
+        missing_columns = []
+
+        for key, possible_names in self.REQUIRED_COLUMNS.items():
+            found_column = self.find_column(possible_names, columns)
+            if found_column:
+                column_mapping[key] = found_column
+            else:
+                missing_columns.append(possible_names[0])
+
+        return column_mapping, missing_columns
+
     def load_and_validate(self, uploaded_file) -> Tuple[bool, str, Optional[pd.DataFrame]]:
         """
         Load Excel file and validate structure.
@@ -71,15 +123,7 @@ class ExcelProcessor:
                 return False, "Excel file is empty", None
 
             # Find required columns
-            column_mapping = {}
-            missing_columns = []
-
-            for key, possible_names in self.REQUIRED_COLUMNS.items():
-                found_column = self.find_column(possible_names, self.df.columns.tolist())
-                if found_column:
-                    column_mapping[key] = found_column
-                else:
-                    missing_columns.append(possible_names[0])
+            column_mapping, missing_columns = self.resolve_columns(self.df.columns.tolist())
 
             # Check for missing columns
             if missing_columns:
@@ -94,88 +138,289 @@ class ExcelProcessor:
         except Exception as e:
             return False, f"Error reading Excel file: {str(e)}", None
 
-    def validate_and_clean_data(self, df: pd.DataFrame) -> Tuple[pd.DataFrame, List[Dict]]:
+    @staticmethod
+    def _convert_cell(value):
+        """Convert an openpyxl cell value the way pd.read_excel does."""
+        if value is None:
+            return math.nan
+        if isinstance(value, float) and value.is_integer():
+            return int(value)
+        return value
+
+    @staticmethod
+    def _without_trailing_blank_rows(rows: Iterator[tuple]) -> Iterator[tuple]:
+        """
+        Rows up to the last one with a value, as pd.read_excel returns them.
+
+        A run of blank rows is held back (as a count) until a row with a
+        value follows it, so only trailing blank rows are dropped.
+        """
+        blank_rows = 0
+        for row in rows:
+            if any(value is not None for value in row):
+                for _ in range(blank_rows):
+                    yield ()
+                blank_rows = 0
+                yield row
+            else:
+                blank_rows += 1
+
+    def load_stream(self, uploaded_file, chunk_size: Optional[int] = None
+                    ) -> Tuple[bool, str, Optional[Iterator[pd.DataFrame]]]:
+        """
+        Open Excel file in read-only mode and validate its header.
+
+        Rows are read lazily with openpyxl's values-only iteration, so memory
+        stays flat regardless of file size. Each chunk is a DataFrame with
+        the standard column names, indexed by data row position like
+        pd.read_excel: blank rows between data rows are kept (as all-NaN
+        rows, so row numbers match the sheet), trailing blank rows are not.
+
+        Returns (is_valid, message, chunk_iterator).
+        """
+        chunk_size = chunk_size or self.CHUNK_SIZE
+
+        try:
+            workbook = load_workbook(uploaded_file, read_only=True, data_only=True)
+        except Exception as e:
+            return False, f"Error reading Excel file: {str(e)}", None
+
+        try:
+            sheet = workbook.active
+            # From the sheet's stored dimensions (0 if missing); blank rows included
+            self.expected_rows = max((sheet.max_row or 1) - 1, 0)
+            rows = sheet.iter_rows(values_only=True)
+            header = next(rows, None)
+            if header is None:
+                workbook.close()
+                return False, "Excel file is empty", None
+
+            columns = [
+                str(name) if name is not None else f"Unnamed: {i}"
+                for i, name in enumerate(header)
+            ]
+
+            # Find required columns
+            column_mapping, missing_columns = self.resolve_columns(columns)
+            if missing_columns:
+                workbook.close()
+                return False, f"Missing required columns: {', '.join(missing_columns)}", None
+
+            positions = {key: columns.index(name) for key, name in column_mapping.items()}
+
+            data_rows = self._without_trailing_blank_rows(rows)
+            first_row = next(data_rows, None)
+            if first_row is None:
+                workbook.close()
+                return False, "Excel file is empty", None
+        except Exception as e:
+            workbook.close()
+            return False, f"Error reading Excel file: {str(e)}", None
+
+        def iter_chunks() -> Iterator[pd.DataFrame]:
+            remaining = chain([first_row], data_rows)
+            start = 0
+            try:
+                while True:
+                    chunk = list(islice(remaining, chunk_size))
+                    if not chunk:
+                        break
+
+                    yield pd.DataFrame(
+                        {
+                            key: [
+                                self._convert_cell(row[pos]) if pos < len(row) else math.nan
+                                for row in chunk
+                            ]
+                            for key, pos in positions.items()
+                        },
+                        index=pd.RangeIndex(start, start + len(chunk)),
+                        dtype=object
+                    )
+                    start += len(chunk)
+                    self.total_rows = start
+            finally:
+                workbook.close()
+
+        return True, "File header validated", iter_chunks()
+
+    def stream_and_validate(self, uploaded_file, chunk_size: Optional[int] = None
+                            ) -> Tuple[bool, str, Optional[Iterator[Tuple[pd.DataFrame, List[str]]]]]:
+        """
+        Stream the file through validation chunk by chunk.
+
+        Returns (is_valid, message, iterator of (cleaned_chunk, chunk_errors)).
+        Error row numbers refer to positions in the whole file.
+        """
+        is_valid, message, chunks = self.load_stream(uploaded_file, chunk_size)
+        if not is_valid:
+            return False, message, None
+
+        return True, message, (self.validate_and_clean_data(chunk) for chunk in chunks)
+
+    def validate_and_clean_data(self, df: pd.DataFrame) -> Tuple[pd.DataFrame, List[str]]:
         """
         Validate and clean data.
         Returns (cleaned_dataframe, list_of_errors).
+
+        Validation runs column by column (see utils.column_validators);
+        each invalid row contributes one "Row N: ..." error.
         """
-        errors = []
-        valid_rows = []
+        return validate_member_columns(df)
 
-        for idx, row in df.iterrows():
-            row_errors = []
-            row_num = idx + 2  # Excel row number (1-indexed + header)
+    def load_end_dates(self, uploaded_file) -> Tuple[bool, str, Optional[pd.Series]]:
+        """
+        Read only the end date column, for a dry run.
 
-            # Validate customer name
-            is_valid, error = validate_customer_name(row['customer_name'])
-            if not is_valid:
-                row_errors.append(f"Row {row_num}: {error}")
-                continue
+        The header must have every required column, as for a full upload,
+        but only the end dates are read: straight from the sheet XML (see
+        utils.xlsx_columns), or with load_stream for sheets that reader
+        does not handle.
 
-            # Validate phone number
-            is_valid, error, formatted_phone = validate_phone_number(row['phone_number'])
-            if not is_valid:
-                row_errors.append(f"Row {row_num}: {error}")
-                continue
+        Returns (is_valid, message, end_dates). end_dates holds the raw
+        values, indexed by data row position like load_stream's chunks
+        (blank rows before the last data row included, as None).
+        """
+        missing_columns = []
 
-            # Validate start date
-            is_valid, error, start_date = validate_date_format(row['start_date'])
-            if not is_valid:
-                row_errors.append(f"Row {row_num}: Start date - {error}")
-                continue
+        def pick(columns: List[str]) -> Optional[int]:
+            column_mapping, missing = self.resolve_columns(columns)
+            missing_columns.extend(missing)
+            return None if missing else columns.index(column_mapping['end_date'])
 
-            # Validate end date
-            is_valid, error, end_date = validate_date_format(row['end_date'])
+        try:
+            header, rows, values = read_column(uploaded_file, pick)
+        except UnsupportedSheet:
+            uploaded_file.seek(0)
+            is_valid, message, chunks = self.load_stream(uploaded_file)
             if not is_valid:
-                row_errors.append(f"Row {row_num}: End date - {error}")
-                continue
+                return False, message, None
+            end_dates = pd.concat([chunk['end_date'] for chunk in chunks])
+            return True, f"Successfully loaded {len(end_dates)} rows", end_dates
+        except Exception as e:
+            return False, f"Error reading Excel file: {str(e)}", None
 
-            # Validate date range
-            is_valid, error = validate_date_range(start_date, end_date)
-            if not is_valid:
-                row_errors.append(f"Row {row_num}: {error}")
-                continue
-
-            # If all validations passed, add to valid rows
-            if not row_errors:
-                valid_rows.append({
-                    'customer_name': str(row['customer_name']).strip(),
-                    'phone_number': formatted_phone,
-                    'subscription_start_date': start_date.strftime('%Y-%m-%d'),
-                    'subscription_end_date': end_date.strftime('%Y-%m-%d'),
-                })
-            else:
-                errors.extend(row_errors)
+        if missing_columns:
+            return False, f"Missing required columns: {', '.join(missing_columns)}", None
+        if not values:
+            return False, "Excel file is empty", None
 
-        # Create cleaned dataframe
-        cleaned_df = pd.DataFrame(valid_rows) if valid_rows else pd.DataFrame()
+        # Data rows start below the header on row 1
+        end_dates = np.full(rows[-1] - 1, None, dtype=object)
+        end_dates[np.array(rows) - 2] = values
 
-        return cleaned_df, errors
+        self.expected_rows = self.total_rows = len(end_dates)
+        return True, f"Successfully loaded {len(end_dates)} rows", pd.Series(end_dates, dtype=object)
 
-    def process_file(self, uploaded_file) -> Tuple[bool, str, Optional[pd.DataFrame], List[str]]:
+    def process_end_dates(self, uploaded_file) -> Tuple[bool, str, Optional[pd.DataFrame], List[str]]:
+        """
+        Dry-run counterpart of process_file: read and validate end dates only.
+
+        Names, phone numbers and start dates are not read, so rows failing
+        only those checks are still counted.
+
+        Returns (success, message, dataframe, errors). The dataframe has a
+        datetime64 subscription_end_date column, indexed by data row
+        position; error row numbers are Excel row numbers.
+        """
+        with tracing.span("excel.validate_file"):
+            is_valid, error = self.validate_file(uploaded_file, STREAMING_MAX_FILE_SIZE_MB)
+        if not is_valid:
+            return False, error, None, [error]
+
+        with tracing.span("excel.read_end_dates") as read_span:
+            is_valid, message, end_dates = self.load_end_dates(uploaded_file)
+            read_span.rows = len(end_dates) if end_dates is not None else 0
+        if not is_valid:
+            return False, message, None, [message]
+
+        with tracing.span("excel.validate", rows=len(end_dates)):
+            parsed, date_errors, _ = parse_date_column(end_dates.to_numpy(dtype=object))
+
+        row_nums = end_dates.index + 2
+        errors = [f"Row {row_nums[pos]}: End date - {error}" for pos, error in sorted(date_errors.items())]
+
+        # Dates pandas cannot hold (beyond year 2262) are left out along with the errors
+        valid = parsed.notna().to_numpy()
+        if not valid.any():
+            return False, "No valid rows found after validation", None, errors
+
+        cleaned_df = pd.DataFrame(
+            {'subscription_end_date': parsed.to_numpy()[valid]},
+            index=end_dates.index[valid]
+        )
+        return True, self.summary_message(len(cleaned_df), len(end_dates), len(errors)), cleaned_df, errors
+
+    def process_file(self, uploaded_file, streaming: bool = False
+                     ) -> Tuple[bool, str, Optional[pd.DataFrame], List[str]]:
         """
         Complete file processing pipeline.
         Returns (success, message, cleaned_dataframe, errors).
+
+        With streaming=True the workbook is read in read-only mode chunk by
+        chunk (see load_stream), which allows files up to
+        STREAMING_MAX_FILE_SIZE_MB. The file's SHA-256 is left in
+        self.content_hash, to spot re-uploads of the same file.
         """
         # Validate file
-        is_valid, error = self.validate_file(uploaded_file)
+        max_size_mb = STREAMING_MAX_FILE_SIZE_MB if streaming else MAX_FILE_SIZE_MB
+        with tracing.span("excel.validate_file"):
+            is_valid, error = self.validate_file(uploaded_file, max_size_mb)
         if not is_valid:
             return False, error, None, [error]
 
-        # Load file
-        is_valid, message, df = self.load_and_validate(uploaded_file)
-        if not is_valid:
-            return False, message, None, [message]
+        with tracing.span("excel.hash"):
+            self.hash_content(uploaded_file)
 
-        # Validate and clean data
-        cleaned_df, errors = self.validate_and_clean_data(df)
+        if streaming:
+            with tracing.span("excel.open"):
+                is_valid, message, chunks = self.load_stream(uploaded_file)
+            if not is_valid:
+                return False, message, None, [message]
+
+            cleaned_chunks = []
+            errors = []
+            while True:
+                with tracing.span("excel.read_chunk") as read_span:
+                    chunk = next(chunks, None)
+                    read_span.rows = len(chunk) if chunk is not None else 0
+                if chunk is None:
+                    break
+
+                with tracing.span("excel.validate_chunk", rows=len(chunk)):
+                    cleaned_chunk, chunk_errors = self.validate_and_clean_data(chunk)
+                if not cleaned_chunk.empty:
+                    cleaned_chunks.append(cleaned_chunk)
+                errors.extend(chunk_errors)
+
+            with tracing.span("excel.concat") as concat_span:
+                cleaned_df = pd.concat(cleaned_chunks, ignore_index=True) if cleaned_chunks else pd.DataFrame()
+                concat_span.rows = len(cleaned_df)
+            total_rows = self.total_rows
+        else:
+            # Load file
+            with tracing.span("excel.load") as load_span:
+                is_valid, message, df = self.load_and_validate(uploaded_file)
+                load_span.rows = len(df) if df is not None else 0
+            if not is_valid:
+                return False, message, None, [message]
+
+            # Validate and clean data
+            with tracing.span("excel.validate", rows=len(df)):
+                cleaned_df, errors = self.validate_and_clean_data(df)
+            total_rows = len(df)
 
         if cleaned_df.empty:
             return False, "No valid rows found after validation", None, errors
 
-        success_message = f"✅ Processed {len(cleaned_df)} out of {len(df)} rows successfully"
+        return True, self.summary_message(len(cleaned_df), total_rows, len(errors)), cleaned_df, errors
+
+    @staticmethod
+    def summary_message(valid_rows: int, total_rows: int, error_count: int) -> str:
+        """Message shown once a file has been read and validated."""
+        message = f"✅ Processed {valid_rows} out of {total_rows} rows successfully"
 
-        if errors:
-            success_message += f"\n⚠️ {len(errors)} rows had errors and were skipped"
+        if error_count:
+            message += f"\n⚠️ {error_count} rows had errors and were skipped"
 
-        return True, success_message, cleaned_df, errors
+        return message
@@ -1,55 +1,211 @@
 """LangGraph agent for subscription processing."""
 
+import contextvars
+import os
+import queue
+import threading
+import time
 import uuid
-from typing import Dict, List, TypedDict
+from collections.abc import Sequence
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple, TypedDict
 from langgraph.graph import StateGraph, END
+import numpy as np
 import pandas as pd
 from utils.date_helpers import (
-    calculate_days_remaining,
-    classify_by_expiry,
-    get_expiry_text,
-    format_date_indian
+    calculate_days_remaining_series,
+    classify_by_expiry_series,
+    get_current_date_ist
 )
+from utils.column_validators import validate_phone_column
+from services.cluster_refresh import ClusterRefresher
+from services.export_cache import get_export_cache
 from services.message_generator import MessageGenerator
 from database.db_manager import DatabaseManager
+from utils import tracing
+
+
+class FrameRecords(Sequence):
+    """
+    Read-only list-of-dicts view over DataFrame columns.
+
+    Records are built on access, so the workflow can hand out "lists" of
+    messages or subscriptions without duplicating the frame.
+    """
+
+    def __init__(self, frame: pd.DataFrame, fields: Dict[str, str],
+                 constants: Optional[Dict[str, Any]] = None):
+        """
+        Args:
+            frame: Source frame
+            fields: Record key -> frame column
+            constants: Record key -> value shared by every record
+        """
+        self.frame = frame
+        self.fields = fields
+        self.constants = constants or {}
+
+    def __len__(self) -> int:
+        return len(self.frame)
+
+    def _records(self, rows: slice) -> List[Dict]:
+        columns = [self.frame[column].iloc[rows].tolist() for column in self.fields.values()]
+        return [
+            {**self.constants, **dict(zip(self.fields, values))}
+            for values in zip(*columns)
+        ]
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return self._records(index)
+
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("record index out of range")
+        return self._records(slice(index, index + 1))[0]
+
+    def __iter__(self) -> Iterator[Dict]:
+        columns = [self.frame[column].tolist() for column in self.fields.values()]
+        for values in zip(*columns):
+            yield {**self.constants, **dict(zip(self.fields, values))}
+
+
+# Record layouts over the workflow frame
+MESSAGE_FIELDS = {
+    'customer_name': 'customer_name',
+    'phone_number': 'phone_number',
+    'subscription_end_date': 'subscription_end_date',
+    'days_remaining': 'days_remaining',
+    'cluster': 'cluster',
+    'message': 'message',
+}
+
+# Workflow stages in execution order
+WORKFLOW_STAGES = [
+    "calculate_days",
+    "classify_clusters",
+    "generate_messages",
+    "save_to_database",
+]
+
+# Delta uploads first diff the file against the stored members
+DELTA_WORKFLOW_STAGES = ["diff_members", *WORKFLOW_STAGES]
+
+# Uploaded columns fingerprinted per row to spot changed members
+MEMBER_SOURCE_COLUMNS = [
+    'customer_name',
+    'phone_number',
+    'subscription_start_date',
+    'subscription_end_date',
+]
+
+# Called as callback(stage, fraction_of_stages_done, stage_timings)
+ProgressCallback = Callable[[str, float, Dict[str, float]], None]
+
+# Called as callback(rows_saved_so_far, stage_timings) after each streamed chunk
+ChunkCallback = Callable[[int, Dict[str, float]], None]
+
+# Streaming mode: chunks read ahead of the one being processed, messages
+# kept in the result, and the timing key for reading the source
+STREAM_PREFETCH_CHUNKS = 2
+STREAM_PREVIEW_MESSAGES = 100
+STREAM_SOURCE_STAGE = "parse_file"
+
+# Dry runs: listed members shown as a sample
+DRY_RUN_PREVIEW_ROWS = 5
+
+SUBSCRIPTION_FIELDS = {
+    'customer_name': 'customer_name',
+    'phone_number': 'phone_number',
+    'subscription_start_date': 'subscription_start_date',
+    'subscription_end_date': 'subscription_end_date',
+    'days_remaining': 'days_remaining',
+    'cluster': 'cluster',
+}
 
 
 class SubscriptionState(TypedDict):
-    """State for subscription processing workflow."""
+    """
+    State for subscription processing workflow.
+
+    Everything specific to one upload (tenant, templates, database) lives
+    here, so a single compiled workflow serves every upload.
+    """
     user_id: int
     gym_name: str
+    templates: Optional[Dict[int, str]]
+    db: DatabaseManager
     data: pd.DataFrame
     batch_id: str
-    processed_subscriptions: List[Dict]
-    messages: List[Dict]
+    filename: str
+    total_rows: int
+    as_of_date: datetime
+    processed_subscriptions: Sequence
+    upcoming: Optional[pd.DataFrame]
+    base_batch_id: Optional[str]
+    listed_phones: Optional[pd.Series]
+    removed: Optional[pd.DataFrame]
+    delta_counts: Dict[str, int]
+    messages: Sequence
     cluster_counts: Dict[int, int]
     total_processed: int
+    stage_timings: Dict[str, float]
+    progress_callback: Optional[ProgressCallback]
     error: str
 
 
 class SubscriptionAgent:
     """LangGraph agent for processing gym subscriptions."""
 
-    def __init__(self, user_id: int, gym_name: str):
-        """Initialize agent."""
+    def __init__(self, user_id: Optional[int] = None, gym_name: Optional[str] = None,
+                 db: Optional[DatabaseManager] = None, build_exports: bool = True,
+                 templates: Optional[Dict[int, str]] = None):
+        """
+        Initialize agent.
+
+        The agent holds no per-upload state and is safe to share between
+        threads (see get_agent). user_id, gym_name and templates are only
+        defaults for process().
+
+        Args:
+            build_exports: Queue the batch's export files for building once
+                it is saved (see services.export_cache)
+            templates: Message templates by cluster (default: MessageGenerator's)
+        """
         self.user_id = user_id
         self.gym_name = gym_name
-        self.db = DatabaseManager()
-        self.message_gen = MessageGenerator(gym_name)
-        self.workflow = self._create_workflow()
+        self.templates = templates
+        self.db = db or DatabaseManager()
+        self.build_exports = build_exports
+        self.workflow = get_workflow()
+
+    @classmethod
+    def _create_workflow(cls, save_node: Optional[Callable[[SubscriptionState], Dict]] = None,
+                         diff_node: Optional[Callable[[SubscriptionState], Dict]] = None):
+        """
+        Create and compile the LangGraph workflow.
 
-    def _create_workflow(self) -> StateGraph:
-        """Create LangGraph workflow."""
+        Args:
+            save_node: Last node (default: save the whole upload with its history)
+            diff_node: First node, run before calculate_days (default: none)
+        """
         workflow = StateGraph(SubscriptionState)
+        stages = DELTA_WORKFLOW_STAGES if diff_node else WORKFLOW_STAGES
 
         # Add nodes
-        workflow.add_node("calculate_days", self._calculate_days_node)
-        workflow.add_node("classify_clusters", self._classify_clusters_node)
-        workflow.add_node("generate_messages", self._generate_messages_node)
-        workflow.add_node("save_to_database", self._save_to_database_node)
+        workflow.add_node("calculate_days", cls._timed("calculate_days", cls._calculate_days_node, stages))
+        workflow.add_node("classify_clusters", cls._timed("classify_clusters", cls._classify_clusters_node, stages))
+        workflow.add_node("generate_messages", cls._timed("generate_messages", cls._generate_messages_node, stages))
+        workflow.add_node("save_to_database", cls._timed("save_to_database", save_node or cls._save_to_database_node, stages))
 
         # Add edges
-        workflow.set_entry_point("calculate_days")
+        if diff_node:
+            workflow.add_node("diff_members", cls._timed("diff_members", diff_node, stages))
+            workflow.set_entry_point("diff_members")
+            workflow.add_edge("diff_members", "calculate_days")
+        else:
+            workflow.set_entry_point("calculate_days")
         workflow.add_edge("calculate_days", "classify_clusters")
         workflow.add_edge("classify_clusters", "generate_messages")
         workflow.add_edge("generate_messages", "save_to_database")
@@ -57,155 +213,418 @@ class SubscriptionAgent:
 
         return workflow.compile()
 
-    def _calculate_days_node(self, state: SubscriptionState) -> SubscriptionState:
+    @classmethod
+    def _create_chunk_workflow(cls):
+        """Create the workflow run on each chunk of a streamed upload."""
+        return cls._create_workflow(save_node=cls._save_chunk_node)
+
+    @classmethod
+    def _create_delta_workflow(cls):
+        """Create the workflow of a delta upload (only changed members are processed)."""
+        return cls._create_workflow(save_node=cls._save_delta_node, diff_node=cls._diff_members_node)
+
+    @staticmethod
+    def _timed(stage: str, node: Callable[[SubscriptionState], Dict],
+               stages: List[str] = WORKFLOW_STAGES) -> Callable[[SubscriptionState], Dict]:
+        """Wrap a node to record its wall time and report progress."""
+        position = stages.index(stage)
+
+        def run(state: SubscriptionState) -> Dict:
+            callback = state.get('progress_callback')
+            if callback:
+                callback(stage, position / len(stages), state['stage_timings'])
+
+            start = time.perf_counter()
+            with tracing.span(f"node.{stage}") as node_span:
+                update = node(state)
+                node_span.rows = len(update.get('data', state['data']))
+            stage_timings = {**state['stage_timings'], stage: time.perf_counter() - start}
+
+            if callback:
+                callback(stage, (position + 1) / len(stages), stage_timings)
+
+            return {**update, 'stage_timings': stage_timings}
+
+        return run
+
+    # Nodes add columns to state['data'] in place and return only the state
+    # keys they change; process() hands the workflow a shallow copy of the
+    # caller's frame so the caller's columns are never touched. They read
+    # everything else from the state, so the compiled graph is shared.
+
+    @staticmethod
+    def _diff_members_node(state: SubscriptionState) -> Dict:
+        """Node 0 (delta uploads): Keep only rows that are new or changed since the last upload."""
+        df = state['data']
+        db = state['db']
+        user_id = state['user_id']
+
+        # One row per member; a phone listed twice keeps its last row
+        df['phone_key'] = phone_keys(df['phone_number'])
+        duplicated = df['phone_key'].duplicated(keep='last').to_numpy()
+        if duplicated.any():
+            df = df.take(np.flatnonzero(~duplicated))
+        df['row_hash'] = member_row_hashes(df)
+
+        # Age the live batch first, so unchanged members agree with today's rows
+        base_batch_id = db.get_member_batch_id(user_id)
+        if base_batch_id:
+            ClusterRefresher(db, build_exports=False).refresh_batch(
+                base_batch_id, state['gym_name'], state['as_of_date'], templates=state['templates']
+            )
+
+        # Nullable integers, so unmatched rows do not turn the hashes into floats
+        current = pd.DataFrame(
+            db.get_members(user_id), columns=['id', 'phone_key', 'row_hash', 'subscription_id']
+        ).astype({'id': 'Int64', 'row_hash': 'Int64', 'subscription_id': 'Int64'}).set_index('phone_key')
+        matched = current.reindex(df['phone_key'].to_numpy())
+        unchanged = (matched['row_hash'] == df['row_hash'].to_numpy()).fillna(False).to_numpy(dtype=bool)
+
+        # 0 marks a new member
+        df['member_id'] = matched['id'].fillna(0).to_numpy(dtype='int64')
+        df['subscription_id'] = matched['subscription_id'].fillna(0).to_numpy(dtype='int64')
+
+        # Members whose rows failed validation are still listed, so they stay
+        listed = state.get('listed_phones')
+        listed_keys = df['phone_key'] if listed is None else phone_keys(
+            validate_phone_column(listed.to_numpy(dtype=object))[2]
+        )
+        removed = current[~current.index.isin(listed_keys)].reset_index()
+        changed = df.take(np.flatnonzero(~unchanged))
+        inserted = int((changed['member_id'] == 0).sum())
+
+        return {
+            'data': changed,
+            'base_batch_id': base_batch_id or state['batch_id'],
+            'removed': removed,
+            'delta_counts': {
+                'insert': inserted,
+                'update': len(changed) - inserted,
+                'remove': len(removed),
+                'unchanged': int(unchanged.sum()),
+                'duplicate': int(duplicated.sum()),
+            }
+        }
+
+    @staticmethod
+    def _calculate_days_node(state: SubscriptionState) -> Dict:
         """Node 1: Calculate days remaining for each subscription."""
-        df = state['data'].copy()
+        df = state['data']
 
-        # Calculate days remaining
-        df['days_remaining'] = df['subscription_end_date'].apply(calculate_days_remaining)
+        # Calculate days remaining against one "today" for the whole run
+        df['days_remaining'] = calculate_days_remaining_series(
+            df['subscription_end_date'], state['as_of_date']
+        )
 
-        state['data'] = df
-        return state
+        return {'data': df}
 
-    def _classify_clusters_node(self, state: SubscriptionState) -> SubscriptionState:
+    @staticmethod
+    def _classify_clusters_node(state: SubscriptionState) -> Dict:
         """Node 2: Classify subscriptions into expiry clusters."""
-        df = state['data'].copy()
+        df = state['data']
 
         # Classify into clusters
-        df['cluster'] = df['days_remaining'].apply(classify_by_expiry)
+        df['cluster'] = classify_by_expiry_series(df['days_remaining'])
 
-        # Filter out cluster 0 (>30 days, skip)
-        df = df[df['cluster'] > 0]
+        # Set cluster 0 (>30 days) aside: stored without a message until the
+        # daily refresh moves them in; only copies rows when there are some
+        keep = df['cluster'].to_numpy() > 0
+        upcoming = None
+        if not keep.all():
+            upcoming = df.take(np.flatnonzero(~keep))
+            df = df.take(np.flatnonzero(keep))
 
         # Count clusters
         cluster_counts = df['cluster'].value_counts().to_dict()
 
-        state['data'] = df
-        state['cluster_counts'] = cluster_counts
-        state['total_processed'] = len(df)
-
-        return state
+        return {
+            'data': df,
+            'upcoming': upcoming,
+            'cluster_counts': cluster_counts,
+            'total_processed': len(df)
+        }
 
-    def _generate_messages_node(self, state: SubscriptionState) -> SubscriptionState:
+    @staticmethod
+    def _generate_messages_node(state: SubscriptionState) -> Dict:
         """Node 3: Generate personalized messages for each member."""
-        df = state['data'].copy()
-
-        messages = []
-
-        for _, row in df.iterrows():
-            # Get expiry text
-            expiry_text = get_expiry_text(row['days_remaining'])
-            formatted_date = format_date_indian(row['subscription_end_date'])
-
-            # Generate message
-            message = self.message_gen.generate_message(
-                cluster=row['cluster'],
-                customer_name=row['customer_name'],
-                expiry_text=expiry_text,
-                expiry_date=formatted_date,
-                days_remaining=row['days_remaining']
-            )
+        df = state['data']
 
-            messages.append({
-                'customer_name': row['customer_name'],
-                'phone_number': row['phone_number'],
-                'subscription_end_date': row['subscription_end_date'],
-                'days_remaining': row['days_remaining'],
-                'cluster': row['cluster'],
-                'message': message
-            })
+        # Render all messages column-wise, stored next to their row
+        message_gen = MessageGenerator(state['gym_name'], templates=state.get('templates'))
+        df['message'] = message_gen.render_batch(df)
 
-        state['messages'] = messages
-        return state
+        return {
+            'data': df,
+            'messages': FrameRecords(df, MESSAGE_FIELDS)
+        }
 
-    def _save_to_database_node(self, state: SubscriptionState) -> SubscriptionState:
-        """Node 4: Save subscriptions and messages to database."""
+    @staticmethod
+    def _save_to_database_node(state: SubscriptionState) -> Dict:
+        """Node 4: Save subscriptions, messages and upload history in one transaction."""
+        df = state['data']
         batch_id = state['batch_id']
         user_id = state['user_id']
 
-        # Prepare subscription records
-        subscription_records = []
-        for msg in state['messages']:
-            subscription_records.append({
-                'user_id': user_id,
-                'upload_batch_id': batch_id,
-                'customer_name': msg['customer_name'],
-                'phone_number': msg['phone_number'],
-                'subscription_start_date': state['data'][state['data']['customer_name'] == msg['customer_name']]['subscription_start_date'].iloc[0],
-                'subscription_end_date': msg['subscription_end_date'],
-                'days_remaining': msg['days_remaining'],
-                'cluster': msg['cluster']
-            })
-
-        # Save subscriptions
-        self.db.save_subscriptions(subscription_records)
-
-        # Get subscription IDs for message linking
-        saved_subscriptions = self.db.get_subscriptions_by_batch(batch_id)
+        # Every field comes from the same frame row, so no lookups are needed
+        subscription_records = FrameRecords(
+            df, SUBSCRIPTION_FIELDS,
+            constants={'user_id': user_id, 'upload_batch_id': batch_id}
+        )
+        message_records = FrameRecords(df, {'message_text': 'message', 'cluster': 'cluster'})
+
+        # Save everything atomically; IDs come back in record order
+        subscription_ids = state['db'].save_upload_batch(
+            user_id=user_id,
+            batch_id=batch_id,
+            filename=state['filename'],
+            total_rows=state['total_rows'],
+            subscriptions=subscription_records,
+            messages=message_records,
+            upcoming=SubscriptionAgent._upcoming_records(state)
+        )
+
+        df['subscription_id'] = subscription_ids
+
+        return {
+            'data': df,
+            'processed_subscriptions': FrameRecords(
+                df, {'id': 'subscription_id', **SUBSCRIPTION_FIELDS},
+                constants={'user_id': user_id, 'upload_batch_id': batch_id}
+            )
+        }
 
-        # Prepare message records
-        message_records = []
-        for i, msg in enumerate(state['messages']):
-            if i < len(saved_subscriptions):
-                message_records.append({
-                    'subscription_id': saved_subscriptions[i]['id'],
-                    'message_text': msg['message'],
-                    'cluster': msg['cluster']
-                })
+    @staticmethod
+    def _save_chunk_node(state: SubscriptionState) -> Dict:
+        """Node 4 (streaming): Commit one chunk's subscriptions and messages."""
+        df = state['data']
+        batch_id = state['batch_id']
 
-        # Save messages
-        self.db.save_messages(message_records)
+        state['db'].save_batch_chunk(
+            user_id=state['user_id'],
+            batch_id=batch_id,
+            subscriptions=FrameRecords(
+                df, SUBSCRIPTION_FIELDS,
+                constants={'user_id': state['user_id'], 'upload_batch_id': batch_id}
+            ),
+            messages=FrameRecords(df, {'message_text': 'message', 'cluster': 'cluster'}),
+            upcoming=SubscriptionAgent._upcoming_records(state)
+        )
+
+        return {'data': df}
+
+    @staticmethod
+    def _save_delta_node(state: SubscriptionState) -> Dict:
+        """Node 4 (delta uploads): Write only inserted, updated and removed members."""
+        df = state['data']
+        upcoming = state.get('upcoming')
+        constants = {'user_id': state['user_id'], 'upload_batch_id': state['base_batch_id']}
+        fields = {
+            **SUBSCRIPTION_FIELDS,
+            'member_id': 'member_id',
+            'subscription_id': 'subscription_id',
+            'phone_key': 'phone_key',
+            'row_hash': 'row_hash',
+        }
 
-        state['processed_subscriptions'] = saved_subscriptions
+        changed = list(FrameRecords(df, {**fields, 'message_text': 'message'}, constants))
+        if upcoming is not None:
+            changed.extend(FrameRecords(upcoming, fields, {**constants, 'message_text': None}))
+
+        processed = state['db'].apply_member_delta(
+            user_id=state['user_id'],
+            batch_id=state['batch_id'],
+            base_batch_id=state['base_batch_id'],
+            filename=state['filename'],
+            total_rows=state['total_rows'],
+            changed=changed,
+            removed=FrameRecords(state['removed'], {
+                'id': 'id', 'phone_key': 'phone_key', 'subscription_id': 'subscription_id'
+            })
+        )
+
+        return {'data': df, 'total_processed': processed}
+
+    @staticmethod
+    def _upcoming_records(state: SubscriptionState) -> Sequence:
+        """Subscription records of the cluster 0 members set aside by node 2."""
+        upcoming = state.get('upcoming')
+        if upcoming is None:
+            return ()
+        return FrameRecords(
+            upcoming, SUBSCRIPTION_FIELDS,
+            constants={'user_id': state['user_id'], 'upload_batch_id': state['batch_id']}
+        )
+
+    @staticmethod
+    def _working_frame(df: pd.DataFrame) -> pd.DataFrame:
+        """Frame the nodes may add columns to without touching the caller's."""
+        # The index is the row key joining messages back to their rows.
+        # A shallow copy shares the column data but keeps new columns ours.
+        if df.index.is_unique:
+            return df.copy(deep=False)
+        return df.reset_index(drop=True)
+
+    @staticmethod
+    def _dry_run(df: pd.DataFrame) -> Dict:
+        """
+        Cluster counts and a sample of listed members, without the workflow.
 
-        return state
+        Only subscription_end_date is used; nothing is rendered or saved.
+        """
+        days_remaining = calculate_days_remaining_series(
+            df['subscription_end_date'], get_current_date_ist().replace(tzinfo=None)
+        )
+        clusters = classify_by_expiry_series(days_remaining).to_numpy()
+
+        values, counts = np.unique(clusters, return_counts=True)
+        cluster_counts = {int(cluster): int(count) for cluster, count in zip(values, counts) if cluster > 0}
+
+        sample = np.flatnonzero(clusters > 0)[:DRY_RUN_PREVIEW_ROWS]
+        preview = [
+            {
+                # Excel row number, as in validation errors
+                'row': int(df.index[pos]) + 2,
+                'subscription_end_date': pd.Timestamp(df['subscription_end_date'].iat[pos]).strftime('%Y-%m-%d'),
+                'days_remaining': int(days_remaining.iat[pos]),
+                'cluster': int(clusters[pos]),
+            }
+            for pos in sample
+        ]
+
+        return {
+            'success': True,
+            'dry_run': True,
+            'total_processed': sum(cluster_counts.values()),
+            'cluster_counts': cluster_counts,
+            'beyond_window': int(len(clusters) - sum(cluster_counts.values())),
+            'preview': preview,
+            'messages': [],
+        }
 
-    def process(self, df: pd.DataFrame, filename: str) -> Dict:
+    def process(self, df: pd.DataFrame, filename: str,
+                progress_callback: Optional[ProgressCallback] = None,
+                batch_id: Optional[str] = None,
+                stage_timings: Optional[Dict[str, float]] = None,
+                user_id: Optional[int] = None,
+                gym_name: Optional[str] = None,
+                templates: Optional[Dict[int, str]] = None,
+                delta: bool = False,
+                listed_phones: Optional[pd.Series] = None,
+                dry_run: bool = False) -> Dict:
         """
         Process subscription data through the workflow.
 
         Args:
             df: Cleaned dataframe from Excel processor
             filename: Original filename
+            progress_callback: Optional callback(stage, fraction_done, stage_timings),
+                called before and after every workflow stage
+            batch_id: Batch ID to use (generated if not given), e.g. when the
+                caller already traced file parsing under it
+            stage_timings: Timings of earlier stages (e.g. parsing) to include
+                in the batch's timing breakdown
+            user_id, gym_name, templates: The uploading gym (default: the
+                agent's own)
+            delta: Diff the file against the gym's stored members (one per
+                phone number) and write only new, changed and removed
+                members into the gym's live batch, instead of saving a new
+                batch with every row
+            listed_phones: For a delta upload, the raw phone numbers of
+                every row in the file, including rows that failed
+                validation; members listed here are never removed
+                (default: the phone numbers in df)
+            dry_run: Only count members per cluster (df needs just
+                subscription_end_date, as strings or datetimes): no
+                messages, no database writes
 
         Returns:
-            Processing result dictionary
+            Processing result dictionary. For a delta upload, 'batch_id' is
+            the live batch (holding every current member), 'delta_batch_id'
+            the upload's own ID, 'delta' the member counts by change
+            ('insert', 'update', 'remove', 'unchanged', 'duplicate'), and
+            'messages' holds the new or changed members' messages only.
+            A dry run returns 'cluster_counts', 'total_processed',
+            'beyond_window' (members ending in more than 30 days) and a
+            'preview' of the first listed rows, with no batch_id.
         """
+        if dry_run:
+            try:
+                return self._dry_run(df)
+            except Exception as e:
+                return {
+                    'success': False,
+                    'error': str(e)
+                }
+
+        user_id = self.user_id if user_id is None else user_id
+        gym_name = gym_name or self.gym_name
+        if user_id is None or not gym_name:
+            raise ValueError("process() needs a user_id and gym_name")
+
         # Generate batch ID
-        batch_id = str(uuid.uuid4())
+        batch_id = batch_id or str(uuid.uuid4())
+
+        df = self._working_frame(df)
 
         # Initialize state
         initial_state = {
-            'user_id': self.user_id,
-            'gym_name': self.gym_name,
+            'user_id': user_id,
+            'gym_name': gym_name,
+            'templates': templates or self.templates,
+            'db': self.db,
             'data': df,
             'batch_id': batch_id,
+            'filename': filename,
+            'total_rows': len(df),
+            'as_of_date': get_current_date_ist().replace(tzinfo=None),
             'processed_subscriptions': [],
+            'upcoming': None,
+            'base_batch_id': None,
+            'listed_phones': listed_phones,
+            'removed': None,
+            'delta_counts': {},
             'messages': [],
             'cluster_counts': {},
             'total_processed': 0,
+            'stage_timings': dict(stage_timings or {}),
+            'progress_callback': progress_callback,
             'error': ''
         }
+        workflow = get_workflow('subscription_delta') if delta else self.workflow
 
         try:
-            # Run workflow
-            final_state = self.workflow.invoke(initial_state)
-
-            # Save upload history
-            self.db.save_upload_history(
-                user_id=self.user_id,
-                batch_id=batch_id,
-                filename=filename,
-                total_rows=len(df),
-                processed_rows=final_state['total_processed']
-            )
+            # Run workflow (the save node also records upload history)
+            with tracing.batch_trace(batch_id):
+                final_state = workflow.invoke(initial_state)
+                self.db.update_upload_timings(batch_id, final_state['stage_timings'])
+
+            if not delta:
+                if self.build_exports:
+                    get_export_cache(self.db).submit(batch_id)
+
+                return {
+                    'success': True,
+                    'batch_id': batch_id,
+                    'total_processed': final_state['total_processed'],
+                    'cluster_counts': final_state['cluster_counts'],
+                    'messages': final_state['messages'],
+                    'stage_timings': final_state['stage_timings']
+                }
+
+            # The live batch changed in place: rebuild its exports
+            live_batch_id = final_state['base_batch_id']
+            if self.build_exports:
+                get_export_cache(self.db).invalidate(live_batch_id)
 
             return {
                 'success': True,
-                'batch_id': batch_id,
+                'batch_id': live_batch_id,
+                'delta_batch_id': batch_id,
+                'delta': final_state['delta_counts'],
                 'total_processed': final_state['total_processed'],
-                'cluster_counts': final_state['cluster_counts'],
-                'messages': final_state['messages']
+                'cluster_counts': dict(self.db.get_cluster_counts(live_batch_id)),
+                'messages': final_state['messages'],
+                'stage_timings': final_state['stage_timings']
             }
 
         except Exception as e:
@@ -213,3 +632,228 @@ class SubscriptionAgent:
                 'success': False,
                 'error': str(e)
             }
+
+    def process_stream(self, chunks: Iterable[pd.DataFrame], filename: str,
+                       progress_callback: Optional[ChunkCallback] = None,
+                       batch_id: Optional[str] = None,
+                       stage_timings: Optional[Dict[str, float]] = None,
+                       user_id: Optional[int] = None,
+                       gym_name: Optional[str] = None,
+                       templates: Optional[Dict[int, str]] = None,
+                       preview_size: int = STREAM_PREVIEW_MESSAGES) -> Dict:
+        """
+        Process an upload chunk by chunk, committing each chunk as it is done.
+
+        Each cleaned chunk (e.g. from ExcelProcessor.stream_and_validate) runs
+        through the four stages and is saved in its own transaction, while
+        the next chunks are read on a background thread; at most
+        STREAM_PREFETCH_CHUNKS chunks wait, so memory does not grow with the
+        file. Upload history is recorded once the last chunk is saved, with
+        the same totals as process(); if any chunk fails, the chunks already
+        saved are deleted again.
+
+        Args:
+            chunks: Cleaned dataframes (empty ones are skipped)
+            filename: Original filename
+            progress_callback: Optional callback(rows_saved, stage_timings),
+                called after every chunk
+            batch_id, stage_timings, user_id, gym_name, templates: As for process()
+            preview_size: Number of messages returned in the result; the rest
+                are only in the database
+
+        Returns:
+            Processing result dictionary, as from process() except that
+            'messages' holds only the first preview_size messages.
+            Stage timings add up each stage over the chunks, with time spent
+            reading the source under STREAM_SOURCE_STAGE.
+        """
+        user_id = self.user_id if user_id is None else user_id
+        gym_name = gym_name or self.gym_name
+        if user_id is None or not gym_name:
+            raise ValueError("process_stream() needs a user_id and gym_name")
+
+        batch_id = batch_id or str(uuid.uuid4())
+        workflow = get_workflow('subscription_chunk')
+
+        # Shared by every chunk, so all rows are aged against the same day
+        chunk_state = {
+            'user_id': user_id,
+            'gym_name': gym_name,
+            'templates': templates or self.templates,
+            'db': self.db,
+            'batch_id': batch_id,
+            'filename': filename,
+            'as_of_date': get_current_date_ist().replace(tzinfo=None),
+            'processed_subscriptions': [],
+            'upcoming': None,
+            'messages': [],
+            'cluster_counts': {},
+            'total_processed': 0,
+            'progress_callback': None,
+            'error': ''
+        }
+
+        stage_timings = dict(stage_timings or {})
+        cluster_counts: Dict[int, int] = {}
+        messages: List[Dict] = []
+        total_rows = 0
+        total_processed = 0
+
+        try:
+            with tracing.batch_trace(batch_id):
+                for chunk, read_seconds in _prefetch(chunks, STREAM_PREFETCH_CHUNKS):
+                    stage_timings[STREAM_SOURCE_STAGE] = stage_timings.get(STREAM_SOURCE_STAGE, 0.0) + read_seconds
+                    if chunk.empty:
+                        continue
+
+                    final_state = workflow.invoke({
+                        **chunk_state,
+                        'data': self._working_frame(chunk),
+                        'total_rows': len(chunk),
+                        'stage_timings': {}
+                    })
+
+                    total_rows += len(chunk)
+                    total_processed += final_state['total_processed']
+                    for stage, seconds in final_state['stage_timings'].items():
+                        stage_timings[stage] = stage_timings.get(stage, 0.0) + seconds
+                    for cluster, count in final_state['cluster_counts'].items():
+                        cluster_counts[cluster] = cluster_counts.get(cluster, 0) + count
+                    if len(messages) < preview_size:
+                        messages.extend(final_state['messages'][:preview_size - len(messages)])
+
+                    if progress_callback:
+                        progress_callback(total_rows, stage_timings)
+
+                if total_rows == 0:
+                    raise ValueError("No valid rows found after validation")
+
+                self.db.save_upload_history(user_id, batch_id, filename, total_rows, total_processed)
+                self.db.update_upload_timings(batch_id, stage_timings)
+
+            if self.build_exports:
+                get_export_cache(self.db).submit(batch_id)
+
+            return {
+                'success': True,
+                'batch_id': batch_id,
+                'total_processed': total_processed,
+                'cluster_counts': cluster_counts,
+                'messages': messages,
+                'stage_timings': stage_timings
+            }
+
+        except Exception as e:
+            try:
+                self.db.delete_batch_rows(batch_id)
+            except Exception:
+                pass
+            return {
+                'success': False,
+                'error': str(e)
+            }
+
+
+def phone_keys(phones: pd.Series) -> pd.Series:
+    """Member identity of each phone number: its last 10 digits, as validate_phone_number keeps them."""
+    return phones.astype(str).str.replace(r'\D', '', regex=True).str[-10:]
+
+
+def member_row_hashes(frame: pd.DataFrame) -> np.ndarray:
+    """64-bit fingerprint of each row's MEMBER_SOURCE_COLUMNS, stable across processes."""
+    return pd.util.hash_pandas_object(frame[MEMBER_SOURCE_COLUMNS], index=False).to_numpy().view('int64')
+
+
+_PREFETCH_DONE = object()
+
+
+def _prefetch(chunks: Iterable[pd.DataFrame], depth: int) -> Iterator[Tuple[pd.DataFrame, float]]:
+    """
+    Read chunks on a background thread, at most `depth` ahead of the consumer.
+
+    Yields (chunk, seconds spent producing it). An exception raised while
+    reading is re-raised in the consumer; closing the generator early stops
+    the reader.
+    """
+    buffer: queue.Queue = queue.Queue(maxsize=depth)
+    stop = threading.Event()
+
+    def put(item) -> bool:
+        while not stop.is_set():
+            try:
+                buffer.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def read():
+        try:
+            source = iter(chunks)
+            while True:
+                start = time.perf_counter()
+                chunk = next(source, None)
+                if chunk is None or not put((chunk, time.perf_counter() - start)):
+                    break
+            put(_PREFETCH_DONE)
+        except BaseException as e:
+            put(e)
+
+    # Run in a copy of our context so the reader's spans join the batch trace
+    reader = threading.Thread(target=contextvars.copy_context().run, args=(read,),
+                              name="hercules-prefetch", daemon=True)
+    reader.start()
+
+    try:
+        while True:
+            item = buffer.get()
+            if item is _PREFETCH_DONE:
+                break
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+    finally:
+        stop.set()
+        reader.join()
+
+
+_workflows: Dict[str, Any] = {}
+_workflows_lock = threading.Lock()
+
+_agents: Dict[Tuple[str, bool], SubscriptionAgent] = {}
+_agents_lock = threading.Lock()
+
+# Workflow name -> function building the compiled graph
+WORKFLOW_BUILDERS: Dict[str, Callable[[], Any]] = {
+    'subscription': SubscriptionAgent._create_workflow,
+    'subscription_chunk': SubscriptionAgent._create_chunk_workflow,
+    'subscription_delta': SubscriptionAgent._create_delta_workflow,
+}
+
+
+def get_workflow(name: str = 'subscription'):
+    """Get a compiled workflow, compiling it on first use in this process."""
+    with _workflows_lock:
+        workflow = _workflows.get(name)
+        if workflow is None:
+            workflow = WORKFLOW_BUILDERS[name]()
+            _workflows[name] = workflow
+        return workflow
+
+
+def get_agent(db: Optional[DatabaseManager] = None, build_exports: bool = True) -> SubscriptionAgent:
+    """
+    Get the process-wide agent for a database file.
+
+    The agent is shared by every upload and worker thread; pass the
+    uploading gym to process().
+    """
+    db = db or DatabaseManager()
+    key = (os.path.abspath(db.db_path), build_exports)
+
+    with _agents_lock:
+        agent = _agents.get(key)
+        if agent is None:
+            agent = SubscriptionAgent(db=db, build_exports=build_exports)
+            _agents[key] = agent
+        return agent
@@ -0,0 +1,92 @@
+"""Benchmark the fixed per-upload cost of SubscriptionAgent at small sizes.
+
+For a small gym the data work (the four workflow stages) takes a few
+milliseconds, so whatever else an upload pays for dominates. Compares:
+
+- compile per upload: a new agent with a freshly compiled workflow for
+  every upload (how uploads ran before the workflow registry)
+- pooled:             the shared agent from get_agent(), whose workflow
+                      is compiled once per process
+
+Overhead is the time spent in process() outside the workflow stages.
+
+Usage:
+    python benchmarks/bench_agent_overhead.py [--sizes 10 50 200 1000] [--uploads 20]
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agents.subscription_agent import SubscriptionAgent, get_agent
+from benchmarks.bench_save_scaling import make_members
+from database.connection_pool import close_all_pools
+from database.db_manager import DatabaseManager
+
+
+def compile_per_upload(db: DatabaseManager):
+    """Build an agent the way every upload used to."""
+    agent = SubscriptionAgent(user_id=1, gym_name="Bench Gym", db=DatabaseManager(db.db_path),
+                              build_exports=False)
+    agent.workflow = SubscriptionAgent._create_workflow()
+    return agent
+
+
+def pooled(db: DatabaseManager):
+    """The process-wide agent."""
+    return get_agent(db, build_exports=False)
+
+
+def time_uploads(size: int, uploads: int, make_agent) -> dict:
+    """Median total and overhead milliseconds per upload."""
+    df = make_members(size)
+    totals, overheads = [], []
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = DatabaseManager(os.path.join(tmp, "bench.db"))
+        # Warm-up upload so imports and the first compile are not counted
+        make_agent(db).process(df, "warmup.xlsx", user_id=1, gym_name="Bench Gym")
+
+        for _ in range(uploads):
+            start = time.perf_counter()
+            result = make_agent(db).process(df, "bench.xlsx", user_id=1, gym_name="Bench Gym")
+            elapsed = time.perf_counter() - start
+            assert result['success'], result.get('error')
+
+            totals.append(elapsed)
+            overheads.append(elapsed - sum(result['stage_timings'].values()))
+
+        close_all_pools()
+
+    return {
+        'total_ms': statistics.median(totals) * 1000,
+        'overhead_ms': statistics.median(overheads) * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10, 50, 200, 1000])
+    parser.add_argument('--uploads', type=int, default=20)
+    args = parser.parse_args()
+
+    print("=" * 72)
+    print("PER-UPLOAD AGENT OVERHEAD BENCHMARK")
+    print("=" * 72)
+    print(f"{'members':>8}  {'compile per upload':>26}  {'pooled':>26}")
+    print(f"{'':>8}  {'total ms':>12} {'overhead ms':>13}  {'total ms':>12} {'overhead ms':>13}")
+
+    for size in args.sizes:
+        before = time_uploads(size, args.uploads, compile_per_upload)
+        after = time_uploads(size, args.uploads, pooled)
+        print(f"{size:>8,}  {before['total_ms']:>12.2f} {before['overhead_ms']:>13.2f}  "
+              f"{after['total_ms']:>12.2f} {after['overhead_ms']:>13.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""Benchmark the daily cluster refresh against re-uploading the batch.
+
+Members end anywhere in the coming year, as in a real gym. For each size
+one batch is uploaded, then aged by one day with ClusterRefresher and,
+for comparison, processed again from scratch (what a daily re-upload
+costs). Reports how many members changed and the time of each.
+
+Usage:
+    python benchmarks/bench_cluster_refresh.py [--sizes 10000 100000 300000]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import pandas as pd
+
+from agents.subscription_agent import SubscriptionAgent
+from benchmarks.bench_save_scaling import make_members
+from database.connection_pool import close_all_pools
+from database.db_manager import DatabaseManager
+from services.cluster_refresh import ClusterRefresher
+from utils.date_helpers import get_current_date_ist
+
+
+def year_of_members(size: int) -> pd.DataFrame:
+    """Members ending from a week ago to a year ahead."""
+    members = make_members(size)
+    today = pd.Timestamp(get_current_date_ist().replace(tzinfo=None))
+    offsets = np.random.default_rng(11).integers(-7, 365, size)
+    members['subscription_end_date'] = (today + pd.to_timedelta(offsets, unit='D')).strftime('%Y-%m-%d')
+    return members
+
+
+def run(size: int) -> dict:
+    """Upload `size` members, refresh them one day on, and re-process them."""
+    members = year_of_members(size)
+    tomorrow = get_current_date_ist().replace(tzinfo=None) + timedelta(days=1)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = DatabaseManager(os.path.join(tmp, "bench.db"))
+        user_id = db.create_user("bench@example.com", "x", "Bench Gym")
+        agent = SubscriptionAgent(db=db, build_exports=False)
+        assert agent.process(members, "bench.xlsx", user_id=user_id, gym_name="Bench Gym")['success']
+
+        start = time.perf_counter()
+        results = ClusterRefresher(db, build_exports=False).refresh_all(tomorrow)
+        refresh = time.perf_counter() - start
+        assert results and results[0]['applied'], results
+
+        start = time.perf_counter()
+        assert agent.process(members, "bench.xlsx", user_id=user_id, gym_name="Bench Gym")['success']
+        reupload = time.perf_counter() - start
+
+        close_all_pools()
+
+    return {'changed': results[0]['changed'], 'refresh_s': refresh, 'reupload_s': reupload}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 300000])
+    args = parser.parse_args()
+
+    print("=" * 70)
+    print("DAILY CLUSTER REFRESH BENCHMARK")
+    print("=" * 70)
+    print(f"{'members':>8} {'changed':>9} {'refresh s':>10} {'re-upload s':>12}")
+
+    for size in args.sizes:
+        stats = run(size)
+        print(f"{size:>8,} {stats['changed']:>9,} {stats['refresh_s']:>10.2f} {stats['reupload_s']:>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""Benchmark per-call SQLite connections against the pooled DatabaseManager.
+
+Runs concurrent reader and writer threads against a temporary database and
+reports throughput and lock errors for both connection strategies.
+
+Usage:
+    python benchmarks/bench_db_pool.py [--readers 8] [--writers 2] [--ops 500]
+"""
+
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database.db_manager import DatabaseManager
+from database.connection_pool import close_all_pools
+
+
+class PerCallDatabaseManager(DatabaseManager):
+    """DatabaseManager that opens and closes a connection for every call."""
+
+    def _get_connection(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _release_connection(self, conn: sqlite3.Connection):
+        conn.close()
+
+
+def seed(db: DatabaseManager, members: int) -> tuple:
+    """Create a user and one batch of subscriptions."""
+    user_id = db.create_user(f"bench-{uuid.uuid4().hex[:8]}@example.com", "x", "Bench Gym")
+    batch_id = str(uuid.uuid4())
+    db.save_subscriptions([
+        {
+            'user_id': user_id,
+            'upload_batch_id': batch_id,
+            'customer_name': f"Member {i}",
+            'phone_number': f"+91-{9000000000 + i}",
+            'subscription_start_date': '2025-01-01',
+            'subscription_end_date': '2025-02-01',
+            'days_remaining': i % 31,
+            'cluster': [1, 3, 7, 30][i % 4],
+        }
+        for i in range(members)
+    ])
+    db.save_upload_history(user_id, batch_id, "seed.xlsx", members, members)
+    return user_id, batch_id
+
+
+def run(db: DatabaseManager, user_id: int, batch_id: str,
+        readers: int, writers: int, ops: int) -> dict:
+    """Run readers and writers concurrently; return timing stats."""
+    errors = []
+    barrier = threading.Barrier(readers + writers)
+
+    def reader():
+        barrier.wait()
+        for _ in range(ops):
+            try:
+                # The reads one Messages page render performs
+                db.get_latest_batch_id(user_id)
+                db.get_cluster_counts(batch_id)
+                db.get_upload_history(user_id, limit=10)
+                db.get_subscriptions_by_cluster(batch_id, 1)
+            except sqlite3.OperationalError as e:
+                errors.append(str(e))
+
+    def writer():
+        barrier.wait()
+        for _ in range(ops):
+            try:
+                db.update_last_login(user_id)
+                db.save_upload_history(user_id, str(uuid.uuid4()), "bench.xlsx", 1, 1)
+            except sqlite3.OperationalError as e:
+                errors.append(str(e))
+
+    threads = [threading.Thread(target=reader) for _ in range(readers)]
+    threads += [threading.Thread(target=writer) for _ in range(writers)]
+
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+
+    total_ops = (readers * 4 + writers * 2) * ops
+    return {
+        'elapsed': elapsed,
+        'ops_per_sec': total_ops / elapsed,
+        'errors': len(errors),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--readers', type=int, default=8)
+    parser.add_argument('--writers', type=int, default=2)
+    parser.add_argument('--ops', type=int, default=500)
+    parser.add_argument('--members', type=int, default=2000)
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print(f"DB CONNECTION BENCHMARK - {args.readers} readers, {args.writers} writers, "
+          f"{args.ops} ops each")
+    print("=" * 60)
+
+    results = {}
+    for label, manager_cls in (("per-call", PerCallDatabaseManager), ("pooled", DatabaseManager)):
+        with tempfile.TemporaryDirectory() as tmp:
+            db = manager_cls(os.path.join(tmp, "bench.db"))
+            user_id, batch_id = seed(db, args.members)
+            results[label] = run(db, user_id, batch_id, args.readers, args.writers, args.ops)
+            close_all_pools()
+
+        r = results[label]
+        print(f"[{label:>8}] {r['elapsed']:.2f}s  {r['ops_per_sec']:,.0f} ops/s  "
+              f"{r['errors']} lock errors")
+
+    speedup = results['pooled']['ops_per_sec'] / results['per-call']['ops_per_sec']
+    print(f"\nPooled throughput: {speedup:.2f}x per-call")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""Benchmark weekly re-uploads: full batches vs. delta uploads.
+
+Each week the gym re-uploads its member list with a small share of rows
+changed (renewals), a few members gone and a few new ones. Compares:
+
+- full:  every upload saves a new batch with every member (the default)
+- delta: uploads write only new, changed and removed members
+         (SubscriptionAgent.process(..., delta=True))
+
+Reports rows written per re-upload (SQLite's change counter), database
+growth and upload time.
+
+Usage:
+    python benchmarks/bench_delta_upload.py [--members 100000] [--weeks 4] [--churn 0.05]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import pandas as pd
+
+from agents.subscription_agent import SubscriptionAgent
+from benchmarks.bench_save_scaling import make_members
+from database.connection_pool import close_all_pools
+from database.db_manager import DatabaseManager
+
+
+def next_week(members: pd.DataFrame, churn: float, week: int) -> pd.DataFrame:
+    """Renew `churn` of the members, drop a few and add as many new ones."""
+    rng = np.random.default_rng(week)
+    members = members.copy()
+
+    renewed = rng.random(len(members)) < churn
+    end_dates = pd.to_datetime(members.loc[renewed, 'subscription_end_date']) + pd.Timedelta(days=90)
+    members.loc[renewed, 'subscription_end_date'] = end_dates.dt.strftime('%Y-%m-%d')
+
+    left = rng.random(len(members)) < churn / 5
+    joined = make_members(int(left.sum()), seed=1000 + week)
+    joined['phone_number'] = '+91-' + pd.Series(8000000000 + week * 1000000 + np.arange(len(joined))).astype(str)
+    return pd.concat([members[~left], joined], ignore_index=True)
+
+
+def total_changes(db: DatabaseManager) -> int:
+    conn = db._get_connection()
+    try:
+        return conn.total_changes
+    finally:
+        db._release_connection(conn)
+
+
+def run(delta: bool, members: int, weeks: int, churn: float) -> dict:
+    """Upload `weeks` weekly member lists; return per re-upload averages."""
+    frame = make_members(members)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        db = DatabaseManager(path)
+        agent = SubscriptionAgent(db=db, build_exports=False)
+        assert agent.process(frame, "week0.xlsx", user_id=1, gym_name="Bench Gym", delta=delta)['success']
+
+        size_before = os.path.getsize(path)
+        changes_before = total_changes(db)
+        start = time.perf_counter()
+        for week in range(1, weeks + 1):
+            frame = next_week(frame, churn, week)
+            result = agent.process(frame, f"week{week}.xlsx", user_id=1, gym_name="Bench Gym", delta=delta)
+            assert result['success'], result.get('error')
+        elapsed = time.perf_counter() - start
+
+        stats = {
+            'rows_written': (total_changes(db) - changes_before) / weeks,
+            'growth_mb': (os.path.getsize(path) - size_before) / weeks / 1024 / 1024,
+            'upload_s': elapsed / weeks,
+        }
+        close_all_pools()
+
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--members', type=int, default=100000)
+    parser.add_argument('--weeks', type=int, default=4)
+    parser.add_argument('--churn', type=float, default=0.05)
+    args = parser.parse_args()
+
+    print("=" * 70)
+    print(f"DELTA UPLOAD BENCHMARK - {args.members:,} members, {args.churn:.0%} renewing per week")
+    print("=" * 70)
+    print(f"{'mode':<6} {'rows written/week':>18} {'growth MB/week':>15} {'upload s':>9}")
+
+    for mode in ('full', 'delta'):
+        stats = run(mode == 'delta', args.members, args.weeks, args.churn)
+        print(f"{mode:<6} {stats['rows_written']:>18,.0f} {stats['growth_mb']:>15.1f} {stats['upload_s']:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
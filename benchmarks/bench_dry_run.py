@@ -0,0 +1,81 @@
+"""Benchmark the dry-run cluster preview against a full agent run.
+
+For each size a synthetic member file (see synthetic.py) is either:
+
+- previewed: ExcelProcessor.process_end_dates + SubscriptionAgent.process(..., dry_run=True),
+             reading only the end date column and writing nothing
+- processed: ExcelProcessor.process_file (streaming) + SubscriptionAgent.process,
+             what "Run AI Agent" does
+
+Reports the time of each and checks both agree where they overlap (the
+preview also counts rows whose only errors are in other columns).
+
+Usage:
+    python benchmarks/bench_dry_run.py [--sizes 10000 100000]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agents.excel_processor import ExcelProcessor
+from agents.subscription_agent import SubscriptionAgent
+from benchmarks.synthetic import make_upload
+from database.connection_pool import close_all_pools
+from database.db_manager import DatabaseManager
+
+
+def run(size: int) -> dict:
+    """Preview and fully process one `size`-row file."""
+    upload = make_upload(size)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        agent = SubscriptionAgent(db=DatabaseManager(os.path.join(tmp, "bench.db")), build_exports=False)
+
+        start = time.perf_counter()
+        success, message, end_dates, _ = ExcelProcessor().process_end_dates(upload)
+        assert success, message
+        preview = agent.process(end_dates, upload.name, dry_run=True)
+        preview_s = time.perf_counter() - start
+        assert preview['success'], preview.get('error')
+
+        upload.seek(0)
+        start = time.perf_counter()
+        success, message, cleaned, _ = ExcelProcessor().process_file(upload, streaming=True)
+        assert success, message
+        result = agent.process(cleaned, upload.name, user_id=1, gym_name="Bench Gym")
+        full_s = time.perf_counter() - start
+        assert result['success'], result.get('error')
+
+        close_all_pools()
+
+    return {
+        'preview_s': preview_s,
+        'full_s': full_s,
+        'preview_listed': preview['total_processed'],
+        'full_listed': result['total_processed'],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000])
+    args = parser.parse_args()
+
+    print("=" * 70)
+    print("DRY-RUN PREVIEW BENCHMARK")
+    print("=" * 70)
+    print(f"{'rows':>8} {'preview s':>10} {'full run s':>11} {'listed (preview/full)':>23}")
+
+    for size in args.sizes:
+        stats = run(size)
+        listed = f"{stats['preview_listed']:,}/{stats['full_listed']:,}"
+        print(f"{size:>8,} {stats['preview_s']:>10.2f} {stats['full_s']:>11.2f} {listed:>23}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""Benchmark how the save stage scales with the number of members.
+
+Runs the calculate, classify and generate nodes untimed, then times the
+save_to_database node at several batch sizes. Per-row cost should stay
+flat (linear scaling); it also checks that members sharing a name keep
+their own start date.
+
+Usage:
+    python benchmarks/bench_save_scaling.py [--sizes 1000 10000 100000 500000]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import pandas as pd
+
+from agents.subscription_agent import SubscriptionAgent
+from database.db_manager import DatabaseManager
+from database.connection_pool import close_all_pools
+from utils.date_helpers import get_current_date_ist
+
+
+def make_members(size: int, seed: int = 7) -> pd.DataFrame:
+    """Cleaned member frame with expiries inside the 30-day window."""
+    rng = np.random.default_rng(seed)
+    today = pd.Timestamp(get_current_date_ist().replace(tzinfo=None))
+
+    end_dates = today + pd.to_timedelta(rng.integers(-5, 31, size), unit='D')
+    start_dates = end_dates - pd.to_timedelta(rng.integers(30, 365, size), unit='D')
+
+    return pd.DataFrame({
+        # Only 1,000 distinct names, so names repeat across members
+        'customer_name': 'Member ' + pd.Series(rng.integers(0, 1000, size)).astype(str),
+        'phone_number': '+91-' + pd.Series(9000000000 + np.arange(size)).astype(str),
+        'subscription_start_date': start_dates.strftime('%Y-%m-%d'),
+        'subscription_end_date': end_dates.strftime('%Y-%m-%d'),
+    })
+
+
+def time_save(size: int) -> float:
+    """Return seconds spent in the save node for `size` members."""
+    df = make_members(size)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = DatabaseManager(os.path.join(tmp, "bench.db"))
+        agent = SubscriptionAgent(user_id=1, gym_name="Bench Gym", db=db)
+
+        state = {
+            'user_id': 1,
+            'gym_name': "Bench Gym",
+            'templates': None,
+            'db': db,
+            'data': df,
+            'batch_id': str(uuid.uuid4()),
+            'filename': "bench.xlsx",
+            'total_rows': size,
+            'as_of_date': get_current_date_ist().replace(tzinfo=None),
+            'processed_subscriptions': [],
+            'messages': [],
+            'cluster_counts': {},
+            'total_processed': 0,
+            'error': ''
+        }
+        state.update(agent._calculate_days_node(state))
+        state.update(agent._classify_clusters_node(state))
+        state.update(agent._generate_messages_node(state))
+
+        start = time.perf_counter()
+        state.update(agent._save_to_database_node(state))
+        elapsed = time.perf_counter() - start
+
+        # Every saved row must carry its own start date, even with duplicate names
+        saved = pd.DataFrame(state['processed_subscriptions'])
+        expected = df.set_index('phone_number')['subscription_start_date']
+        assert (saved['subscription_start_date'].to_numpy() ==
+                expected.loc[saved['phone_number']].to_numpy()).all(), "Start dates mismatched"
+
+        close_all_pools()
+
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000, 500000])
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("SAVE STAGE SCALING BENCHMARK")
+    print("=" * 60)
+
+    per_row = {}
+    for size in args.sizes:
+        elapsed = time_save(size)
+        per_row[size] = elapsed / size * 1e6
+        print(f"{size:>9,} members  {elapsed:8.2f}s  {per_row[size]:8.1f} us/row  "
+              f"{size / elapsed:>10,.0f} rows/s")
+
+    ratio = per_row[max(per_row)] / per_row[min(per_row)]
+    verdict = "[OK] linear" if ratio < 3 else "[WARN] super-linear"
+    print(f"\n{verdict}: per-row cost ratio largest/smallest = {ratio:.2f}")
+
+
+if __name__ == "__main__":
+    main()
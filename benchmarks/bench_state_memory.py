@@ -0,0 +1,138 @@
+"""Measure peak memory of the workflow nodes with and without frame copies.
+
+Builds two LangGraph graphs over the calculate, classify and generate
+nodes: one with SubscriptionAgent's current nodes (columns added in
+place, partial state updates, messages as a view over the frame) and one
+that wraps the same nodes the way they used to run (state['data'].copy()
+at the start of every node, the full state returned and messages held as
+a list of dicts). Peak traced memory comes from tracemalloc.
+
+Usage:
+    python benchmarks/bench_state_memory.py [--rows 500000]
+"""
+
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+import uuid
+from typing import Callable, Dict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import pandas as pd
+from langgraph.graph import StateGraph, END
+
+from agents.subscription_agent import SubscriptionAgent, SubscriptionState
+from utils.date_helpers import get_current_date_ist
+
+
+NODES = ["calculate_days", "classify_clusters", "generate_messages"]
+
+
+def make_members(size: int, seed: int = 11) -> pd.DataFrame:
+    """Cleaned member frame; about a fifth expire beyond 30 days."""
+    rng = np.random.default_rng(seed)
+    today = pd.Timestamp(get_current_date_ist().replace(tzinfo=None))
+    end_dates = today + pd.to_timedelta(rng.integers(-5, 40, size), unit='D')
+
+    return pd.DataFrame({
+        'customer_name': 'Member ' + pd.Series(np.arange(size)).astype(str),
+        'phone_number': '+91-' + pd.Series(9000000000 + np.arange(size)).astype(str),
+        'subscription_start_date': (end_dates - pd.Timedelta(days=90)).strftime('%Y-%m-%d'),
+        'subscription_end_date': end_dates.strftime('%Y-%m-%d'),
+    })
+
+
+def copying(node: Callable) -> Callable:
+    """
+    Run a node the old way: copy the frame, return the whole state and
+    keep messages as a materialized list of dicts.
+    """
+    def wrapper(state: Dict) -> Dict:
+        state = dict(state)
+        state['data'] = state['data'].copy()
+        state.update(node(state))
+        state['messages'] = list(state['messages'])
+        return state
+    return wrapper
+
+
+def build_graph(agent: SubscriptionAgent, legacy: bool):
+    """Compile calculate -> classify -> generate."""
+    nodes = {
+        "calculate_days": agent._calculate_days_node,
+        "classify_clusters": agent._classify_clusters_node,
+        "generate_messages": agent._generate_messages_node,
+    }
+
+    workflow = StateGraph(SubscriptionState)
+    for name in NODES:
+        workflow.add_node(name, copying(nodes[name]) if legacy else nodes[name])
+
+    workflow.set_entry_point(NODES[0])
+    for current, following in zip(NODES, NODES[1:]):
+        workflow.add_edge(current, following)
+    workflow.add_edge(NODES[-1], END)
+
+    return workflow.compile()
+
+
+def measure(rows: int, legacy: bool) -> Dict:
+    """Invoke one graph and return elapsed time and peak traced memory."""
+    agent = SubscriptionAgent(user_id=1, gym_name="Bench Gym", db=object())
+    graph = build_graph(agent, legacy)
+    df = make_members(rows)
+
+    state = {
+        'user_id': 1,
+        'gym_name': "Bench Gym",
+        # process() hands the workflow a shallow copy
+        'data': df.copy(deep=False),
+        'batch_id': str(uuid.uuid4()),
+        'filename': "bench.xlsx",
+        'total_rows': rows,
+        'as_of_date': get_current_date_ist().replace(tzinfo=None),
+        'processed_subscriptions': [],
+        'messages': [],
+        'cluster_counts': {},
+        'total_processed': 0,
+        'error': ''
+    }
+
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    start = time.perf_counter()
+    final_state = graph.invoke(state)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    assert final_state['total_processed'] == len(final_state['messages'])
+    return {'elapsed': elapsed, 'peak_mb': peak / (1024 * 1024)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=500000)
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print(f"WORKFLOW STATE MEMORY - {args.rows:,} rows")
+    print("=" * 60)
+
+    results = {}
+    for label, legacy in (("copying", True), ("in-place", False)):
+        results[label] = measure(args.rows, legacy)
+        print(f"[{label:>8}] peak {results[label]['peak_mb']:8.1f} MB  "
+              f"{results[label]['elapsed']:6.1f}s")
+
+    saved = results['copying']['peak_mb'] - results['in-place']['peak_mb']
+    print(f"\nPeak reduction: {saved:.1f} MB "
+          f"({saved / results['copying']['peak_mb'] * 100:.0f}%)")
+
+
+if __name__ == "__main__":
+    main()
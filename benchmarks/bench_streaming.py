@@ -0,0 +1,96 @@
+"""Benchmark whole-file vs. chunked streaming processing of an upload.
+
+Both modes start from members generated chunk by chunk, the way
+ExcelProcessor.stream_and_validate hands them over:
+
+- whole:     chunks are concatenated (as process_file does) and the frame
+             goes through SubscriptionAgent.process
+- streaming: chunks go straight into SubscriptionAgent.process_stream
+
+Reports total time, time until the first rows are committed, and peak
+Python memory (tracemalloc) for each size.
+
+Usage:
+    python benchmarks/bench_streaming.py [--sizes 10000 100000 300000] [--chunk-size 10000]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas as pd
+
+from agents.subscription_agent import SubscriptionAgent
+from benchmarks.bench_save_scaling import make_members
+from database.connection_pool import close_all_pools
+from database.db_manager import DatabaseManager
+
+
+def member_chunks(size: int, chunk_size: int):
+    """Yield `size` members in chunks, indexed by row position."""
+    for start in range(0, size, chunk_size):
+        chunk = make_members(min(chunk_size, size - start), seed=start)
+        chunk.index = pd.RangeIndex(start, start + len(chunk))
+        yield chunk
+
+
+def run(size: int, chunk_size: int, streaming: bool) -> dict:
+    """Process one upload and return its timings and peak memory."""
+    with tempfile.TemporaryDirectory() as tmp:
+        agent = SubscriptionAgent(user_id=1, gym_name="Bench Gym",
+                                  db=DatabaseManager(os.path.join(tmp, "bench.db")), build_exports=False)
+        first_commit = []
+
+        tracemalloc.start()
+        start = time.perf_counter()
+        try:
+            if streaming:
+                def report(rows_saved, timings):
+                    if not first_commit:
+                        first_commit.append(time.perf_counter() - start)
+
+                result = agent.process_stream(member_chunks(size, chunk_size), "bench.xlsx",
+                                              progress_callback=report)
+            else:
+                df = pd.concat(member_chunks(size, chunk_size), ignore_index=True)
+                result = agent.process(df, "bench.xlsx")
+            total = time.perf_counter() - start
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+        assert result['success'], result.get('error')
+        close_all_pools()
+
+    return {
+        'total_s': total,
+        'first_rows_s': first_commit[0] if first_commit else total,
+        'peak_mb': peak / 1024 / 1024,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 300000])
+    parser.add_argument('--chunk-size', type=int, default=10000)
+    args = parser.parse_args()
+
+    print("=" * 80)
+    print("STREAMING PROCESSING BENCHMARK")
+    print("=" * 80)
+    print(f"{'members':>8}  {'mode':<10} {'total s':>9} {'first rows s':>13} {'peak MB':>9}")
+
+    for size in args.sizes:
+        for mode in ('whole', 'streaming'):
+            stats = run(size, args.chunk_size, streaming=mode == 'streaming')
+            print(f"{size:>8,}  {mode:<10} {stats['total_s']:>9.2f} {stats['first_rows_s']:>13.2f} "
+                  f"{stats['peak_mb']:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""Benchmark small uploads running next to another gym's large upload.
+
+One gym saves a large upload (one long write transaction) while other
+gyms keep saving small uploads. Compares:
+
+- single file: every gym in one database (the default)
+- sharded:     each gym in its own file (HERCULES_SHARDS=1)
+
+Reports latency of the small uploads while the large one is running.
+
+Usage:
+    python benchmarks/bench_tenant_contention.py [--large 200000] [--small 50] [--gyms 4]
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agents.subscription_agent import SubscriptionAgent
+from benchmarks.bench_save_scaling import make_members
+from database.connection_pool import close_all_pools
+from database.db_manager import DatabaseManager
+from database.sharding import close_all_shard_sets
+
+
+def run(sharded: bool, large: int, small: int, gyms: int) -> dict:
+    """Time small uploads of `gyms` gyms while gym 1 saves `large` members."""
+    large_df, small_df = make_members(large), make_members(small)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = DatabaseManager(os.path.join(tmp, "bench.db"), sharded=sharded)
+        agent = SubscriptionAgent(db=db, build_exports=False)
+        # Open every gym's database before timing
+        for user_id in range(1, gyms + 2):
+            agent.process(small_df, "warmup.xlsx", user_id=user_id, gym_name="Bench Gym")
+
+        large_done = threading.Event()
+        latencies = []
+
+        def large_upload():
+            agent.process(large_df, "large.xlsx", user_id=1, gym_name="Bench Gym")
+            large_done.set()
+
+        def small_uploads(user_id: int):
+            while not large_done.is_set():
+                start = time.perf_counter()
+                result = agent.process(small_df, "small.xlsx", user_id=user_id, gym_name="Bench Gym")
+                latencies.append(time.perf_counter() - start)
+                assert result['success'], result.get('error')
+
+        threads = [threading.Thread(target=large_upload)]
+        threads += [threading.Thread(target=small_uploads, args=(user_id,)) for user_id in range(2, gyms + 2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        close_all_shard_sets()
+        close_all_pools()
+
+    latencies.sort()
+    return {
+        'uploads': len(latencies),
+        'p50_ms': statistics.median(latencies) * 1000,
+        'max_ms': latencies[-1] * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--large', type=int, default=200000)
+    parser.add_argument('--small', type=int, default=50)
+    parser.add_argument('--gyms', type=int, default=4)
+    args = parser.parse_args()
+
+    print("=" * 70)
+    print(f"TENANT CONTENTION BENCHMARK - {args.large:,}-member upload vs "
+          f"{args.gyms} gyms uploading {args.small} members")
+    print("=" * 70)
+    print(f"{'mode':<12} {'small uploads':>14} {'p50 ms':>10} {'max ms':>10}")
+
+    for label, sharded in (("single file", False), ("sharded", True)):
+        stats = run(sharded, args.large, args.small, args.gyms)
+        print(f"{label:<12} {stats['uploads']:>14,} {stats['p50_ms']:>10.1f} {stats['max_ms']:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
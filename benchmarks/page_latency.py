@@ -0,0 +1,215 @@
+"""Cold-start and rerun latency of pages that don't process data.
+
+Each page runs in a fresh interpreter (with streamlit already imported)
+under streamlit's AppTest, logged in as a test user against a new
+database in a temporary directory:
+
+- cold_ms:   first run of the page, i.e. importing its modules, compiling
+             the page, creating the schema and rendering
+- rerun_ms:  median of the following --reruns runs, i.e. what a user pays
+             on every widget interaction (the page stays compiled, as it
+             does on the server)
+- heavy:     heavy modules (langgraph, openpyxl, ...) loaded by the page;
+             these pages should load none
+
+Each page is measured --repeats times, each in a new interpreter, and the
+best cold_ms and rerun_ms are kept, so one slow run on a busy machine
+does not count as a regression.
+
+Results are compared with a baseline; a page regresses when it loads a
+heavy module, or when cold_ms or rerun_ms grows by more than --tolerance
+(plus a small absolute slack for timer noise).
+
+Usage:
+    python benchmarks/page_latency.py [--reruns 20] [--repeats 3] [--output results.json]
+    python benchmarks/page_latency.py --update-baseline
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "page_baseline.json")
+DEFAULT_TOLERANCE = 0.30
+DEFAULT_RERUNS = 20
+DEFAULT_REPEATS = 3
+
+# Growth below these is ignored (noise on short timings)
+COLD_SLACK_MS = 50.0
+RERUN_SLACK_MS = 5.0
+
+PAGES = {
+    'home': "Home.py",
+    'onboarding': os.path.join("pages", "1_📚_Onboarding.py"),
+    'upload': os.path.join("pages", "2_📊_Upload_Data.py"),
+    'settings': os.path.join("pages", "4_⚙️_Settings.py"),
+}
+
+HEAVY_MODULES = ['langgraph', 'langchain_core', 'openpyxl']
+
+SESSION = {
+    'authenticated': True,
+    'user_id': 1,
+    'user_email': "bench@example.com",
+    'gym_name': "Bench Gym",
+}
+
+
+def measure_page(page: str, reruns: int) -> Dict:
+    """Run one page under AppTest in this process and time it."""
+    import streamlit  # noqa: F401  (excluded from the page's cold start)
+    from streamlit.runtime.scriptrunner.script_cache import ScriptCache
+    from streamlit.testing.v1 import AppTest, local_script_runner
+
+    # AppTest compiles the page again on every run; the server compiles it
+    # once and reuses the bytecode, so reruns share one script cache
+    script_cache = ScriptCache()
+    local_script_runner.ScriptCache = lambda: script_cache
+
+    app = AppTest.from_file(os.path.join(ROOT, PAGES[page]), default_timeout=60)
+    for key, value in SESSION.items():
+        app.session_state[key] = value
+
+    start = time.perf_counter()
+    app.run()
+    cold = time.perf_counter() - start
+    if app.exception:
+        raise RuntimeError(f"{page}: {app.exception[0].value}")
+
+    timings = []
+    for _ in range(reruns):
+        start = time.perf_counter()
+        app.run()
+        timings.append(time.perf_counter() - start)
+
+    return {
+        'page': page,
+        'cold_ms': round(cold * 1000, 1),
+        'rerun_ms': round(statistics.median(timings) * 1000, 2),
+        'heavy': sorted(name for name in HEAVY_MODULES if name in sys.modules),
+    }
+
+
+def run_page(page: str, reruns: int) -> Dict:
+    """Measure a page in a fresh interpreter with its own database."""
+    with tempfile.TemporaryDirectory() as work_dir:
+        env = dict(os.environ, PYTHONPATH=ROOT)
+        completed = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--worker", page, "--reruns", str(reruns)],
+            cwd=work_dir, env=env, capture_output=True, text=True, timeout=300
+        )
+    if completed.returncode != 0:
+        raise RuntimeError(f"{page} failed:\n{completed.stderr}")
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def best_of(page: str, reruns: int, repeats: int) -> Dict:
+    """Best cold_ms and rerun_ms of `repeats` measurements of a page."""
+    results = [run_page(page, reruns) for _ in range(repeats)]
+    return {
+        'page': page,
+        'cold_ms': min(result['cold_ms'] for result in results),
+        'rerun_ms': min(result['rerun_ms'] for result in results),
+        'heavy': sorted({name for result in results for name in result['heavy']}),
+    }
+
+
+def compare(results: List[Dict], baseline: Dict, tolerance: float) -> List[str]:
+    """Return descriptions of pages that regressed against the baseline."""
+    expected = {r['page']: r for r in baseline.get('results', [])}
+    regressions = []
+
+    for result in results:
+        if result['heavy']:
+            regressions.append(f"{result['page']}: loads {', '.join(result['heavy'])}")
+
+        base = expected.get(result['page'])
+        if base is None:
+            continue
+
+        if result['cold_ms'] > base['cold_ms'] * (1 + tolerance) + COLD_SLACK_MS:
+            regressions.append(
+                f"{result['page']}: cold start {result['cold_ms']:.0f} ms vs baseline {base['cold_ms']:.0f} ms"
+            )
+        if result['rerun_ms'] > base['rerun_ms'] * (1 + tolerance) + RERUN_SLACK_MS:
+            regressions.append(
+                f"{result['page']}: rerun {result['rerun_ms']:.1f} ms vs baseline {base['rerun_ms']:.1f} ms"
+            )
+
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pages", nargs="+", choices=list(PAGES), default=list(PAGES))
+    parser.add_argument("--reruns", type=int, default=DEFAULT_RERUNS)
+    parser.add_argument("--repeats", type=int, default=DEFAULT_REPEATS)
+    parser.add_argument("--output", help="write results JSON here (default: stdout)")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    parser.add_argument("--update-baseline", action="store_true", help="save results as the new baseline")
+    parser.add_argument("--worker", choices=list(PAGES), help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.worker:
+        print(json.dumps(measure_page(args.worker, args.reruns)))
+        return 0
+
+    results = []
+    for page in args.pages:
+        result = best_of(page, args.reruns, args.repeats)
+        results.append(result)
+        print(f"  {page:<12} cold {result['cold_ms']:8.1f} ms  rerun {result['rerun_ms']:7.2f} ms"
+              f"  heavy: {', '.join(result['heavy']) or '-'}", file=sys.stderr)
+
+    report = {
+        'meta': {
+            'created': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'reruns': args.reruns,
+            'repeats': args.repeats,
+        },
+        'results': results,
+    }
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as handle:
+            handle.write(output + "\n")
+    else:
+        print(output)
+
+    if args.update_baseline:
+        with open(args.baseline, 'w') as handle:
+            handle.write(output + "\n")
+        print(f"Baseline saved to {args.baseline}", file=sys.stderr)
+        return 0
+
+    regressions = [f"{r['page']}: loads {', '.join(r['heavy'])}" for r in results if r['heavy']]
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as handle:
+            regressions = compare(results, json.load(handle), args.tolerance)
+
+    if regressions:
+        print("\nRegressions:", file=sys.stderr)
+        for regression in regressions:
+            print(f"  - {regression}", file=sys.stderr)
+        return 1
+
+    print("\nNo regressions", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,231 @@
+"""End-to-end benchmark suite.
+
+For each size, generates a synthetic member file (see synthetic.py) and
+measures:
+
+- process_file:        ExcelProcessor.process_file on the .xlsx (streaming)
+- agent_process:       SubscriptionAgent.process on the cleaned frame
+- messages_reads:      the DatabaseManager reads made by the Messages page,
+                       with the batch cache cleared first
+- messages_reads_cached: the same reads on a rerun (served from the cache)
+- export_csv:          CsvExporter writing the full and per-cluster CSVs
+- export_excel:        ExcelExporter building the colour-coded workbook
+
+Each benchmark is timed without tracemalloc (best of --repeat runs), then
+run once more under tracemalloc for its peak memory. Results are written
+as JSON and compared with a baseline; a benchmark regresses when its
+throughput drops or its peak memory grows by more than --tolerance.
+
+Usage:
+    python benchmarks/run_suite.py [--sizes 1000 10000 100000] [--output results.json]
+    python benchmarks/run_suite.py --update-baseline
+"""
+
+import argparse
+import gc
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agents.excel_processor import ExcelProcessor
+from agents.subscription_agent import SubscriptionAgent
+from benchmarks.synthetic import make_upload
+from database.batch_cache import clear_all_caches
+from database.connection_pool import close_all_pools
+from database.db_manager import DatabaseManager
+from services.export_service import CsvExporter, ExcelExporter
+
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+DEFAULT_SIZES = [1000, 10000, 100000]
+DEFAULT_TOLERANCE = 0.30
+# Peak-memory growth below this is ignored (noise on tiny allocations)
+MEMORY_SLACK_MB = 1.0
+
+USER_ID = 1
+GYM_NAME = "Bench Gym"
+
+
+def measure(func: Callable[[], object], repeat: int) -> Tuple[float, int, object]:
+    """Return (best_seconds, peak_bytes, result) for func."""
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+        del result
+
+    gc.collect()
+    tracemalloc.start()
+    try:
+        result = func()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    return best, peak, result
+
+
+def messages_page_reads(db: DatabaseManager, batch_id: str) -> List[Dict]:
+    """The reads the Messages page makes when it opens a batch."""
+    db.get_latest_batch_id(USER_ID)
+    messages = db.get_messages_by_batch(batch_id)
+    db.get_cluster_counts(batch_id)
+    return messages
+
+
+def run_size(rows: int, seed: int, repeat: int, work_dir: str) -> List[Dict]:
+    """Run every benchmark for one file size."""
+    upload = make_upload(rows, seed=seed)
+    results = []
+
+    def record(name: str, seconds: float, peak: int, units: int):
+        results.append({
+            'benchmark': name,
+            'rows': rows,
+            'units': units,
+            'seconds': round(seconds, 4),
+            'rows_per_s': round(units / seconds, 1) if seconds else None,
+            'peak_mem_mb': round(peak / 1e6, 2),
+        })
+        print(f"  {name:<22} {seconds:8.3f}s  {units / seconds:>12,.0f} rows/s  {peak / 1e6:8.1f} MB",
+              file=sys.stderr)
+
+    def process_file():
+        upload.seek(0)
+        success, message, cleaned_df, errors = ExcelProcessor().process_file(upload, streaming=True)
+        assert success, message
+        return cleaned_df
+
+    seconds, peak, cleaned_df = measure(process_file, repeat)
+    record('process_file', seconds, peak, rows)
+
+    runs = iter(range(repeat + 1))
+
+    def agent_process():
+        # A fresh database per run, so every run inserts into empty tables
+        db = DatabaseManager(os.path.join(work_dir, f"agent_{rows}_{next(runs)}.db"))
+        result = SubscriptionAgent(USER_ID, GYM_NAME, db=db, build_exports=False).process(cleaned_df, upload.name)
+        assert result['success'], result.get('error')
+        return db, result['batch_id']
+
+    seconds, peak, (db, batch_id) = measure(agent_process, repeat)
+    record('agent_process', seconds, peak, len(cleaned_df))
+
+    def cold_reads():
+        db.cache.invalidate()
+        return messages_page_reads(db, batch_id)
+
+    seconds, peak, messages = measure(cold_reads, repeat)
+    record('messages_reads', seconds, peak, len(messages))
+
+    seconds, peak, messages = measure(lambda: messages_page_reads(db, batch_id), repeat)
+    record('messages_reads_cached', seconds, peak, len(messages))
+
+    export_dir = os.path.join(work_dir, f"exports_{rows}")
+    seconds, peak, _ = measure(lambda: CsvExporter(db).write(batch_id, export_dir), repeat)
+    record('export_csv', seconds, peak, len(messages))
+
+    seconds, peak, _ = measure(ExcelExporter(messages).to_excel, repeat)
+    record('export_excel', seconds, peak, len(messages))
+
+    close_all_pools()
+    clear_all_caches()
+    return results
+
+
+def compare(results: List[Dict], baseline: Dict, tolerance: float) -> List[str]:
+    """Return descriptions of benchmarks that regressed against the baseline."""
+    expected = {(r['benchmark'], r['rows']): r for r in baseline.get('results', [])}
+    regressions = []
+
+    for result in results:
+        base = expected.get((result['benchmark'], result['rows']))
+        if base is None:
+            continue
+
+        label = f"{result['benchmark']} @ {result['rows']:,} rows"
+        if base['rows_per_s'] and result['rows_per_s'] < base['rows_per_s'] * (1 - tolerance):
+            regressions.append(
+                f"{label}: throughput {result['rows_per_s']:,.0f} rows/s "
+                f"vs baseline {base['rows_per_s']:,.0f}"
+            )
+        if result['peak_mem_mb'] > base['peak_mem_mb'] * (1 + tolerance) + MEMORY_SLACK_MB:
+            regressions.append(
+                f"{label}: peak memory {result['peak_mem_mb']:.1f} MB "
+                f"vs baseline {base['peak_mem_mb']:.1f} MB"
+            )
+
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES,
+                        help="rows per generated file (the generator also supports 1000000)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--repeat", type=int, default=1, help="timed runs per benchmark (best is kept)")
+    parser.add_argument("--output", help="write results JSON here (default: stdout)")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    parser.add_argument("--update-baseline", action="store_true", help="save results as the new baseline")
+    args = parser.parse_args(argv)
+
+    results = []
+    with tempfile.TemporaryDirectory() as work_dir:
+        for rows in args.sizes:
+            print(f"{rows:,} rows", file=sys.stderr)
+            results.extend(run_size(rows, args.seed, args.repeat, work_dir))
+
+    report = {
+        'meta': {
+            'created': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'seed': args.seed,
+            'repeat': args.repeat,
+        },
+        'results': results,
+    }
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as handle:
+            handle.write(output + "\n")
+    else:
+        print(output)
+
+    if args.update_baseline:
+        with open(args.baseline, 'w') as handle:
+            handle.write(output + "\n")
+        print(f"Baseline saved to {args.baseline}", file=sys.stderr)
+        return 0
+
+    if not os.path.exists(args.baseline):
+        return 0
+
+    with open(args.baseline) as handle:
+        regressions = compare(results, json.load(handle), args.tolerance)
+
+    if regressions:
+        print("\nRegressions against baseline:", file=sys.stderr)
+        for regression in regressions:
+            print(f"  - {regression}", file=sys.stderr)
+        return 1
+
+    print("\nNo regressions against baseline", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,211 @@
+"""Seeded generator of synthetic member files.
+
+Produces frames shaped like a gym's Excel export (the column headers the
+ExcelProcessor looks for, values as they would be read from the sheet):
+
+- phone numbers in several messy formats, some typed as numbers
+- dates in all three accepted formats (DD-MM-YYYY, DD/MM/YYYY, YYYY-MM-DD)
+- a share of invalid rows (empty or one-letter names, short or missing
+  phones, impossible or unparseable dates, end before start)
+- expiries spread across every cluster, plus members beyond 30 days
+
+The same seed always gives the same rows.
+
+Usage:
+    python benchmarks/synthetic.py [--rows 1000 10000 100000 1000000] [--out-dir benchmarks/data]
+"""
+
+import argparse
+import io
+import os
+import sys
+from datetime import datetime
+from typing import Optional, Union
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import pandas as pd
+from openpyxl import Workbook
+
+from utils.date_helpers import get_current_date_ist
+
+
+STANDARD_SIZES = [1000, 10000, 100000, 1000000]
+
+COLUMNS = ['Customer Name', 'Contact', 'Subscription Start Date', 'Subscription End Date']
+
+FIRST_NAMES = [
+    "Priya", "Rahul", "Amit", "Sneha", "Vikram", "Anjali", "Rohan", "Kavya",
+    "Arjun", "Meera", "Karan", "Pooja", "Siddharth", "Neha", "Aditya", "Isha",
+    "Manoj", "Divya", "Suresh", "Lakshmi", "Farhan", "Zoya", "Gurpreet", "Tenzin",
+]
+LAST_NAMES = [
+    "Sharma", "Verma", "Kumar", "Singh", "Patel", "Reddy", "Nair", "Iyer",
+    "Gupta", "Mehta", "Khan", "Das", "Joshi", "Rao", "Chopra", "Bhat",
+]
+
+DATE_FORMATS = ["%d-%m-%Y", "%d/%m/%Y", "%Y-%m-%d"]
+
+# Days until expiry: (low, high inclusive, share of members)
+EXPIRY_SPREAD = [
+    (-7, 1, 0.10),     # cluster 1 (includes already expired)
+    (2, 3, 0.10),      # cluster 3
+    (4, 7, 0.15),      # cluster 7
+    (8, 30, 0.35),     # cluster 30
+    (31, 180, 0.30),   # beyond 30 days, skipped by the agent
+]
+
+# Share of rows broken in one of the ways below
+INVALID_SHARE = 0.05
+INVALID_KINDS = [
+    'empty_name', 'short_name', 'empty_phone', 'short_phone',
+    'bad_start_date', 'bad_end_date', 'end_before_start',
+]
+
+
+def _format_phones(rng: np.random.Generator, size: int) -> np.ndarray:
+    """Valid mobile numbers written the ways people type them."""
+    numbers = rng.integers(6000000000, 9999999999, size, dtype=np.int64)
+    text = pd.Series(numbers).astype(str)
+    head, tail = text.str[:5], text.str[5:]
+
+    styles = rng.integers(0, 6, size)
+    phones = np.select(
+        [styles == 0, styles == 1, styles == 2, styles == 3, styles == 4],
+        [
+            text,
+            '+91 ' + head + ' ' + tail,
+            '+91-' + text,
+            '0' + head + ' ' + tail,
+            head + '-' + tail,
+        ],
+        default=''
+    ).astype(object)
+
+    # Numeric cells, as when the column is formatted as a number in Excel
+    numeric = styles == 5
+    phones[numeric] = numbers[numeric].tolist()
+    return phones
+
+
+def _format_dates(rng: np.random.Generator, dates: pd.DatetimeIndex) -> np.ndarray:
+    """Dates as text, each row in one of the accepted formats."""
+    choice = rng.integers(0, len(DATE_FORMATS), len(dates))
+    result = np.empty(len(dates), dtype=object)
+    for i, date_format in enumerate(DATE_FORMATS):
+        mask = choice == i
+        result[mask] = dates[mask].strftime(date_format)
+    return result
+
+
+def generate_members(rows: int, seed: int = 42, today: Optional[datetime] = None,
+                     invalid_share: float = INVALID_SHARE) -> pd.DataFrame:
+    """
+    Build a raw member frame with the standard Excel headers.
+
+    Args:
+        rows: Number of data rows
+        seed: Random seed
+        today: Reference date for expiries (default: today in IST)
+        invalid_share: Fraction of rows made invalid
+
+    Returns:
+        DataFrame of object columns, like pd.read_excel of the generated file
+    """
+    rng = np.random.default_rng(seed)
+    today = pd.Timestamp(today or get_current_date_ist().replace(tzinfo=None)).normalize()
+
+    first = np.array(FIRST_NAMES, dtype=object)[rng.integers(0, len(FIRST_NAMES), rows)]
+    last = np.array(LAST_NAMES, dtype=object)[rng.integers(0, len(LAST_NAMES), rows)]
+    names = first + ' ' + last
+    # Stray whitespace around some names
+    padded = rng.random(rows) < 0.05
+    names[padded] = '  ' + names[padded] + ' '
+
+    phones = _format_phones(rng, rows)
+
+    shares = np.array([share for _, _, share in EXPIRY_SPREAD])
+    buckets = rng.choice(len(EXPIRY_SPREAD), rows, p=shares / shares.sum())
+    lows = np.array([low for low, _, _ in EXPIRY_SPREAD])[buckets]
+    highs = np.array([high for _, high, _ in EXPIRY_SPREAD])[buckets]
+    days_left = lows + (rng.random(rows) * (highs - lows + 1)).astype(np.int64)
+
+    end_dates = today + pd.to_timedelta(days_left, unit='D')
+    start_dates = end_dates - pd.to_timedelta(rng.integers(30, 366, rows), unit='D')
+
+    starts = _format_dates(rng, start_dates)
+    ends = _format_dates(rng, end_dates)
+
+    # Break a share of the rows, one problem per row
+    broken = np.flatnonzero(rng.random(rows) < invalid_share)
+    kinds = rng.integers(0, len(INVALID_KINDS), len(broken))
+    for kind_index, kind in enumerate(INVALID_KINDS):
+        positions = broken[kinds == kind_index]
+        if kind == 'empty_name':
+            names[positions] = None
+        elif kind == 'short_name':
+            names[positions] = 'A'
+        elif kind == 'empty_phone':
+            phones[positions] = None
+        elif kind == 'short_phone':
+            phones[positions] = '98765'
+        elif kind == 'bad_start_date':
+            starts[positions] = '31-02-2025'
+        elif kind == 'bad_end_date':
+            ends[positions] = 'next month'
+        elif kind == 'end_before_start':
+            starts[positions] = (end_dates[positions] + pd.Timedelta(days=365)).strftime('%d-%m-%Y')
+
+    return pd.DataFrame({
+        'Customer Name': names,
+        'Contact': phones,
+        'Subscription Start Date': starts,
+        'Subscription End Date': ends,
+    }, columns=COLUMNS, dtype=object)
+
+
+def write_xlsx(df: pd.DataFrame, target: Union[str, io.IOBase]):
+    """Write a member frame as .xlsx with openpyxl's write-only mode."""
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet("Members")
+    sheet.append(list(df.columns))
+
+    for row in zip(*(df[column].tolist() for column in df.columns)):
+        sheet.append([None if value is None or value != value else value for value in row])
+
+    workbook.save(target)
+
+
+class SyntheticUpload(io.BytesIO):
+    """In-memory .xlsx with the name/size attributes of a Streamlit upload."""
+
+    def __init__(self, data: bytes, name: str):
+        super().__init__(data)
+        self.name = name
+        self.size = len(data)
+
+
+def make_upload(rows: int, seed: int = 42, today: Optional[datetime] = None) -> SyntheticUpload:
+    """Generate members and return them as an in-memory .xlsx upload."""
+    buffer = io.BytesIO()
+    write_xlsx(generate_members(rows, seed=seed, today=today), buffer)
+    return SyntheticUpload(buffer.getvalue(), f"synthetic_{rows}.xlsx")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=STANDARD_SIZES)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--out-dir", default=os.path.join("benchmarks", "data"))
+    args = parser.parse_args()
+
+    os.makedirs(args.out_dir, exist_ok=True)
+    for rows in args.rows:
+        path = os.path.join(args.out_dir, f"members_{rows}.xlsx")
+        write_xlsx(generate_members(rows, seed=args.seed), path)
+        print(f"Wrote {rows:,} rows to {path} ({os.path.getsize(path) / 1e6:.1f} MB)")
+
+
+if __name__ == "__main__":
+    main()
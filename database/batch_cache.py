@@ -0,0 +1,154 @@
+"""Process-wide read-through cache for batch reads."""
+
+import os
+import sys
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable, Optional, Tuple
+
+
+DEFAULT_CACHE_BYTES = 256 * 1024 * 1024
+
+# Items measured when estimating the size of a long list
+SIZE_SAMPLE = 100
+
+
+def estimate_size(value) -> int:
+    """
+    Approximate memory held by a query result in bytes.
+
+    Lists longer than SIZE_SAMPLE are measured on evenly spaced items and
+    scaled, so sizing a large batch stays cheap.
+    """
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(
+            estimate_size(key) + estimate_size(item) for key, item in value.items()
+        )
+    if isinstance(value, (list, tuple)):
+        size = sys.getsizeof(value)
+        if not value:
+            return size
+        if len(value) <= SIZE_SAMPLE:
+            return size + sum(estimate_size(item) for item in value)
+        step = len(value) / SIZE_SAMPLE
+        sample = sum(estimate_size(value[int(i * step)]) for i in range(SIZE_SAMPLE))
+        return size + int(sample * len(value) / SIZE_SAMPLE)
+    return sys.getsizeof(value)
+
+
+class BatchCache:
+    """
+    LRU cache of query results under a memory budget.
+
+    Entries are keyed by (kind, key), e.g. ('messages', batch_id) or
+    ('upload_history', user_id). Batches do not change once saved, so
+    entries only need dropping when a batch is written or deleted; the
+    DatabaseManager write methods call invalidate().
+
+    Cached values are shared between callers and must not be modified.
+    """
+
+    def __init__(self, max_bytes: int = DEFAULT_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[Tuple[str, Hashable], Tuple[object, int]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.current_bytes = 0
+        # Bumped by invalidate(), so loads that raced a write are not cached
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get_or_load(self, kind: str, key: Hashable, loader: Callable[[], object]):
+        """Return the cached value, or load, cache and return it."""
+        cache_key = (kind, key)
+
+        with self._lock:
+            entry = self._entries.get(cache_key)
+            if entry is not None:
+                self._entries.move_to_end(cache_key)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+            generation = self._generation
+
+        # Load outside the lock so slow queries don't block other readers
+        value = loader()
+        size = estimate_size(value)
+
+        with self._lock:
+            if size > self.max_bytes or generation != self._generation:
+                return value
+
+            previous = self._entries.pop(cache_key, None)
+            if previous is not None:
+                self.current_bytes -= previous[1]
+
+            self._entries[cache_key] = (value, size)
+            self.current_bytes += size
+
+            while self.current_bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self.current_bytes -= evicted_size
+                self.evictions += 1
+
+        return value
+
+    def invalidate(self, kind: Optional[str] = None, key: Optional[Hashable] = None):
+        """
+        Drop cached entries.
+
+        With kind and key, drops that entry; with key only, every kind for
+        that key; with kind only, every entry of that kind; with neither,
+        everything.
+        """
+        with self._lock:
+            self._generation += 1
+            for cache_key in list(self._entries):
+                entry_kind, entry_key = cache_key
+                if kind is not None and entry_kind != kind:
+                    continue
+                if key is not None and entry_key != key:
+                    continue
+                _, size = self._entries.pop(cache_key)
+                self.current_bytes -= size
+
+    def stats(self) -> Dict[str, int]:
+        """Hit/miss counters and current usage."""
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'entries': len(self._entries),
+                'bytes': self.current_bytes,
+                'max_bytes': self.max_bytes,
+            }
+
+
+_caches: Dict[str, BatchCache] = {}
+_caches_lock = threading.Lock()
+
+
+def get_batch_cache(db_path: str, max_bytes: Optional[int] = None) -> BatchCache:
+    """
+    Get the process-wide cache for a database file.
+
+    max_bytes, when given, updates the budget of an existing cache.
+    """
+    db_path = os.path.abspath(db_path)
+
+    with _caches_lock:
+        cache = _caches.get(db_path)
+        if cache is None:
+            cache = BatchCache(max_bytes or DEFAULT_CACHE_BYTES)
+            _caches[db_path] = cache
+        elif max_bytes is not None:
+            cache.max_bytes = max_bytes
+        return cache
+
+
+def clear_all_caches():
+    """Drop every process-wide cache (used by tests and benchmarks)."""
+    with _caches_lock:
+        _caches.clear()
@@ -0,0 +1,164 @@
+"""Thread-safe SQLite connection pool."""
+
+import os
+import sqlite3
+import threading
+from typing import Dict, Optional, Tuple, Union
+
+
+# PRAGMAs applied once to every pooled connection when it is opened
+DEFAULT_PRAGMAS: Dict[str, Union[int, str]] = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,          # milliseconds
+    'mmap_size': 268435456,        # 256 MB
+    'cache_size': -65536,          # negative = KiB, i.e. 64 MB
+}
+
+DEFAULT_POOL_SIZE = 8
+
+
+class PoolTimeoutError(sqlite3.OperationalError):
+    """Raised when no pooled connection becomes available in time."""
+
+
+class ConnectionPool:
+    """
+    Bounded pool of SQLite connections with one connection per thread.
+
+    A thread checks out a connection with acquire() and hands it back with
+    release(). Nested acquire() calls on the same thread return the same
+    connection, so a method can call another method without opening a
+    second connection. Idle connections are reused by other threads; when
+    pool_size connections are checked out, acquire() waits for one.
+    """
+
+    def __init__(self, db_path: str, pool_size: int = DEFAULT_POOL_SIZE,
+                 pragmas: Optional[Dict[str, Union[int, str]]] = None,
+                 timeout: float = 30.0):
+        """Initialize pool. Connections are opened lazily."""
+        if pool_size < 1:
+            raise ValueError("pool_size must be at least 1")
+
+        self.db_path = db_path
+        self.pool_size = pool_size
+        self.pragmas = dict(DEFAULT_PRAGMAS if pragmas is None else pragmas)
+        self.timeout = timeout
+
+        self._condition = threading.Condition()
+        self._idle = []
+        self._all = []
+        self._local = threading.local()
+        self._closed = False
+
+    def _open_connection(self) -> sqlite3.Connection:
+        """Open a new connection and apply PRAGMAs."""
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=self.pragmas.get('busy_timeout', 5000) / 1000,
+            check_same_thread=False,
+        )
+        conn.row_factory = sqlite3.Row
+
+        for name, value in self.pragmas.items():
+            conn.execute(f"PRAGMA {name} = {value}")
+
+        return conn
+
+    def acquire(self) -> sqlite3.Connection:
+        """Check out the calling thread's connection."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            self._local.depth += 1
+            return conn
+
+        with self._condition:
+            if self._closed:
+                raise sqlite3.ProgrammingError("Connection pool is closed")
+
+            while not self._idle and len(self._all) >= self.pool_size:
+                if not self._condition.wait(timeout=self.timeout):
+                    raise PoolTimeoutError(
+                        f"No database connection available after {self.timeout}s "
+                        f"(pool_size={self.pool_size})"
+                    )
+
+            if self._idle:
+                conn = self._idle.pop()
+            else:
+                conn = self._open_connection()
+                self._all.append(conn)
+
+        self._local.conn = conn
+        self._local.depth = 1
+        return conn
+
+    def release(self, conn: sqlite3.Connection):
+        """Return a connection checked out with acquire()."""
+        if getattr(self._local, 'conn', None) is not conn:
+            raise sqlite3.ProgrammingError("Connection was not acquired by this thread")
+
+        self._local.depth -= 1
+        if self._local.depth > 0:
+            return
+
+        # Never hand a connection with an open transaction to another thread
+        if conn.in_transaction:
+            conn.rollback()
+
+        self._local.conn = None
+
+        with self._condition:
+            if self._closed:
+                conn.close()
+                self._all.remove(conn)
+            else:
+                self._idle.append(conn)
+                self._condition.notify()
+
+    def stats(self) -> Tuple[int, int]:
+        """Return (open_connections, idle_connections)."""
+        with self._condition:
+            return len(self._all), len(self._idle)
+
+    def close(self):
+        """Close idle connections; checked-out ones close on release."""
+        with self._condition:
+            self._closed = True
+            for conn in self._idle:
+                conn.close()
+                self._all.remove(conn)
+            self._idle = []
+            self._condition.notify_all()
+
+
+_pools: Dict[Tuple, ConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(db_path: str, pool_size: int = DEFAULT_POOL_SIZE,
+             pragmas: Optional[Dict[str, Union[int, str]]] = None) -> ConnectionPool:
+    """
+    Get the process-wide pool for a database file.
+
+    Pools are shared by every DatabaseManager pointing at the same file with
+    the same settings, so Streamlit reruns reuse already-open connections.
+    """
+    db_path = os.path.abspath(db_path)
+    pragmas = dict(DEFAULT_PRAGMAS if pragmas is None else pragmas)
+    key = (db_path, pool_size, tuple(sorted(pragmas.items())))
+
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None or pool._closed:
+            pool = ConnectionPool(db_path, pool_size=pool_size, pragmas=pragmas)
+            _pools[key] = pool
+        return pool
+
+
+def close_all_pools():
+    """Close every process-wide pool (used by tests and benchmarks)."""
+    with _pools_lock:
+        for pool in _pools.values():
+            pool.close()
+        _pools.clear()
@@ -1,59 +1,288 @@
 """Database manager for all database operations."""
 
+import functools
+import inspect
+import json
+import re
 import sqlite3
-from datetime import datetime
-from typing import Optional, List, Dict, Tuple
+import threading
+import types
+from contextlib import nullcontext
+from datetime import datetime, timedelta
+from itertools import chain
+from typing import Callable, Optional, List, Dict, Iterator, Sequence, Tuple
 import os
+from .connection_pool import get_pool, DEFAULT_POOL_SIZE
+from .batch_cache import BatchCache, get_batch_cache
+from .sharding import ShardSet, get_shard_set
 from .models import (
     CREATE_USERS_TABLE,
+    CREATE_BATCH_DIRECTORY_TABLE,
     CREATE_SUBSCRIPTIONS_TABLE,
     CREATE_MESSAGES_TABLE,
     CREATE_UPLOAD_HISTORY_TABLE,
-    CREATE_INDEXES,
+    CREATE_JOBS_TABLE,
+    CREATE_MEMBERS_TABLE,
+    CREATE_MEMBER_CHANGES_TABLE,
+    ADDED_COLUMNS,
+    INDEX_MIGRATIONS,
+    SCHEMA_VERSION,
 )
+from utils.tracing import traced_query
+
+
+# Database files whose schema is known to be current in this process
+_schema_ready = set()
+_schema_lock = threading.Lock()
+
+# Set HERCULES_SHARDS=1 to keep each gym's data in its own database file
+# (see DatabaseManager). Read once at import.
+SHARDING_ENABLED = os.environ.get("HERCULES_SHARDS", "").lower() in ("1", "true", "yes", "on")
+
+# Directory next to the shared database file holding the tenant shards
+SHARD_DIR_NAME = "tenants"
+
+
+def routed(by: str, registers_batch: bool = False) -> Callable:
+    """
+    Mark a tenant-data method to run on the database of the tenant it concerns.
+
+    `by` names the argument identifying the tenant: 'user_id', or
+    'batch_id' (whose owner is looked up in the batch directory; unknown
+    batches read the shared file's empty tables). With registers_batch
+    the call's batch_id is recorded in the batch directory as the
+    tenant's before anything is written.
+
+    The method itself is left as is; sharded DatabaseManagers install a
+    routing wrapper per instance (see _route), so unsharded ones pay
+    nothing. The wrapper calls the shard's method, which is traced there.
+    """
+    def decorate(method: Callable) -> Callable:
+        method.routed_by = (by, registers_batch)
+        return method
+
+    return decorate
+
+
+def _route(method: Callable) -> Callable:
+    """Wrap a @routed method to run on the owning tenant's shard."""
+    by, registers_batch = method.routed_by
+    signature = inspect.signature(method)
+    name = method.__name__
+
+    def target(self, args, kwargs):
+        arguments = signature.bind(self, *args, **kwargs).arguments
+        if by == 'user_id':
+            user_id = arguments.get('user_id')
+            if user_id is None:
+                raise ValueError(f"{name}() needs a user_id on a sharded database")
+            if registers_batch:
+                self._register_batch(arguments['batch_id'], user_id)
+            return self.shards.use(user_id)
+
+        owner = self._batch_owner(arguments['batch_id'])
+        return nullcontext(None) if owner is None else self.shards.use(owner)
+
+    if inspect.isgeneratorfunction(inspect.unwrap(method)):
+        @functools.wraps(method)
+        def generator(self, *args, **kwargs):
+            with target(self, args, kwargs) as shard:
+                if shard is None:
+                    yield from method(self, *args, **kwargs)
+                else:
+                    yield from getattr(shard, name)(*args, **kwargs)
+
+        return generator
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with target(self, args, kwargs) as shard:
+            if shard is None:
+                return method(self, *args, **kwargs)
+            return getattr(shard, name)(*args, **kwargs)
+
+    return wrapper
 
 
 class DatabaseManager:
-    """Handles all database operations."""
+    """
+    Handles all database operations.
+
+    With sharding on, db_path is a small shared database holding users,
+    jobs and the batch directory (batch ID -> owning user), and each
+    tenant's subscriptions, messages and upload history go to its own file
+    in shard_dir (see database.sharding). Tenant-data methods are routed
+    there (see routed()), so callers use the same API either way.
+    Split an existing single-file database with database/migrate_shards.py.
+    """
 
-    def __init__(self, db_path: str = "database/gym_management.db"):
-        """Initialize database connection."""
+    def __init__(self, db_path: str = "database/gym_management.db",
+                 pool_size: int = DEFAULT_POOL_SIZE,
+                 pragmas: Optional[Dict] = None,
+                 cache_bytes: Optional[int] = None,
+                 sharded: Optional[bool] = None,
+                 shard_dir: Optional[str] = None,
+                 max_open_shards: Optional[int] = None,
+                 cache: Optional[BatchCache] = None):
+        """
+        Initialize database connection pool.
+
+        Args:
+            db_path: Path to the SQLite database file
+            pool_size: Maximum number of pooled connections
+            pragmas: PRAGMAs applied to each new connection
+                (defaults to connection_pool.DEFAULT_PRAGMAS)
+            cache_bytes: Memory budget of the shared batch read cache
+                (defaults to batch_cache.DEFAULT_CACHE_BYTES)
+            sharded: Route tenant data to per-tenant files
+                (defaults to SHARDING_ENABLED)
+            shard_dir: Directory of the tenant files
+                (defaults to SHARD_DIR_NAME next to db_path)
+            max_open_shards: Tenant files kept open at once
+                (defaults to sharding.DEFAULT_MAX_OPEN_SHARDS)
+            cache: Read cache to use instead of the file's own; shards
+                share their router's
+        """
         self.db_path = db_path
-        self._ensure_database_exists()
-        self._create_tables()
+        self.pool = get_pool(db_path, pool_size=pool_size, pragmas=pragmas)
+        self.cache = cache or get_batch_cache(db_path, cache_bytes)
+        self._bootstrap_schema()
+
+        self.shards: Optional[ShardSet] = None
+        if SHARDING_ENABLED if sharded is None else sharded:
+            shard_dir = shard_dir or os.path.join(os.path.dirname(os.path.abspath(db_path)), SHARD_DIR_NAME)
+            factory = functools.partial(
+                DatabaseManager, pool_size=pool_size, pragmas=pragmas, sharded=False, cache=self.cache
+            )
+            self.shards = get_shard_set(shard_dir, factory, max_open_shards)
+            for name, method in ROUTED_METHODS.items():
+                setattr(self, name, types.MethodType(method, self))
+
+    def _bootstrap_schema(self):
+        """
+        Create or migrate the schema once per process and database file.
+
+        Pages construct a DatabaseManager on every rerun; after the first
+        one this is a set lookup and a stat (a deleted file is recreated).
+        """
+        key = os.path.abspath(self.db_path)
+        if key in _schema_ready and os.path.exists(self.db_path):
+            return
+
+        with _schema_lock:
+            if key in _schema_ready and os.path.exists(self.db_path):
+                return
+            self._ensure_database_exists()
+            self._create_tables()
+            _schema_ready.add(key)
 
     def _ensure_database_exists(self):
         """Create database directory if it doesn't exist."""
         os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
 
     def _get_connection(self) -> sqlite3.Connection:
-        """Get database connection."""
-        conn = sqlite3.Connection(self.db_path)
-        conn.row_factory = sqlite3.Row
-        return conn
+        """Check out this thread's pooled connection."""
+        return self.pool.acquire()
+
+    def _release_connection(self, conn: sqlite3.Connection):
+        """Return a connection to the pool."""
+        self.pool.release(conn)
 
     def _create_tables(self):
-        """Create all tables if they don't exist."""
+        """Create all tables if they don't exist and apply pending migrations."""
         conn = self._get_connection()
         cursor = conn.cursor()
 
         try:
+            # user_version reaches SCHEMA_VERSION only after every statement below ran
+            version = cursor.execute("PRAGMA user_version").fetchone()[0]
+            if version >= SCHEMA_VERSION:
+                return
+
             cursor.execute(CREATE_USERS_TABLE)
             cursor.execute(CREATE_SUBSCRIPTIONS_TABLE)
             cursor.execute(CREATE_MESSAGES_TABLE)
             cursor.execute(CREATE_UPLOAD_HISTORY_TABLE)
+            cursor.execute(CREATE_JOBS_TABLE)
+            cursor.execute(CREATE_BATCH_DIRECTORY_TABLE)
+            cursor.execute(CREATE_MEMBERS_TABLE)
+            cursor.execute(CREATE_MEMBER_CHANGES_TABLE)
+
+            for table, column, column_type in ADDED_COLUMNS:
+                existing = {row['name'] for row in cursor.execute(f"PRAGMA table_info({table})")}
+                if column not in existing:
+                    cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {column_type}")
 
-            for index_sql in CREATE_INDEXES:
-                cursor.execute(index_sql)
+            for step, statements in INDEX_MIGRATIONS:
+                if step > version:
+                    for index_sql in statements:
+                        cursor.execute(index_sql)
+                    cursor.execute(f"PRAGMA user_version = {step}")
 
             conn.commit()
         except Exception as e:
             conn.rollback()
             raise e
         finally:
-            conn.close()
+            self._release_connection(conn)
+
+    def _invalidate_batch(self, batch_id: str):
+        """Drop cached reads of a batch after it was written or deleted."""
+        self.cache.invalidate(key=batch_id)
+
+    def _invalidate_history(self):
+        """Drop cached upload history after an upload was recorded or changed."""
+        self.cache.invalidate(kind='upload_history')
+        self.cache.invalidate(kind='latest_batch_id')
+
+    # Batch directory (sharded databases)
+    def _batch_owner(self, batch_id: str) -> Optional[int]:
+        """User owning a batch according to the batch directory."""
+        user_id = self.shards.owner(batch_id)
+        if user_id is not None:
+            return user_id
+
+        conn = self._get_connection()
+        cursor = conn.cursor()
+
+        try:
+            cursor.execute("SELECT user_id FROM batch_directory WHERE batch_id = ?", (batch_id,))
+            row = cursor.fetchone()
+        finally:
+            self._release_connection(conn)
+
+        # Unknown batches are looked up again next time; they may be saved meanwhile
+        if row is None:
+            return None
+        self.shards.remember_owner(batch_id, row['user_id'])
+        return row['user_id']
+
+    def _register_batch(self, batch_id: str, user_id: int):
+        """Record a batch as the user's, so reads by batch ID find its shard."""
+        owner = self._batch_owner(batch_id)
+        if owner is None:
+            conn = self._get_connection()
+            cursor = conn.cursor()
+
+            try:
+                cursor.execute(
+                    "INSERT OR IGNORE INTO batch_directory (batch_id, user_id) VALUES (?, ?)",
+                    (batch_id, int(user_id))
+                )
+                conn.commit()
+            except Exception as e:
+                conn.rollback()
+                raise e
+            finally:
+                self._release_connection(conn)
+
+            owner = self._batch_owner(batch_id)
+
+        if owner != int(user_id):
+            raise ValueError(f"Batch {batch_id} belongs to another user")
 
     # User operations
+    @traced_query
     def create_user(self, email: str, password_hash: str, gym_name: str) -> Optional[int]:
         """Create a new user. Returns user_id if successful."""
         conn = self._get_connection()
@@ -67,13 +296,15 @@ class DatabaseManager:
             conn.commit()
             return cursor.lastrowid
         except sqlite3.IntegrityError:
+            conn.rollback()
             return None
         except Exception as e:
             conn.rollback()
             raise e
         finally:
-            conn.close()
+            self._release_connection(conn)
 
+    @traced_query
     def get_user_by_email(self, email: str) -> Optional[Dict]:
         """Get user by email."""
         conn = self._get_connection()
@@ -84,8 +315,22 @@ class DatabaseManager:
             row = cursor.fetchone()
             return dict(row) if row else None
         finally:
-            conn.close()
+            self._release_connection(conn)
+
+    @traced_query
+    def get_user(self, user_id: int) -> Optional[Dict]:
+        """Get user by ID."""
+        conn = self._get_connection()
+        cursor = conn.cursor()
+
+        try:
+            cursor.execute("SELECT * FROM users WHERE id = ?", (user_id,))
+            row = cursor.fetchone()
+            return dict(row) if row else None
+        finally:
+            self._release_connection(conn)
 
+    @traced_query
     def update_last_login(self, user_id: int):
         """Update user's last login timestamp."""
         conn = self._get_connection()
@@ -101,11 +346,24 @@ class DatabaseManager:
             conn.rollback()
             raise e
         finally:
-            conn.close()
+            self._release_connection(conn)
 
     # Subscription operations
+    @traced_query
     def save_subscriptions(self, subscriptions: List[Dict]) -> int:
         """Save multiple subscriptions. Returns count of saved records."""
+        if self.shards is not None:
+            # Each user's subscriptions go to their own shard
+            by_user: Dict[int, List[Dict]] = {}
+            for sub in subscriptions:
+                by_user.setdefault(sub['user_id'], []).append(sub)
+            for user_id, user_subscriptions in by_user.items():
+                for batch_id in {sub['upload_batch_id'] for sub in user_subscriptions}:
+                    self._register_batch(batch_id, user_id)
+                with self.shards.use(user_id) as shard:
+                    shard.save_subscriptions(user_subscriptions)
+            return len(subscriptions)
+
         conn = self._get_connection()
         cursor = conn.cursor()
 
@@ -128,28 +386,40 @@ class DatabaseManager:
                     )
                 )
             conn.commit()
+            for batch_id in {sub['upload_batch_id'] for sub in subscriptions}:
+                self._invalidate_batch(batch_id)
             return len(subscriptions)
         except Exception as e:
             conn.rollback()
             raise e
         finally:
-            conn.close()
+            self._release_connection(conn)
 
+    @routed('batch_id')
+    @traced_query
     def get_subscriptions_by_batch(self, batch_id: str) -> List[Dict]:
-        """Get all subscriptions for a batch."""
+        """
+        Get all subscriptions for a batch that are inside the 30-day window.
+
+        Members expiring later are stored with cluster 0 and no message, for
+        the daily refresh (see services.cluster_refresh), and left out here.
+        """
         conn = self._get_connection()
         cursor = conn.cursor()
 
         try:
             cursor.execute(
-                "SELECT * FROM subscriptions WHERE upload_batch_id = ? ORDER BY cluster, days_remaining",
+                """SELECT * FROM subscriptions WHERE upload_batch_id = ? AND cluster > 0
+                ORDER BY cluster, days_remaining, id""",
                 (batch_id,)
             )
             rows = cursor.fetchall()
             return [dict(row) for row in rows]
         finally:
-            conn.close()
+            self._release_connection(conn)
 
+    @routed('batch_id')
+    @traced_query
     def get_subscriptions_by_cluster(self, batch_id: str, cluster: int) -> List[Dict]:
         """Get subscriptions for a specific cluster."""
         conn = self._get_connection()
@@ -157,31 +427,46 @@ class DatabaseManager:
 
         try:
             cursor.execute(
-                "SELECT * FROM subscriptions WHERE upload_batch_id = ? AND cluster = ? ORDER BY days_remaining",
+                "SELECT * FROM subscriptions WHERE upload_batch_id = ? AND cluster = ? ORDER BY days_remaining, id",
                 (batch_id, cluster)
             )
             rows = cursor.fetchall()
             return [dict(row) for row in rows]
         finally:
-            conn.close()
+            self._release_connection(conn)
 
+    @routed('batch_id')
+    @traced_query
     def delete_subscriptions_by_batch(self, batch_id: str):
         """Delete all subscriptions for a batch."""
         conn = self._get_connection()
         cursor = conn.cursor()
 
         try:
+            cursor.execute(
+                """DELETE FROM members WHERE subscription_id IN
+                (SELECT id FROM subscriptions WHERE upload_batch_id = ?)""",
+                (batch_id,)
+            )
             cursor.execute("DELETE FROM subscriptions WHERE upload_batch_id = ?", (batch_id,))
             conn.commit()
+            self._invalidate_batch(batch_id)
         except Exception as e:
             conn.rollback()
             raise e
         finally:
-            conn.close()
+            self._release_connection(conn)
 
     # Message operations
-    def save_messages(self, messages: List[Dict]) -> int:
-        """Save multiple messages. Returns count of saved records."""
+    @routed('user_id')
+    @traced_query
+    def save_messages(self, messages: List[Dict], user_id: Optional[int] = None) -> int:
+        """
+        Save multiple messages. Returns count of saved records.
+
+        user_id (the owner of the messages' subscriptions) is required when
+        the database is sharded.
+        """
         conn = self._get_connection()
         cursor = conn.cursor()
 
@@ -193,33 +478,368 @@ class DatabaseManager:
                     (msg['subscription_id'], msg['message_text'], msg['cluster'])
                 )
             conn.commit()
+            # Messages only reference subscriptions, so drop every cached list
+            self.cache.invalidate(kind='messages')
             return len(messages)
         except Exception as e:
             conn.rollback()
             raise e
         finally:
-            conn.close()
+            self._release_connection(conn)
 
+    @routed('batch_id')
+    @traced_query
     def get_messages_by_batch(self, batch_id: str) -> List[Dict]:
+        """Get all messages for a batch with subscription details (cached, do not modify)."""
+        return self.cache.get_or_load(
+            'messages', batch_id, lambda: self._fetch_messages_by_batch(batch_id)
+        )
+
+    def _fetch_messages_by_batch(self, batch_id: str) -> List[Dict]:
         """Get all messages for a batch with subscription details."""
         conn = self._get_connection()
         cursor = conn.cursor()
 
         try:
             cursor.execute(
-                """SELECT m.*, s.customer_name, s.phone_number, s.subscription_end_date, s.days_remaining
-                FROM messages m
-                JOIN subscriptions s ON m.subscription_id = s.id
+                """SELECT m.id, m.subscription_id, m.message_text, m.cluster,
+                    s.customer_name, s.phone_number, s.subscription_end_date, s.days_remaining
+                FROM subscriptions s
+                JOIN messages m ON m.subscription_id = s.id
                 WHERE s.upload_batch_id = ?
-                ORDER BY m.cluster, s.days_remaining""",
+                ORDER BY s.cluster, s.days_remaining, s.id""",
                 (batch_id,)
             )
             rows = cursor.fetchall()
             return [dict(row) for row in rows]
         finally:
-            conn.close()
+            self._release_connection(conn)
+
+    @routed('batch_id')
+    def iter_message_rows(self, batch_id: str, chunk_size: int = 5000) -> Iterator[List[sqlite3.Row]]:
+        """
+        Stream a batch's messages in chunks straight from the cursor.
+
+        Rows are (customer_name, phone_number, subscription_end_date,
+        days_remaining, cluster, message_text), ordered by cluster, days
+        remaining, id. Only one chunk is held in memory at a time; the
+        pooled connection is held until the iterator is exhausted or closed.
+        """
+        conn = self._get_connection()
+        cursor = conn.cursor()
+
+        try:
+            cursor.execute(
+                """SELECT s.customer_name, s.phone_number, s.subscription_end_date,
+                    s.days_remaining, s.cluster, m.message_text
+                FROM subscriptions s
+                JOIN messages m ON m.subscription_id = s.id
+                WHERE s.upload_batch_id = ?
+                ORDER BY s.cluster, s.days_remaining, s.id""",
+                (batch_id,)
+            )
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                yield rows
+        finally:
+            cursor.close()
+            self._release_connection(conn)
+
+    @staticmethod
+    def _message_filters(batch_id: str, cluster: Optional[int] = None,
+                         search: Optional[str] = None) -> Tuple[str, List]:
+        """WHERE clause (over subscriptions s) for a filtered message listing."""
+        conditions = ["s.upload_batch_id = ?"]
+        params: List = [batch_id]
+
+        if cluster is not None:
+            conditions.append("s.cluster = ?")
+            params.append(cluster)
+        else:
+            # Cluster 0 members have no message yet
+            conditions.append("s.cluster > 0")
+
+        search = (search or "").strip()
+        if search:
+            escaped = search.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+            matches = ["s.customer_name LIKE ? ESCAPE '\\'"]
+            params.append(f"%{escaped}%")
+
+            # Match phone numbers on digits, whatever separators were typed
+            digits = re.sub(r'\D', '', search)
+            if digits:
+                matches.append("s.phone_number LIKE ?")
+                params.append(f"%{digits}%")
+
+            conditions.append(f"({' OR '.join(matches)})")
+
+        return " AND ".join(conditions), params
+
+    @routed('batch_id')
+    @traced_query
+    def count_messages(self, batch_id: str, cluster: Optional[int] = None,
+                       search: Optional[str] = None) -> int:
+        """Count messages in a batch matching the cluster/search filters."""
+        if not (search or "").strip():
+            # One message per subscription: served from the cached counts
+            counts = self.get_cluster_counts(batch_id)
+            return counts.get(cluster, 0) if cluster is not None else sum(counts.values())
+
+        where, params = self._message_filters(batch_id, cluster, search)
+        conn = self._get_connection()
+        cursor = conn.cursor()
+
+        try:
+            cursor.execute(f"SELECT COUNT(*) FROM subscriptions s WHERE {where}", params)
+            return cursor.fetchone()[0]
+        finally:
+            self._release_connection(conn)
+
+    @routed('batch_id')
+    @traced_query
+    def get_message_page(self, batch_id: str, cluster: Optional[int] = None,
+                         search: Optional[str] = None,
+                         after: Optional[Tuple[int, int, int]] = None,
+                         page_size: int = 50) -> Dict:
+        """
+        Get one page of a batch's messages, ordered by cluster, days remaining, id.
+
+        Keyset pagination: pass the previous page's next_cursor as `after`,
+        so each page costs the same however deep into the batch it is.
+
+        Args:
+            batch_id: Batch to list
+            cluster: Only this cluster (all clusters if None)
+            search: Case-insensitive name match, or phone digits match
+            after: Cursor (cluster, days_remaining, subscription_id) of the
+                last row already shown
+            page_size: Rows per page
+
+        Returns:
+            {'messages': rows, 'next_cursor': cursor or None, 'total': matching rows}
+        """
+        where, params = self._message_filters(batch_id, cluster, search)
+        if after is not None:
+            if cluster is not None:
+                # Cluster is fixed; comparing it too makes SQLite sort the id part
+                where += " AND (s.days_remaining, s.id) > (?, ?)"
+                params.extend(after[1:])
+            else:
+                where += " AND (s.cluster, s.days_remaining, s.id) > (?, ?, ?)"
+                params.extend(after)
+
+        conn = self._get_connection()
+        cursor = conn.cursor()
+
+        try:
+            cursor.execute(
+                f"""SELECT s.id AS subscription_id, s.customer_name, s.phone_number,
+                    s.subscription_end_date, s.days_remaining, s.cluster, m.message_text
+                FROM subscriptions s
+                JOIN messages m ON m.subscription_id = s.id
+                WHERE {where}
+                ORDER BY s.cluster, s.days_remaining, s.id
+                LIMIT ?""",
+                params + [page_size + 1]
+            )
+            rows = [dict(row) for row in cursor.fetchall()]
+        finally:
+            self._release_connection(conn)
+
+        next_cursor = None
+        if len(rows) > page_size:
+            rows = rows[:page_size]
+            last = rows[-1]
+            next_cursor = (last['cluster'], last['days_remaining'], last['subscription_id'])
+
+        return {
+            'messages': rows,
+            'next_cursor': next_cursor,
+            'total': self.count_messages(batch_id, cluster, search)
+        }
+
+    # Batch ingest
+    @routed('user_id', registers_batch=True)
+    @traced_query
+    def save_upload_batch(self, user_id: int, batch_id: str, filename: str,
+                          total_rows: int, subscriptions: Sequence[Dict],
+                          messages: Sequence[Dict], upcoming: Sequence[Dict] = ()) -> List[int]:
+        """
+        Save a processed upload in one atomic transaction.
+
+        Writes the subscriptions, their messages and the upload_history row
+        together; if any insert fails nothing from the batch is kept.
+
+        Args:
+            user_id: Owner of the batch
+            batch_id: Upload batch ID
+            filename: Original filename
+            total_rows: Number of rows in the cleaned upload
+            subscriptions: Subscription dicts (same keys as save_subscriptions)
+            messages: Message dicts with 'message_text' and 'cluster';
+                messages[i] belongs to subscriptions[i]
+            upcoming: Subscriptions beyond the 30-day window (cluster 0),
+                stored without messages for the daily refresh; not counted
+                as processed rows
+
+        Returns:
+            Subscription IDs in the order of `subscriptions`
+        """
+        if len(messages) != len(subscriptions):
+            raise ValueError("Each subscription needs exactly one message")
+
+        conn = self._get_connection()
+        cursor = conn.cursor()
+
+        try:
+            # Take the write lock up front so the ID range below stays ours
+            cursor.execute("BEGIN IMMEDIATE")
+            subscription_ids = self._insert_batch_rows(cursor, subscriptions, messages, upcoming)[:len(subscriptions)]
+
+            cursor.execute(
+                """INSERT INTO upload_history (user_id, batch_id, filename, total_rows, processed_rows)
+                VALUES (?, ?, ?, ?, ?)""",
+                (user_id, batch_id, filename, total_rows, len(subscriptions))
+            )
+
+            conn.commit()
+            self._invalidate_batch(batch_id)
+            self._invalidate_history()
+            return subscription_ids
+        except Exception as e:
+            conn.rollback()
+            raise e
+        finally:
+            self._release_connection(conn)
+
+    @routed('user_id', registers_batch=True)
+    @traced_query
+    def save_batch_chunk(self, user_id: int, batch_id: str, subscriptions: Sequence[Dict],
+                         messages: Sequence[Dict], upcoming: Sequence[Dict] = ()) -> List[int]:
+        """
+        Save one chunk of a streamed upload in its own transaction.
+
+        The chunk's rows are queryable as soon as this returns; the batch
+        only shows up in upload history once save_upload_history() records
+        it. Use delete_batch_rows() to drop the chunks of an upload that
+        failed part-way.
+
+        Args:
+            user_id: Owner of the batch
+            batch_id: Upload batch ID
+            subscriptions: Subscription dicts (same keys as save_subscriptions)
+            messages: Message dicts with 'message_text' and 'cluster';
+                messages[i] belongs to subscriptions[i]
+            upcoming: Cluster 0 subscriptions, as for save_upload_batch()
+
+        Returns:
+            Subscription IDs in the order of `subscriptions`
+        """
+        if len(messages) != len(subscriptions):
+            raise ValueError("Each subscription needs exactly one message")
+
+        conn = self._get_connection()
+        cursor = conn.cursor()
+
+        try:
+            cursor.execute("BEGIN IMMEDIATE")
+            subscription_ids = self._insert_batch_rows(cursor, subscriptions, messages, upcoming)[:len(subscriptions)]
+            conn.commit()
+            self._invalidate_batch(batch_id)
+            return subscription_ids
+        except Exception as e:
+            conn.rollback()
+            raise e
+        finally:
+            self._release_connection(conn)
+
+    @staticmethod
+    def _insert_batch_rows(cursor: sqlite3.Cursor, subscriptions: Sequence[Dict],
+                           messages: Sequence[Dict], upcoming: Sequence[Dict] = ()) -> List[int]:
+        """
+        Insert subscriptions and their messages; the caller holds the write lock.
+
+        Returns:
+            IDs of `subscriptions` followed by those of `upcoming`
+            (message-less subscriptions)
+        """
+        # Assign IDs explicitly instead of reading the batch back
+        first_id = DatabaseManager._next_id(cursor, 'subscriptions')
+        subscription_ids = list(range(first_id, first_id + len(subscriptions)))
+        upcoming_ids = list(range(first_id + len(subscriptions), first_id + len(subscriptions) + len(upcoming)))
+
+        cursor.executemany(
+            """INSERT INTO subscriptions
+            (id, user_id, upload_batch_id, customer_name, phone_number,
+             subscription_start_date, subscription_end_date, days_remaining, cluster)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+            (
+                (
+                    sub_id,
+                    sub['user_id'],
+                    sub['upload_batch_id'],
+                    sub['customer_name'],
+                    sub['phone_number'],
+                    sub['subscription_start_date'],
+                    sub['subscription_end_date'],
+                    sub['days_remaining'],
+                    sub['cluster']
+                )
+                for sub_id, sub in chain(zip(subscription_ids, subscriptions), zip(upcoming_ids, upcoming))
+            )
+        )
+
+        cursor.executemany(
+            """INSERT INTO messages (subscription_id, message_text, cluster)
+            VALUES (?, ?, ?)""",
+            (
+                (sub_id, msg['message_text'], msg['cluster'])
+                for sub_id, msg in zip(subscription_ids, messages)
+            )
+        )
+
+        return subscription_ids + upcoming_ids
+
+    @staticmethod
+    def _next_id(cursor: sqlite3.Cursor, table: str) -> int:
+        """First ID AUTOINCREMENT would hand out next; the caller holds the write lock."""
+        cursor.execute(
+            f"""SELECT MAX(
+                COALESCE((SELECT seq FROM sqlite_sequence WHERE name = '{table}'), 0),
+                COALESCE((SELECT MAX(id) FROM {table}), 0)
+            )"""
+        )
+        return cursor.fetchone()[0] + 1
+
+    @routed('batch_id')
+    @traced_query
+    def delete_batch_rows(self, batch_id: str):
+        """Delete a batch's subscriptions together with their messages and members."""
+        conn = self._get_connection()
+        cursor = conn.cursor()
+
+        try:
+            cursor.execute("BEGIN IMMEDIATE")
+            for table in ("messages", "members"):
+                cursor.execute(
+                    f"""DELETE FROM {table} WHERE subscription_id IN
+                    (SELECT id FROM subscriptions WHERE upload_batch_id = ?)""",
+                    (batch_id,)
+                )
+            cursor.execute("DELETE FROM subscriptions WHERE upload_batch_id = ?", (batch_id,))
+            conn.commit()
+            self._invalidate_batch(batch_id)
+        except Exception as e:
+            conn.rollback()
+            raise e
+        finally:
+            self._release_connection(conn)
 
     # Upload history operations
+    @routed('user_id', registers_batch=True)
+    @traced_query
     def save_upload_history(self, user_id: int, batch_id: str, filename: str,
                            total_rows: int, processed_rows: int) -> int:
         """Save upload history. Returns history_id."""
@@ -233,14 +853,23 @@ class DatabaseManager:
                 (user_id, batch_id, filename, total_rows, processed_rows)
             )
             conn.commit()
+            self._invalidate_history()
             return cursor.lastrowid
         except Exception as e:
             conn.rollback()
             raise e
         finally:
-            conn.close()
+            self._release_connection(conn)
 
+    @routed('user_id')
+    @traced_query
     def get_upload_history(self, user_id: int, limit: int = 10) -> List[Dict]:
+        """Get upload history for a user (cached, do not modify)."""
+        return self.cache.get_or_load(
+            'upload_history', (user_id, limit), lambda: self._fetch_upload_history(user_id, limit)
+        )
+
+    def _fetch_upload_history(self, user_id: int, limit: int = 10) -> List[Dict]:
         """Get upload history for a user."""
         conn = self._get_connection()
         cursor = conn.cursor()
@@ -249,34 +878,78 @@ class DatabaseManager:
             cursor.execute(
                 """SELECT * FROM upload_history
                 WHERE user_id = ?
-                ORDER BY upload_date DESC
+                ORDER BY upload_date DESC, id DESC
                 LIMIT ?""",
                 (user_id, limit)
             )
             rows = cursor.fetchall()
-            return [dict(row) for row in rows]
+            return [self._history_from_row(row) for row in rows]
+        finally:
+            self._release_connection(conn)
+
+    @routed('batch_id')
+    @traced_query
+    def update_upload_timings(self, batch_id: str, timings: Dict[str, float]):
+        """Store the per-stage processing time (seconds) of an upload."""
+        conn = self._get_connection()
+        cursor = conn.cursor()
+
+        try:
+            cursor.execute(
+                "UPDATE upload_history SET timings = ? WHERE batch_id = ?",
+                (json.dumps(timings), batch_id)
+            )
+            conn.commit()
+            self._invalidate_history()
+        except Exception as e:
+            conn.rollback()
+            raise e
         finally:
-            conn.close()
+            self._release_connection(conn)
+
+    @staticmethod
+    def _history_from_row(row: sqlite3.Row) -> Dict:
+        """Convert an upload_history row, decoding its timings."""
+        record = dict(row)
+        record['timings'] = json.loads(record['timings']) if record['timings'] else {}
+        return record
 
+    @routed('user_id')
+    @traced_query
     def get_latest_batch_id(self, user_id: int) -> Optional[str]:
+        """Get the latest batch_id for a user (cached)."""
+        return self.cache.get_or_load(
+            'latest_batch_id', user_id, lambda: self._fetch_latest_batch_id(user_id)
+        )
+
+    def _fetch_latest_batch_id(self, user_id: int) -> Optional[str]:
         """Get the latest batch_id for a user."""
         conn = self._get_connection()
         cursor = conn.cursor()
 
         try:
+            # A delta upload's rows are in the batch it changed
             cursor.execute(
-                """SELECT batch_id FROM upload_history
+                """SELECT COALESCE(base_batch_id, batch_id) AS batch_id FROM upload_history
                 WHERE user_id = ?
-                ORDER BY upload_date DESC
+                ORDER BY upload_date DESC, id DESC
                 LIMIT 1""",
                 (user_id,)
             )
             row = cursor.fetchone()
             return row['batch_id'] if row else None
         finally:
-            conn.close()
+            self._release_connection(conn)
 
+    @routed('batch_id')
+    @traced_query
     def get_cluster_counts(self, batch_id: str) -> Dict[int, int]:
+        """Get count of subscriptions per cluster for a batch (cached, do not modify)."""
+        return self.cache.get_or_load(
+            'cluster_counts', batch_id, lambda: self._fetch_cluster_counts(batch_id)
+        )
+
+    def _fetch_cluster_counts(self, batch_id: str) -> Dict[int, int]:
         """Get count of subscriptions per cluster for a batch."""
         conn = self._get_connection()
         cursor = conn.cursor()
@@ -285,11 +958,517 @@ class DatabaseManager:
             cursor.execute(
                 """SELECT cluster, COUNT(*) as count
                 FROM subscriptions
-                WHERE upload_batch_id = ?
+                WHERE upload_batch_id = ? AND cluster > 0
                 GROUP BY cluster""",
                 (batch_id,)
             )
             rows = cursor.fetchall()
             return {row['cluster']: row['count'] for row in rows}
         finally:
-            conn.close()
+            self._release_connection(conn)
+
+    # Members and delta uploads
+    @routed('user_id')
+    @traced_query
+    def get_members(self, user_id: int) -> List[Dict]:
+        """Get a user's current members (id, phone_key, row_hash, subscription_id)."""
+        conn = self._get_connection()
+        cursor = conn.cursor()
+
+        try:
+            cursor.execute(
+                "SELECT id, phone_key, row_hash, subscription_id FROM members WHERE user_id = ?",
+                (user_id,)
+            )
+            return [dict(row) for row in cursor.fetchall()]
+        finally:
+            self._release_connection(conn)
+
+    @routed('user_id')
+    @traced_query
+    def get_member_batch_id(self, user_id: int) -> Optional[str]:
+        """Get the batch holding a user's members (their live batch), if any."""
+        conn = self._get_connection()
+        cursor = conn.cursor()
+
+        try:
+            cursor.execute(
+                """SELECT s.upload_batch_id FROM members m
+                JOIN subscriptions s ON s.id = m.subscription_id
+                WHERE m.user_id = ? LIMIT 1""",
+                (user_id,)
+            )
+            row = cursor.fetchone()
+            return row['upload_batch_id'] if row else None
+        finally:
+            self._release_connection(conn)
+
+    @routed('user_id', registers_batch=True)
+    @traced_query
+    def apply_member_delta(self, user_id: int, batch_id: str, base_batch_id: str,
+                           filename: str, total_rows: int, changed: Sequence[Dict],
+                           removed: Sequence[Dict]) -> int:
+        """
+        Write a delta upload in one atomic transaction.
+
+        New members are added to base_batch_id (the user's live batch, or
+        batch_id itself for the user's first delta upload), changed members'
+        subscriptions and messages are rewritten in place and removed members
+        are deleted; unchanged members are not touched. Each change is
+        recorded in member_changes under batch_id, and batch_id goes into
+        upload history pointing at base_batch_id.
+
+        Args:
+            changed: Subscription dicts (as for save_upload_batch) plus
+                'member_id' and 'subscription_id' (0 for new members),
+                'phone_key', 'row_hash' and 'message_text' (None for
+                cluster 0)
+            removed: Dicts with 'id' (member), 'phone_key' and 'subscription_id'
+
+        Returns:
+            Members listed (cluster > 0) in base_batch_id afterwards
+        """
+        inserts = sorted((c for c in changed if not c['member_id']), key=lambda c: not c['cluster'])
+        updates = [c for c in changed if c['member_id']]
+        listed = [c for c in inserts if c['cluster']]
+
+        conn = self._get_connection()
+        cursor = conn.cursor()
+
+        try:
+            cursor.execute("BEGIN IMMEDIATE")
+
+            subscription_ids = self._insert_batch_rows(
+                cursor, listed, listed, [c for c in inserts if not c['cluster']]
+            )
+            first_member_id = self._next_id(cursor, 'members')
+            member_ids = list(range(first_member_id, first_member_id + len(inserts)))
+            cursor.executemany(
+                """INSERT INTO members
+                (id, user_id, phone_key, row_hash, subscription_id, first_batch_id, last_batch_id)
+                VALUES (?, ?, ?, ?, ?, ?, ?)""",
+                (
+                    (member_id, user_id, c['phone_key'], c['row_hash'], sub_id, batch_id, batch_id)
+                    for member_id, sub_id, c in zip(member_ids, subscription_ids, inserts)
+                )
+            )
+
+            cursor.executemany(
+                """UPDATE subscriptions SET customer_name = ?, phone_number = ?,
+                subscription_start_date = ?, subscription_end_date = ?, days_remaining = ?, cluster = ?
+                WHERE id = ?""",
+                (
+                    (c['customer_name'], c['phone_number'], c['subscription_start_date'],
+                     c['subscription_end_date'], c['days_remaining'], c['cluster'], c['subscription_id'])
+                    for c in updates
+                )
+            )
+            cursor.executemany(
+                "DELETE FROM messages WHERE subscription_id = ?",
+                ((c['subscription_id'],) for c in updates)
+            )
+            cursor.executemany(
+                "INSERT INTO messages (subscription_id, message_text, cluster) VALUES (?, ?, ?)",
+                ((c['subscription_id'], c['message_text'], c['cluster']) for c in updates if c['cluster'])
+            )
+            cursor.executemany(
+                """UPDATE members SET row_hash = ?, last_batch_id = ?, updated_at = CURRENT_TIMESTAMP
+                WHERE id = ?""",
+                ((c['row_hash'], batch_id, c['member_id']) for c in updates)
+            )
+
+            for table, key in (("messages", "subscription_id"), ("subscriptions", "id")):
+                cursor.executemany(
+                    f"DELETE FROM {table} WHERE {key} = ?",
+                    ((r['subscription_id'],) for r in removed)
+                )
+            cursor.executemany("DELETE FROM members WHERE id = ?", ((r['id'],) for r in removed))
+
+            cursor.executemany(
+                """INSERT INTO member_changes (user_id, batch_id, member_id, phone_key, change_type)
+                VALUES (?, ?, ?, ?, ?)""",
+                chain(
+                    ((user_id, batch_id, member_id, c['phone_key'], 'insert')
+                     for member_id, c in zip(member_ids, inserts)),
+                    ((user_id, batch_id, c['member_id'], c['phone_key'], 'update') for c in updates),
+                    ((user_id, batch_id, r['id'], r['phone_key'], 'remove') for r in removed),
+                )
+            )
+
+            cursor.execute(
+                "SELECT COUNT(*) FROM subscriptions WHERE upload_batch_id = ? AND cluster > 0",
+                (base_batch_id,)
+            )
+            processed_rows = cursor.fetchone()[0]
+            cursor.execute(
+                """INSERT INTO upload_history
+                (user_id, batch_id, filename, total_rows, processed_rows, base_batch_id)
+                VALUES (?, ?, ?, ?, ?, ?)""",
+                (user_id, batch_id, filename, total_rows, processed_rows, base_batch_id)
+            )
+
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            raise e
+        finally:
+            self._release_connection(conn)
+
+        self._invalidate_batch(base_batch_id)
+        self._invalidate_history()
+        return processed_rows
+
+    @routed('batch_id')
+    @traced_query
+    def get_member_changes(self, batch_id: str) -> Dict[str, int]:
+        """Get the number of members a delta upload inserted, updated and removed."""
+        conn = self._get_connection()
+        cursor = conn.cursor()
+
+        try:
+            cursor.execute(
+                """SELECT change_type, COUNT(*) AS count FROM member_changes
+                WHERE batch_id = ? GROUP BY change_type""",
+                (batch_id,)
+            )
+            counts = {'insert': 0, 'update': 0, 'remove': 0}
+            counts.update({row['change_type']: row['count'] for row in cursor.fetchall()})
+            return counts
+        finally:
+            self._release_connection(conn)
+
+    # Daily refresh (see services.cluster_refresh)
+    @traced_query
+    def get_uploader_ids(self) -> List[int]:
+        """IDs of users with at least one upload."""
+        if self.shards is not None:
+            return self.shards.tenants()
+
+        conn = self._get_connection()
+        cursor = conn.cursor()
+
+        try:
+            cursor.execute("SELECT DISTINCT user_id FROM upload_history ORDER BY user_id")
+            return [row['user_id'] for row in cursor.fetchall()]
+        finally:
+            self._release_connection(conn)
+
+    @staticmethod
+    def _fetch_batch_as_of(cursor: sqlite3.Cursor, batch_id: str) -> Optional[datetime]:
+        """
+        Day a batch's days_remaining count from, or None if it is empty.
+
+        Every listed (cluster > 0) row agrees; cluster 0 rows keep their
+        upload-day count, which only matters while no row is listed.
+        """
+        cursor.execute(
+            """SELECT subscription_end_date, days_remaining FROM subscriptions
+            WHERE upload_batch_id = ? ORDER BY cluster DESC LIMIT 1""",
+            (batch_id,)
+        )
+        row = cursor.fetchone()
+        if row is None:
+            return None
+        end_date = datetime.strptime(row['subscription_end_date'], '%Y-%m-%d')
+        return end_date - timedelta(days=row['days_remaining'])
+
+    @routed('batch_id')
+    @traced_query
+    def get_batch_as_of(self, batch_id: str) -> Optional[datetime]:
+        """
+        Get the day a batch's days_remaining were counted from.
+
+        Returns:
+            Naive IST midnight (the upload day until the batch is refreshed),
+            or None for an empty or unknown batch
+        """
+        conn = self._get_connection()
+        cursor = conn.cursor()
+
+        try:
+            return self._fetch_batch_as_of(cursor, batch_id)
+        finally:
+            self._release_connection(conn)
+
+    @routed('batch_id')
+    @traced_query
+    def get_subscriptions_ending_between(self, batch_id: str,
+                                         ranges: Sequence[Tuple[str, str]]) -> List[Dict]:
+        """
+        Get a batch's subscriptions whose end date falls in any of the ranges.
+
+        Args:
+            ranges: Inclusive ('YYYY-MM-DD', 'YYYY-MM-DD') end date ranges,
+                each answered from idx_subscriptions_batch_end
+
+        Returns:
+            Subscription dicts (id, customer_name, subscription_end_date,
+            days_remaining, cluster)
+        """
+        conn = self._get_connection()
+        cursor = conn.cursor()
+
+        try:
+            subscriptions = []
+            for first, last in ranges:
+                cursor.execute(
+                    """SELECT id, customer_name, subscription_end_date, days_remaining, cluster
+                    FROM subscriptions
+                    WHERE upload_batch_id = ? AND subscription_end_date BETWEEN ? AND ?""",
+                    (batch_id, first, last)
+                )
+                subscriptions.extend(dict(row) for row in cursor.fetchall())
+            return subscriptions
+        finally:
+            self._release_connection(conn)
+
+    @routed('batch_id')
+    @traced_query
+    def apply_day_shift(self, batch_id: str, as_of: datetime, days: int,
+                        changes: Sequence[Dict]) -> bool:
+        """
+        Age a batch by `days` days in one transaction.
+
+        Listed (cluster > 0) subscriptions' days_remaining drop by `days`;
+        the changed subscriptions get their new days_remaining, cluster and
+        message (members leaving cluster 0 get their first message).
+        Unlisted members are not touched, so the work follows the listed
+        and changed members rather than the batch size.
+
+        Args:
+            as_of: The batch's day as read by get_batch_as_of(); if another
+                refresh moved it meanwhile nothing is written
+            days: Days between as_of and the new day
+            changes: Dicts with 'id', 'days_remaining', 'cluster',
+                'previous_cluster' and 'message_text' of each changed
+                subscription
+
+        Returns:
+            Whether the shift was applied
+        """
+        conn = self._get_connection()
+        cursor = conn.cursor()
+
+        try:
+            cursor.execute("BEGIN IMMEDIATE")
+            if self._fetch_batch_as_of(cursor, batch_id) != as_of:
+                conn.rollback()
+                return False
+
+            cursor.execute(
+                """UPDATE subscriptions SET days_remaining = days_remaining - ?
+                WHERE upload_batch_id = ? AND cluster > 0""",
+                (days, batch_id)
+            )
+            cursor.executemany(
+                "UPDATE subscriptions SET days_remaining = ?, cluster = ? WHERE id = ?",
+                ((change['days_remaining'], change['cluster'], change['id']) for change in changes)
+            )
+            cursor.executemany(
+                "UPDATE messages SET message_text = ?, cluster = ? WHERE subscription_id = ?",
+                ((change['message_text'], change['cluster'], change['id']) for change in changes
+                 if change['previous_cluster'])
+            )
+            cursor.executemany(
+                "INSERT INTO messages (subscription_id, message_text, cluster) VALUES (?, ?, ?)",
+                ((change['id'], change['message_text'], change['cluster']) for change in changes
+                 if not change['previous_cluster'])
+            )
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            raise e
+        finally:
+            self._release_connection(conn)
+
+        self._invalidate_batch(batch_id)
+        return True
+
+    # Job operations
+    @traced_query
+    def create_job(self, job_id: str, user_id: int, gym_name: str,
+                   filename: str, file_path: str, options: Optional[Dict] = None) -> str:
+        """Queue a processing job. Returns job_id."""
+        conn = self._get_connection()
+        cursor = conn.cursor()
+
+        try:
+            cursor.execute(
+                """INSERT INTO jobs (id, user_id, gym_name, filename, file_path, options)
+                VALUES (?, ?, ?, ?, ?, ?)""",
+                (job_id, user_id, gym_name, filename, file_path, json.dumps(options) if options else None)
+            )
+            conn.commit()
+            return job_id
+        except Exception as e:
+            conn.rollback()
+            raise e
+        finally:
+            self._release_connection(conn)
+
+    @traced_query
+    def claim_job(self, job_id: str, batch_id: Optional[str] = None) -> bool:
+        """
+        Mark a queued job as running. Returns False if it was not queued.
+
+        batch_id is recorded as the batch the job writes to, unless an
+        earlier, interrupted run already recorded one.
+        """
+        conn = self._get_connection()
+        cursor = conn.cursor()
+
+        try:
+            cursor.execute(
+                """UPDATE jobs SET status = 'running', started_at = ?, batch_id = COALESCE(batch_id, ?)
+                WHERE id = ? AND status = 'queued'""",
+                (datetime.now(), batch_id, job_id)
+            )
+            conn.commit()
+            return cursor.rowcount == 1
+        except Exception as e:
+            conn.rollback()
+            raise e
+        finally:
+            self._release_connection(conn)
+
+    @traced_query
+    def update_job_progress(self, job_id: str, stage: str, progress: float,
+                            stage_timings: Dict[str, float]):
+        """Record the current stage, overall progress (0-1) and stage timings."""
+        conn = self._get_connection()
+        cursor = conn.cursor()
+
+        try:
+            cursor.execute(
+                "UPDATE jobs SET stage = ?, progress = ?, stage_timings = ? WHERE id = ?",
+                (stage, progress, json.dumps(stage_timings), job_id)
+            )
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            raise e
+        finally:
+            self._release_connection(conn)
+
+    @traced_query
+    def finish_job(self, job_id: str, status: str, result: Optional[Dict] = None,
+                   error: Optional[str] = None, batch_id: Optional[str] = None,
+                   content_hash: Optional[str] = None):
+        """Mark a job completed or failed and store its result (and its file's SHA-256)."""
+        conn = self._get_connection()
+        cursor = conn.cursor()
+
+        try:
+            cursor.execute(
+                """UPDATE jobs SET status = ?, result = ?, error = ?, batch_id = ?,
+                progress = CASE WHEN ? = 'completed' THEN 1 ELSE progress END,
+                finished_at = ?, content_hash = ?
+                WHERE id = ?""",
+                (status, json.dumps(result) if result is not None else None, error,
+                 batch_id, status, datetime.now(), content_hash, job_id)
+            )
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            raise e
+        finally:
+            self._release_connection(conn)
+
+    @traced_query
+    def requeue_unfinished_jobs(self) -> List[Dict]:
+        """Put interrupted running jobs back in the queue. Returns queued jobs, oldest first."""
+        conn = self._get_connection()
+        cursor = conn.cursor()
+
+        try:
+            cursor.execute("UPDATE jobs SET status = 'queued' WHERE status = 'running'")
+            conn.commit()
+            cursor.execute("SELECT * FROM jobs WHERE status = 'queued' ORDER BY created_at")
+            return [self._job_from_row(row) for row in cursor.fetchall()]
+        except Exception as e:
+            conn.rollback()
+            raise e
+        finally:
+            self._release_connection(conn)
+
+    @traced_query
+    def get_job(self, job_id: str) -> Optional[Dict]:
+        """Get a job by ID."""
+        conn = self._get_connection()
+        cursor = conn.cursor()
+
+        try:
+            cursor.execute("SELECT * FROM jobs WHERE id = ?", (job_id,))
+            row = cursor.fetchone()
+            return self._job_from_row(row) if row else None
+        finally:
+            self._release_connection(conn)
+
+    @traced_query
+    def get_jobs_by_user(self, user_id: int, limit: int = 10) -> List[Dict]:
+        """Get a user's most recent jobs."""
+        conn = self._get_connection()
+        cursor = conn.cursor()
+
+        try:
+            cursor.execute(
+                """SELECT * FROM jobs
+                WHERE user_id = ?
+                ORDER BY created_at DESC, rowid DESC
+                LIMIT ?""",
+                (user_id, limit)
+            )
+            return [self._job_from_row(row) for row in cursor.fetchall()]
+        finally:
+            self._release_connection(conn)
+
+    @traced_query
+    def get_completed_jobs_by_hash(self, user_id: int, content_hash: str, since: datetime) -> List[Dict]:
+        """Get the user's completed jobs of a file (by SHA-256) finished since `since`, latest first."""
+        conn = self._get_connection()
+        cursor = conn.cursor()
+
+        try:
+            cursor.execute(
+                """SELECT * FROM jobs
+                WHERE user_id = ? AND content_hash = ? AND finished_at >= ? AND status = 'completed'
+                ORDER BY finished_at DESC""",
+                (user_id, content_hash, since)
+            )
+            return [self._job_from_row(row) for row in cursor.fetchall()]
+        finally:
+            self._release_connection(conn)
+
+    @traced_query
+    def get_completed_jobs_since(self, user_id: int, since: datetime) -> List[Dict]:
+        """Get the user's completed jobs finished since `since`, latest first."""
+        conn = self._get_connection()
+        cursor = conn.cursor()
+
+        try:
+            cursor.execute(
+                """SELECT * FROM jobs
+                WHERE user_id = ? AND status = 'completed' AND finished_at >= ?
+                ORDER BY finished_at DESC""",
+                (user_id, since)
+            )
+            return [self._job_from_row(row) for row in cursor.fetchall()]
+        finally:
+            self._release_connection(conn)
+
+    @staticmethod
+    def _job_from_row(row: sqlite3.Row) -> Dict:
+        """Convert a jobs row, decoding its JSON columns."""
+        job = dict(row)
+        job['stage_timings'] = json.loads(job['stage_timings']) if job['stage_timings'] else {}
+        job['result'] = json.loads(job['result']) if job['result'] else None
+        job['options'] = json.loads(job['options']) if job['options'] else {}
+        return job
+
+
+# Routing wrappers of the @routed methods, installed on sharded instances
+ROUTED_METHODS: Dict[str, Callable] = {
+    name: _route(method)
+    for name, method in vars(DatabaseManager).items()
+    if hasattr(method, 'routed_by')
+}
@@ -0,0 +1,159 @@
+"""Split a single-file database into per-tenant shards.
+
+Copies each user's subscriptions, messages, upload history and members into
+<shard dir>/tenant_<user_id>.db (IDs are kept), records their batches in
+the batch directory, and then deletes the copied rows from the shared
+file. The shared file keeps users and jobs. Run it with the app stopped;
+then start the app with HERCULES_SHARDS=1.
+
+Rows already in a shard are skipped, so an interrupted run can be
+repeated.
+
+Usage:
+    python database/migrate_shards.py [--db database/gym_management.db]
+                                      [--shard-dir DIR] [--keep-source]
+"""
+
+import argparse
+import os
+import sqlite3
+import sys
+from typing import Dict, List, Optional
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database.db_manager import DatabaseManager, SHARD_DIR_NAME
+from database.sharding import shard_path
+
+
+DEFAULT_DB_PATH = "database/gym_management.db"
+
+# Tenant tables and how to select one user's rows from the source file
+TENANT_TABLES = [
+    ("subscriptions", "FROM source.subscriptions t WHERE t.user_id = ?"),
+    ("messages", "FROM source.messages t JOIN source.subscriptions s ON s.id = t.subscription_id "
+                 "WHERE s.user_id = ?"),
+    ("upload_history", "FROM source.upload_history t WHERE t.user_id = ?"),
+    ("members", "FROM source.members t WHERE t.user_id = ?"),
+    ("member_changes", "FROM source.member_changes t WHERE t.user_id = ?"),
+]
+
+
+def table_columns(conn: sqlite3.Connection, table: str) -> List[str]:
+    """Column names of a table in the main database."""
+    return [row[1] for row in conn.execute(f"PRAGMA main.table_info({table})")]
+
+
+def copy_tenant(db_path: str, target_path: str, user_id: int) -> Dict[str, int]:
+    """
+    Copy one user's rows into their shard.
+
+    Returns:
+        Table -> number of the user's rows in the shard afterwards
+    """
+    # Creates the shard file and its schema
+    DatabaseManager(target_path, sharded=False)
+
+    conn = sqlite3.connect(target_path)
+    try:
+        conn.execute("ATTACH DATABASE ? AS source", (os.path.abspath(db_path),))
+        conn.execute("BEGIN IMMEDIATE")
+        for table, source_rows in TENANT_TABLES:
+            columns = table_columns(conn, table)
+            conn.execute(
+                f"INSERT OR IGNORE INTO main.{table} ({', '.join(columns)}) "
+                f"SELECT {', '.join(f't.{column}' for column in columns)} {source_rows}",
+                (user_id,)
+            )
+        conn.commit()
+
+        copied = {}
+        for table, source_rows in TENANT_TABLES:
+            source_count = conn.execute(f"SELECT COUNT(*) {source_rows}", (user_id,)).fetchone()[0]
+            shard_count = conn.execute(f"SELECT COUNT(*) FROM main.{table}").fetchone()[0]
+            if shard_count < source_count:
+                raise RuntimeError(
+                    f"user {user_id}: {table} has {shard_count} rows in the shard, {source_count} in the source"
+                )
+            copied[table] = shard_count
+        return copied
+    finally:
+        conn.close()
+
+
+def migrate(db_path: str = DEFAULT_DB_PATH, shard_dir: Optional[str] = None,
+            keep_source: bool = False) -> Dict[int, Dict[str, int]]:
+    """
+    Split db_path into per-tenant shards.
+
+    Args:
+        db_path: The single-file database; becomes the shared database
+        shard_dir: Where to write the shards (default: SHARD_DIR_NAME next to db_path)
+        keep_source: Leave the copied rows in db_path as well
+
+    Returns:
+        User ID -> table -> rows in the user's shard
+    """
+    shard_dir = shard_dir or os.path.join(os.path.dirname(os.path.abspath(db_path)), SHARD_DIR_NAME)
+    os.makedirs(shard_dir, exist_ok=True)
+
+    # Bring the source schema up to date (adds the batch directory)
+    DatabaseManager(db_path, sharded=False)
+
+    conn = sqlite3.connect(db_path)
+    try:
+        user_ids = [row[0] for row in conn.execute(
+            "SELECT user_id FROM subscriptions UNION SELECT user_id FROM upload_history ORDER BY 1"
+        )]
+    finally:
+        conn.close()
+
+    results = {}
+    for user_id in user_ids:
+        results[user_id] = copy_tenant(db_path, shard_path(shard_dir, user_id), user_id)
+
+    conn = sqlite3.connect(db_path)
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        conn.execute(
+            """INSERT OR IGNORE INTO batch_directory (batch_id, user_id)
+            SELECT upload_batch_id, user_id FROM subscriptions
+            UNION SELECT batch_id, user_id FROM upload_history"""
+        )
+        if not keep_source:
+            conn.execute("DELETE FROM messages WHERE subscription_id IN (SELECT id FROM subscriptions)")
+            conn.execute("DELETE FROM subscriptions")
+            conn.execute("DELETE FROM upload_history")
+            conn.execute("DELETE FROM members")
+            conn.execute("DELETE FROM member_changes")
+        conn.commit()
+
+        if not keep_source:
+            conn.execute("VACUUM")
+    finally:
+        conn.close()
+
+    return results
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--db", default=DEFAULT_DB_PATH, help="single-file database to split")
+    parser.add_argument("--shard-dir", help=f"shard directory (default: {SHARD_DIR_NAME}/ next to --db)")
+    parser.add_argument("--keep-source", action="store_true", help="do not delete copied rows from --db")
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.db):
+        print(f"[FAIL] Database not found: {args.db}")
+        return 1
+
+    results = migrate(args.db, args.shard_dir, args.keep_source)
+
+    for user_id, counts in results.items():
+        summary = ", ".join(f"{count} {table}" for table, count in counts.items())
+        print(f"[OK] User {user_id}: {summary}")
+    print(f"\n[OK] Split {len(results)} tenants. Start the app with HERCULES_SHARDS=1.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
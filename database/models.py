@@ -47,13 +47,140 @@ CREATE TABLE IF NOT EXISTS upload_history (
     total_rows INTEGER NOT NULL,
     processed_rows INTEGER NOT NULL,
     upload_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    timings TEXT,
     FOREIGN KEY (user_id) REFERENCES users(id)
 );
 """
 
-CREATE_INDEXES = [
-    "CREATE INDEX IF NOT EXISTS idx_subscriptions_user_id ON subscriptions(user_id);",
-    "CREATE INDEX IF NOT EXISTS idx_subscriptions_batch_id ON subscriptions(upload_batch_id);",
-    "CREATE INDEX IF NOT EXISTS idx_messages_subscription_id ON messages(subscription_id);",
-    "CREATE INDEX IF NOT EXISTS idx_upload_history_user_id ON upload_history(user_id);",
+CREATE_JOBS_TABLE = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    user_id INTEGER NOT NULL,
+    gym_name TEXT NOT NULL,
+    filename TEXT NOT NULL,
+    file_path TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'queued',
+    stage TEXT,
+    progress REAL NOT NULL DEFAULT 0,
+    stage_timings TEXT,
+    result TEXT,
+    error TEXT,
+    batch_id TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    started_at TIMESTAMP,
+    finished_at TIMESTAMP,
+    FOREIGN KEY (user_id) REFERENCES users(id)
+);
+"""
+
+CREATE_BATCH_DIRECTORY_TABLE = """
+CREATE TABLE IF NOT EXISTS batch_directory (
+    batch_id TEXT PRIMARY KEY,
+    user_id INTEGER NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (user_id) REFERENCES users(id)
+);
+"""
+
+# Current members of a tenant for delta uploads, one per normalized phone.
+# A member's details live in its subscriptions row (in the tenant's live
+# batch); row_hash fingerprints the uploaded row to spot changes.
+CREATE_MEMBERS_TABLE = """
+CREATE TABLE IF NOT EXISTS members (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL,
+    phone_key TEXT NOT NULL,
+    row_hash INTEGER NOT NULL,
+    subscription_id INTEGER NOT NULL,
+    first_batch_id TEXT NOT NULL,
+    last_batch_id TEXT NOT NULL,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE (user_id, phone_key),
+    FOREIGN KEY (user_id) REFERENCES users(id),
+    FOREIGN KEY (subscription_id) REFERENCES subscriptions(id)
+);
+"""
+
+# What each delta upload changed: 'insert', 'update' or 'remove'
+CREATE_MEMBER_CHANGES_TABLE = """
+CREATE TABLE IF NOT EXISTS member_changes (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL,
+    batch_id TEXT NOT NULL,
+    member_id INTEGER NOT NULL,
+    phone_key TEXT NOT NULL,
+    change_type TEXT NOT NULL,
+    FOREIGN KEY (user_id) REFERENCES users(id)
+);
+"""
+
+# Columns added after release: (table, column, type). Added to existing
+# databases on startup.
+ADDED_COLUMNS = [
+    ("upload_history", "timings", "TEXT"),
+    # Delta uploads: the batch holding the rows they changed
+    ("upload_history", "base_batch_id", "TEXT"),
+    # Processing options as JSON (e.g. {"delta": true})
+    ("jobs", "options", "TEXT"),
+    # SHA-256 of the uploaded file, to spot re-uploads of the same file
+    ("jobs", "content_hash", "TEXT"),
 ]
+
+# Index definitions, versioned with PRAGMA user_version. On startup a
+# database at version N gets every step above N applied in order.
+# A database already at SCHEMA_VERSION skips schema setup altogether, so
+# a new table, column or index must come with a new step here.
+INDEX_MIGRATIONS = [
+    (1, [
+        "CREATE INDEX IF NOT EXISTS idx_subscriptions_user_id ON subscriptions(user_id);",
+        "CREATE INDEX IF NOT EXISTS idx_subscriptions_batch_id ON subscriptions(upload_batch_id);",
+        "CREATE INDEX IF NOT EXISTS idx_messages_subscription_id ON messages(subscription_id);",
+        "CREATE INDEX IF NOT EXISTS idx_upload_history_user_id ON upload_history(user_id);",
+        "CREATE INDEX IF NOT EXISTS idx_jobs_user_created ON jobs(user_id, created_at);",
+        "CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(status);",
+    ]),
+    # Composite indexes matching the query shapes in db_manager.py
+    (2, [
+        # Batch reads filter on batch (and cluster) and sort by cluster,
+        # days_remaining, id; cluster counts are answered from the index alone
+        "CREATE INDEX IF NOT EXISTS idx_subscriptions_batch_cluster_days "
+        "ON subscriptions(upload_batch_id, cluster, days_remaining);",
+        "DROP INDEX IF EXISTS idx_subscriptions_batch_id;",
+        # Covers the message side of the subscription join
+        "CREATE INDEX IF NOT EXISTS idx_messages_subscription_covering "
+        "ON messages(subscription_id, cluster, message_text);",
+        "DROP INDEX IF EXISTS idx_messages_subscription_id;",
+        # Latest uploads first, ties broken by id
+        "CREATE INDEX IF NOT EXISTS idx_upload_history_user_date "
+        "ON upload_history(user_id, upload_date DESC, id DESC);",
+        "DROP INDEX IF EXISTS idx_upload_history_user_id;",
+        # Queued jobs in creation order
+        "CREATE INDEX IF NOT EXISTS idx_jobs_status_created ON jobs(status, created_at);",
+        "DROP INDEX IF EXISTS idx_jobs_status;",
+    ]),
+    # Batch directory of sharded databases (batch ID -> owning user)
+    (3, [
+        "CREATE INDEX IF NOT EXISTS idx_batch_directory_user ON batch_directory(user_id);",
+    ]),
+    # Daily refresh: a batch's members by end date, so each day only reads
+    # the members whose cluster or message changed
+    (4, [
+        "CREATE INDEX IF NOT EXISTS idx_subscriptions_batch_end "
+        "ON subscriptions(upload_batch_id, subscription_end_date);",
+    ]),
+    # Delta uploads: members table, changes per batch
+    (5, [
+        "CREATE INDEX IF NOT EXISTS idx_members_subscription ON members(subscription_id);",
+        "CREATE INDEX IF NOT EXISTS idx_member_changes_batch ON member_changes(batch_id, change_type);",
+    ]),
+    # A user's jobs finished since a given time
+    (6, [
+        "CREATE INDEX IF NOT EXISTS idx_jobs_user_status_finished ON jobs(user_id, status, finished_at);",
+    ]),
+    # A user's jobs that processed a file with a given SHA-256, checked for re-uploads
+    (7, [
+        "CREATE INDEX IF NOT EXISTS idx_jobs_user_hash_finished ON jobs(user_id, content_hash, finished_at);",
+    ]),
+]
+
+SCHEMA_VERSION = INDEX_MIGRATIONS[-1][0]
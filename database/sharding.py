@@ -0,0 +1,182 @@
+"""Per-tenant database files ("shards") for a sharded DatabaseManager."""
+
+import os
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Union
+
+
+DEFAULT_MAX_OPEN_SHARDS = 32
+
+# Batch owners remembered per shard set (a batch never changes owner)
+DEFAULT_OWNER_ENTRIES = 100000
+
+# Shard files are named <prefix><user_id>.db inside the shard directory
+SHARD_FILE_PREFIX = "tenant_"
+
+
+def shard_path(shard_dir: str, user_id: int) -> str:
+    """Path of a tenant's database file."""
+    return os.path.join(shard_dir, f"{SHARD_FILE_PREFIX}{int(user_id)}.db")
+
+
+class ShardSet:
+    """
+    Lazily opened tenant databases, at most max_open at a time.
+
+    Each tenant's subscriptions, messages and upload history live in their
+    own SQLite file, so one gym's write transaction never blocks another's.
+    A shard is opened on first use (creating its file and schema) and kept
+    in an LRU; opening one more than max_open closes the least recently
+    used shard's connections. A shard still in use by another thread is
+    closed once that thread is done with it.
+    """
+
+    def __init__(self, shard_dir: str, factory, max_open: int = DEFAULT_MAX_OPEN_SHARDS):
+        """
+        Args:
+            shard_dir: Directory holding the shard files
+            factory: Called with a shard file path, returns its DatabaseManager
+            max_open: Shards kept open at once
+        """
+        if max_open < 1:
+            raise ValueError("max_open must be at least 1")
+
+        self.shard_dir = shard_dir
+        self.factory = factory
+        self.max_open = max_open
+
+        self._open: "OrderedDict[int, object]" = OrderedDict()
+        self._users: Dict[int, int] = {}
+        # Evicted shards still checked out, closed when their last user is done
+        self._closing: Dict[int, object] = {}
+        self._owners: "OrderedDict[str, int]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.opens = 0
+        self.evictions = 0
+
+        os.makedirs(shard_dir, exist_ok=True)
+
+    def path(self, user_id: int) -> str:
+        """Path of a tenant's shard file."""
+        return shard_path(self.shard_dir, user_id)
+
+    @contextmanager
+    def use(self, user_id: int) -> Iterator:
+        """Check out a tenant's shard for the duration of the block."""
+        user_id = int(user_id)
+
+        with self._lock:
+            shard = self._open.get(user_id)
+            if shard is None:
+                # An evicted shard that is still in use is taken back as is
+                shard = self._closing.pop(user_id, None)
+                if shard is None:
+                    shard = self.factory(self.path(user_id))
+                    self.opens += 1
+                self._open[user_id] = shard
+                self._evict()
+            else:
+                self._open.move_to_end(user_id)
+            self._users[user_id] = self._users.get(user_id, 0) + 1
+
+        try:
+            yield shard
+        finally:
+            with self._lock:
+                self._users[user_id] -= 1
+                if not self._users[user_id]:
+                    del self._users[user_id]
+                    closing = self._closing.pop(user_id, None)
+                    if closing is not None:
+                        closing.pool.close()
+
+    def owner(self, batch_id: str) -> Optional[int]:
+        """Remembered owner of a batch, if any."""
+        with self._lock:
+            user_id = self._owners.get(batch_id)
+            if user_id is not None:
+                self._owners.move_to_end(batch_id)
+            return user_id
+
+    def remember_owner(self, batch_id: str, user_id: int):
+        """Remember a batch's owner, forgetting the least recently used beyond DEFAULT_OWNER_ENTRIES."""
+        with self._lock:
+            self._owners[batch_id] = int(user_id)
+            self._owners.move_to_end(batch_id)
+            while len(self._owners) > DEFAULT_OWNER_ENTRIES:
+                self._owners.popitem(last=False)
+
+    def _evict(self):
+        """Close least recently used shards beyond max_open (lock held)."""
+        while len(self._open) > self.max_open:
+            user_id, shard = self._open.popitem(last=False)
+            self.evictions += 1
+            if user_id in self._users:
+                self._closing[user_id] = shard
+            else:
+                shard.pool.close()
+
+    def stats(self) -> Dict[str, Union[int, List[int]]]:
+        """Open shards and counters."""
+        with self._lock:
+            return {
+                'open': list(self._open),
+                'opens': self.opens,
+                'evictions': self.evictions,
+                'max_open': self.max_open,
+            }
+
+    def close(self):
+        """Close every open shard."""
+        with self._lock:
+            for user_id, shard in self._open.items():
+                if user_id in self._users:
+                    self._closing[user_id] = shard
+                else:
+                    shard.pool.close()
+            self._open.clear()
+
+    def tenants(self) -> List[int]:
+        """User IDs with a shard file on disk."""
+        user_ids = []
+        for name in os.listdir(self.shard_dir):
+            stem, extension = os.path.splitext(name)
+            if extension == ".db" and stem.startswith(SHARD_FILE_PREFIX):
+                suffix = stem[len(SHARD_FILE_PREFIX):]
+                if suffix.isdigit():
+                    user_ids.append(int(suffix))
+        return sorted(user_ids)
+
+
+_shard_sets: Dict[str, ShardSet] = {}
+_shard_sets_lock = threading.Lock()
+
+
+def get_shard_set(shard_dir: str, factory, max_open: Optional[int] = None) -> ShardSet:
+    """
+    Get the process-wide shard set for a directory.
+
+    Every DatabaseManager routing to the same directory shares the open
+    shards (and so the LRU cap). max_open, when given, updates the cap of
+    an existing set.
+    """
+    shard_dir = os.path.abspath(shard_dir)
+
+    with _shard_sets_lock:
+        shards = _shard_sets.get(shard_dir)
+        if shards is None:
+            shards = ShardSet(shard_dir, factory, max_open or DEFAULT_MAX_OPEN_SHARDS)
+            _shard_sets[shard_dir] = shards
+        elif max_open is not None:
+            shards.max_open = max_open
+        return shards
+
+
+def close_all_shard_sets():
+    """Close every process-wide shard set (used by tests and benchmarks)."""
+    with _shard_sets_lock:
+        for shards in _shard_sets.values():
+            shards.close()
+        _shard_sets.clear()
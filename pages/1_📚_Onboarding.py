@@ -175,7 +175,7 @@ with tip2:
     - ✅ Review messages before sending
     - ✅ Send urgent (1-day) messages first
     - ✅ Track who responded
-    - ✅ Re-upload weekly for updates
+    - ✅ Clusters update daily; re-upload when members join or renew
     """)
 
 st.markdown("---")
@@ -187,7 +187,9 @@ with st.expander("What happens if my Excel has extra columns?"):
     st.write("No problem! The system only uses the required 4 columns. All other columns are ignored.")
 
 with st.expander("Can I upload the same file twice?"):
-    st.write("Yes! Each upload creates a new batch. The previous data is kept for history.")
+    st.write("Yes. If you already processed the same file today, its results are shown straight away "
+             "instead of processing it again; use \"Process again\" to re-run it. Otherwise each upload "
+             "creates a new batch and the previous data is kept for history.")
 
 with st.expander("What if some phone numbers are invalid?"):
     st.write("Invalid rows are skipped with error messages. Valid rows are processed normally.")
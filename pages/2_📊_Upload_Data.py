@@ -1,9 +1,10 @@
 """Upload and process member data page."""
 
+import time
 import streamlit as st
 from services.auth_service import AuthService
-from agents.excel_processor import ExcelProcessor
-from agents.subscription_agent import SubscriptionAgent
+from services.job_queue import get_job_queue
+from utils.validators import STREAMING_MAX_FILE_SIZE_MB
 
 
 # Check authentication
@@ -36,140 +37,233 @@ st.subheader("📤 Upload Excel File")
 uploaded_file = st.file_uploader(
     "Choose an Excel file (.xlsx or .xls)",
     type=['xlsx', 'xls'],
-    help="Maximum file size: 10MB"
+    help=f"Maximum file size: {STREAMING_MAX_FILE_SIZE_MB}MB"
 )
 
-if uploaded_file is not None:
-    st.success(f"✅ File uploaded: {uploaded_file.name} ({uploaded_file.size / 1024:.2f} KB)")
-
-    # Process button
-    if st.button("🤖 Run AI Agent", type="primary", use_container_width=True):
-        with st.spinner("Processing your data..."):
-            # Initialize processor
-            processor = ExcelProcessor()
-
-            # Process file
-            success, message, cleaned_df, errors = processor.process_file(uploaded_file)
-
-            if not success:
-                st.error(f"❌ {message}")
-                if errors:
-                    with st.expander("View Errors"):
-                        for error in errors:
-                            st.write(f"• {error}")
-                st.stop()
-
-            # Show processing summary
-            st.info(message)
-
-            # Show errors if any (but processing continued)
-            if errors:
-                with st.expander(f"⚠️ {len(errors)} rows were skipped"):
-                    for error in errors[:20]:  # Show first 20 errors
-                        st.write(f"• {error}")
-                    if len(errors) > 20:
-                        st.write(f"... and {len(errors) - 20} more errors")
-
-            # Run AI agent
-            st.markdown("---")
-            st.subheader("🤖 Agent Hercules Processing")
-
-            with st.status("Agent Hercules is analyzing your data...", expanded=True) as status:
-                st.write("Step 1: Calculating days remaining...")
-                st.write("Step 2: Classifying into expiry clusters...")
-                st.write("Step 3: Generating personalized messages...")
-                st.write("Step 4: Saving to database...")
-
-                # Initialize agent
-                agent = SubscriptionAgent(
-                    user_id=auth.get_current_user_id(),
-                    gym_name=auth.get_current_gym_name()
-                )
-
-                # Process
-                result = agent.process(cleaned_df, uploaded_file.name)
-
-                if result['success']:
-                    status.update(label="✅ Processing complete!", state="complete", expanded=False)
-                else:
-                    status.update(label="❌ Processing failed", state="error", expanded=True)
-                    st.error(f"Error: {result['error']}")
-                    st.stop()
-
-            # Show results
-            st.markdown("---")
-            st.subheader("📊 Processing Results")
+STAGE_LABELS = {
+    "parse_file": "Reading and validating file",
+    "diff_members": "Comparing with your saved members",
+    "process_chunks": "Reading and processing members",
+    "calculate_days": "Calculating days remaining",
+    "classify_clusters": "Classifying into expiry clusters",
+    "generate_messages": "Generating personalized messages",
+    "save_to_database": "Saving to database",
+}
 
-            st.success(f"✅ Successfully processed {result['total_processed']} members")
+job_queue = get_job_queue()
+user_id = auth.get_current_user_id()
 
-            # Cluster breakdown
-            st.markdown("### Expiry Cluster Breakdown")
+if uploaded_file is not None:
+    st.success(f"✅ File uploaded: {uploaded_file.name} ({uploaded_file.size / 1024:.2f} KB)")
 
+    delta = st.checkbox(
+        "Only save changes since my last upload",
+        help="Members are matched by phone number; unchanged members are kept as they are, "
+             "new ones are added and members missing from this file are removed"
+    )
+
+    # Dry run: cluster counts from the end dates alone, nothing is saved
+    if st.button("🔍 Preview clusters", use_container_width=True,
+                 help="Counts members per cluster from the end dates only; nothing is saved"):
+        # Imported here so the page itself doesn't load langgraph/openpyxl
+        from agents.excel_processor import ExcelProcessor
+        from agents.subscription_agent import get_agent
+
+        start = time.perf_counter()
+        success, message, end_dates, errors = ExcelProcessor().process_end_dates(uploaded_file)
+        if success:
+            preview_result = get_agent().process(end_dates, uploaded_file.name, dry_run=True)
+        else:
+            preview_result = {'success': False, 'error': message}
+        st.session_state['cluster_preview'] = {
+            'file': (uploaded_file.name, uploaded_file.size),
+            'result': preview_result,
+            'errors': errors if success else [],
+            'seconds': time.perf_counter() - start,
+        }
+
+    preview = st.session_state.get('cluster_preview')
+    if preview and preview['file'] == (uploaded_file.name, uploaded_file.size):
+        preview_result = preview['result']
+        if not preview_result['success']:
+            st.error(f"❌ {preview_result['error']}")
+        else:
+            st.markdown("#### 🔍 Cluster Preview (not saved)")
             col1, col2, col3, col4 = st.columns(4)
-
-            cluster_counts = result['cluster_counts']
-
-            with col1:
-                count_1 = cluster_counts.get(1, 0)
-                st.metric(
-                    label="🔴 Urgent (1 day)",
-                    value=count_1,
-                    help="Expires today/tomorrow or already expired"
-                )
-
-            with col2:
-                count_3 = cluster_counts.get(3, 0)
-                st.metric(
-                    label="🟡 3 Days",
-                    value=count_3,
-                    help="Expires within 3 days"
-                )
-
-            with col3:
-                count_7 = cluster_counts.get(7, 0)
-                st.metric(
-                    label="🟢 7 Days",
-                    value=count_7,
-                    help="Expires within 7 days"
-                )
-
-            with col4:
-                count_30 = cluster_counts.get(30, 0)
-                st.metric(
-                    label="🔵 30 Days",
-                    value=count_30,
-                    help="Expires within 30 days"
+            col1.metric("🔴 Urgent (1 day)", preview_result['cluster_counts'].get(1, 0))
+            col2.metric("🟡 3 Days", preview_result['cluster_counts'].get(3, 0))
+            col3.metric("🟢 7 Days", preview_result['cluster_counts'].get(7, 0))
+            col4.metric("🔵 30 Days", preview_result['cluster_counts'].get(30, 0))
+            st.caption(
+                f"{preview_result['beyond_window']} members end in more than 30 days. Only end dates were checked "
+                f"({preview['seconds']:.2f}s); names and phone numbers are checked when you run the agent."
+            )
+            if preview_result['preview']:
+                st.table(preview_result['preview'])
+        if preview['errors']:
+            with st.expander(f"⚠️ {len(preview['errors'])} rows have invalid end dates"):
+                for error in preview['errors'][:20]:
+                    st.write(f"• {error}")
+
+    # Process button: queue the file and return straight away
+    if st.button("🤖 Run AI Agent", type="primary", use_container_width=True):
+        st.session_state['upload_job_id'] = job_queue.submit_upload(
+            user_id=user_id,
+            gym_name=auth.get_current_gym_name(),
+            filename=uploaded_file.name,
+            data=uploaded_file.getvalue(),
+            delta=delta
+        )
+
+# Follow the job started here, or one still running from an earlier visit
+job_id = st.session_state.get('upload_job_id')
+if job_id is None:
+    active_job = job_queue.get_active_job(user_id)
+    if active_job:
+        job_id = active_job['id']
+        st.session_state['upload_job_id'] = job_id
+
+job = job_queue.get_job(job_id) if job_id else None
+if job and job['user_id'] != user_id:
+    job = None
+
+if job:
+    st.markdown("---")
+    st.subheader("🤖 Agent Hercules Processing")
+    st.caption(f"File: {job['filename']}")
+
+    if job['status'] in ('queued', 'running'):
+        if job['status'] == 'queued':
+            st.progress(0.0, text="Waiting for a free worker...")
+        else:
+            stage_label = STAGE_LABELS.get(job['stage'], "Starting")
+            st.progress(job['progress'], text=f"{stage_label}...")
+
+        for stage, seconds in job['stage_timings'].items():
+            st.write(f"✅ {STAGE_LABELS.get(stage, stage)} ({seconds:.2f}s)")
+
+        st.caption("You can leave this page; processing continues in the background.")
+
+        # Poll until the job finishes
+        time.sleep(1)
+        st.rerun()
+
+    result = job['result'] or {}
+
+    if job['status'] == 'failed':
+        st.error(f"❌ {job['error']}")
+        if result.get('errors'):
+            with st.expander("View Errors"):
+                for error in result['errors']:
+                    st.write(f"• {error}")
+
+    elif job['status'] == 'completed':
+        # Show processing summary
+        st.info(result['message'])
+
+        # The same file was already processed today; offer to run it anyway
+        if result.get('duplicate_of') and uploaded_file is not None:
+            if st.button("🔁 Process again", help="Re-run the agent on this file instead of reusing today's results"):
+                st.session_state['upload_job_id'] = job_queue.submit_upload(
+                    user_id=user_id,
+                    gym_name=auth.get_current_gym_name(),
+                    filename=uploaded_file.name,
+                    data=uploaded_file.getvalue(),
+                    delta=bool(job['options'].get('delta')),
+                    force=True
                 )
+                st.rerun()
+
+        # Show errors if any (but processing continued)
+        error_count = result['error_count']
+        if error_count:
+            with st.expander(f"⚠️ {error_count} rows were skipped"):
+                for error in result['errors']:
+                    st.write(f"• {error}")
+                if error_count > len(result['errors']):
+                    st.write(f"... and {error_count - len(result['errors'])} more errors")
+
+        with st.expander("⏱️ Stage timings"):
+            for stage, seconds in result['stage_timings'].items():
+                st.write(f"{STAGE_LABELS.get(stage, stage)}: {seconds:.2f}s")
+
+        # Show results
+        st.markdown("---")
+        st.subheader("📊 Processing Results")
+
+        st.success(f"✅ Successfully processed {result['total_processed']} members")
+
+        delta_counts = result.get('delta')
+        if delta_counts:
+            st.info(
+                f"Changes since last upload: {delta_counts['insert']} new, {delta_counts['update']} updated, "
+                f"{delta_counts['remove']} removed, {delta_counts['unchanged']} unchanged"
+            )
+
+        # Cluster breakdown
+        st.markdown("### Expiry Cluster Breakdown")
+
+        col1, col2, col3, col4 = st.columns(4)
+
+        cluster_counts = result['cluster_counts']
+
+        with col1:
+            count_1 = cluster_counts.get(1, 0)
+            st.metric(
+                label="🔴 Urgent (1 day)",
+                value=count_1,
+                help="Expires today/tomorrow or already expired"
+            )
+
+        with col2:
+            count_3 = cluster_counts.get(3, 0)
+            st.metric(
+                label="🟡 3 Days",
+                value=count_3,
+                help="Expires within 3 days"
+            )
+
+        with col3:
+            count_7 = cluster_counts.get(7, 0)
+            st.metric(
+                label="🟢 7 Days",
+                value=count_7,
+                help="Expires within 7 days"
+            )
+
+        with col4:
+            count_30 = cluster_counts.get(30, 0)
+            st.metric(
+                label="🔵 30 Days",
+                value=count_30,
+                help="Expires within 30 days"
+            )
+
+        # Store batch_id in session for Messages page
+        st.session_state['latest_batch_id'] = result['batch_id']
+        st.session_state['processing_complete'] = True
+
+        # Preview messages
+        st.markdown("---")
+        st.markdown("### 💬 Message Preview (First 5)")
 
-            # Store batch_id in session for Messages page
-            st.session_state['latest_batch_id'] = result['batch_id']
-            st.session_state['processing_complete'] = True
-
-            # Preview messages
-            st.markdown("---")
-            st.markdown("### 💬 Message Preview (First 5)")
-
-            preview_messages = result['messages'][:5]
-
-            for msg in preview_messages:
-                with st.expander(f"{msg['customer_name']} - {msg['phone_number']}"):
-                    st.write(f"**Expiry:** {msg['days_remaining']} days")
-                    st.write(f"**Cluster:** {msg['cluster']}-day")
-                    st.code(msg['message'])
+        for msg in result['messages']:
+            with st.expander(f"{msg['customer_name']} - {msg['phone_number']}"):
+                st.write(f"**Expiry:** {msg['days_remaining']} days")
+                st.write(f"**Cluster:** {msg['cluster']}-day")
+                st.code(msg['message'])
 
-            st.markdown("---")
+        st.markdown("---")
 
-            # Next steps
-            st.success("🎉 Processing complete! Go to **Messages** page (in sidebar) to view all messages and export.")
+        # Next steps
+        st.success("🎉 Processing complete! Go to **Messages** page (in sidebar) to view all messages and export.")
 
-else:
-    st.info("👆 Please upload an Excel file to get started")
+if uploaded_file is None:
+    if job is None:
+        st.info("👆 Please upload an Excel file to get started")
 
     # Show recent uploads
-    from database.db_manager import DatabaseManager
-
-    db = DatabaseManager()
-    history = db.get_upload_history(auth.get_current_user_id(), limit=5)
+    history = job_queue.db.get_upload_history(user_id, limit=5)
 
     if history:
         st.markdown("---")
@@ -186,5 +280,5 @@ else:
                 st.write(f"{record['upload_date'][:10]}")
             with col4:
                 if st.button("View", key=f"view_{record['batch_id']}"):
-                    st.session_state['latest_batch_id'] = record['batch_id']
+                    st.session_state['latest_batch_id'] = record['base_batch_id'] or record['batch_id']
                     st.info("Batch selected! Go to Messages page in sidebar")
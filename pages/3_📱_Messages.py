@@ -2,8 +2,10 @@
 
 import streamlit as st
 import pandas as pd
-from io import BytesIO
 from services.auth_service import AuthService
+from services.cluster_refresh import get_refresh_scheduler
+from services.export_cache import get_export_cache
+from services.export_service import EXPORT_CLUSTERS
 from database.db_manager import DatabaseManager
 from utils.date_helpers import get_cluster_emoji, get_cluster_name
 
@@ -16,6 +18,7 @@ if not auth.is_authenticated():
 
 # Initialize database
 db = DatabaseManager()
+get_refresh_scheduler()
 
 # Page config
 st.title("📱 WhatsApp Messages")
@@ -30,19 +33,16 @@ if not batch_id:
     st.info("No data found. Please upload member data first from the Upload Data page in the sidebar.")
     st.stop()
 
-# Get messages
-messages = db.get_messages_by_batch(batch_id)
-subscriptions = db.get_subscriptions_by_batch(batch_id)
+# Cluster counts
+cluster_counts = db.get_cluster_counts(batch_id)
+total_messages = sum(cluster_counts.values())
 
-if not messages:
+if not total_messages:
     st.error("No messages found for this batch")
     st.stop()
 
-# Cluster counts
-cluster_counts = db.get_cluster_counts(batch_id)
-
 # Display summary
-st.subheader(f"📊 Total Messages: {len(messages)}")
+st.subheader(f"📊 Total Messages: {total_messages}")
 
 col1, col2, col3, col4 = st.columns(4)
 
@@ -75,31 +75,40 @@ st.markdown("---")
 # Export section
 st.subheader("📤 Export Messages")
 
-col1, col2 = st.columns(2)
-
-# Prepare data for export
-export_data = []
-for msg in messages:
-    export_data.append({
-        'Customer Name': msg['customer_name'],
-        'Phone Number': msg['phone_number'],
-        'Expiry Date': msg['subscription_end_date'],
-        'Days Remaining': msg['days_remaining'],
-        'Cluster': f"{msg['cluster']}-day",
-        'Message': msg['message_text']
-    })
+# Export files kept in memory for the download buttons: one batch's worth
+EXPORT_READ_CACHE_ENTRIES = 8
+
+
+@st.cache_data(max_entries=EXPORT_READ_CACHE_ENTRIES, show_spinner=False)
+def read_export_file(path: str) -> bytes:
+    """Contents of a stored export; its path names its SHA-256, so it never changes."""
+    with open(path, 'rb') as handle:
+        return handle.read()
+
+
+def read_export(artifact: dict) -> bytes:
+    """Contents of a cached export file, read once per file rather than on every rerun."""
+    return read_export_file(artifact['path'])
+
 
-export_df = pd.DataFrame(export_data)
+# Built in the background when the batch was processed; batches from
+# before the cache, evicted ones or ones with missing files are rebuilt here
+export_cache = get_export_cache(db)
+artifacts = export_cache.get(batch_id)
+if artifacts is None:
+    with st.spinner("Preparing export files..."):
+        artifacts = export_cache.ensure(batch_id)
+
+col1, col2, col3 = st.columns(3)
 
 # CSV export
 with col1:
     st.markdown("#### CSV Format")
-    csv = export_df.to_csv(index=False).encode('utf-8')
 
     st.download_button(
         label="⬇️ Download All as CSV",
-        data=csv,
-        file_name=f"gym_messages_{batch_id[:8]}.csv",
+        data=read_export(artifacts['csv']),
+        file_name=artifacts['csv']['file_name'],
         mime="text/csv",
         use_container_width=True
     )
@@ -108,38 +117,26 @@ with col1:
 with col2:
     st.markdown("#### Excel Format")
 
-    # Create Excel file with formatting
-    output = BytesIO()
-    with pd.ExcelWriter(output, engine='openpyxl') as writer:
-        export_df.to_excel(writer, index=False, sheet_name='Messages')
-
-        # Get workbook and worksheet
-        workbook = writer.book
-        worksheet = writer.sheets['Messages']
-
-        # Auto-fit columns
-        for column in worksheet.columns:
-            max_length = 0
-            column = [cell for cell in column]
-            for cell in column:
-                try:
-                    if len(str(cell.value)) > max_length:
-                        max_length = len(cell.value)
-                except:
-                    pass
-            adjusted_width = min(max_length + 2, 50)
-            worksheet.column_dimensions[column[0].column_letter].width = adjusted_width
-
-    excel_data = output.getvalue()
-
     st.download_button(
         label="⬇️ Download All as Excel",
-        data=excel_data,
-        file_name=f"gym_messages_{batch_id[:8]}.xlsx",
+        data=read_export(artifacts['xlsx']),
+        file_name=artifacts['xlsx']['file_name'],
         mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
         use_container_width=True
     )
 
+# Everything in one archive
+with col3:
+    st.markdown("#### ZIP Bundle")
+
+    st.download_button(
+        label="⬇️ Download All Files",
+        data=read_export(artifacts['zip']),
+        file_name=artifacts['zip']['file_name'],
+        mime="application/zip",
+        use_container_width=True
+    )
+
 st.markdown("---")
 
 # Export by cluster
@@ -147,28 +144,16 @@ st.subheader("📤 Export by Cluster")
 
 cluster_cols = st.columns(4)
 
-for idx, cluster in enumerate([1, 3, 7, 30]):
+for idx, cluster in enumerate(EXPORT_CLUSTERS):
     with cluster_cols[idx]:
-        cluster_messages = [msg for msg in messages if msg['cluster'] == cluster]
-
-        if cluster_messages:
-            cluster_export_data = []
-            for msg in cluster_messages:
-                cluster_export_data.append({
-                    'Customer Name': msg['customer_name'],
-                    'Phone Number': msg['phone_number'],
-                    'Expiry Date': msg['subscription_end_date'],
-                    'Days Remaining': msg['days_remaining'],
-                    'Message': msg['message_text']
-                })
-
-            cluster_df = pd.DataFrame(cluster_export_data)
-            cluster_csv = cluster_df.to_csv(index=False).encode('utf-8')
+        cluster_count = cluster_counts.get(cluster, 0)
 
+        if f"cluster_{cluster}" in artifacts:
+            artifact = artifacts[f"cluster_{cluster}"]
             st.download_button(
-                label=f"{get_cluster_emoji(cluster)} {cluster}-day ({len(cluster_messages)})",
-                data=cluster_csv,
-                file_name=f"cluster_{cluster}day_{batch_id[:8]}.csv",
+                label=f"{get_cluster_emoji(cluster)} {cluster}-day ({cluster_count})",
+                data=read_export(artifact),
+                file_name=artifact['file_name'],
                 mime="text/csv",
                 use_container_width=True,
                 key=f"download_cluster_{cluster}"
@@ -186,26 +171,52 @@ st.markdown("---")
 # View messages by cluster
 st.subheader("👀 View Messages")
 
-# Cluster filter
-selected_cluster = st.selectbox(
-    "Filter by Cluster",
-    options=["All"] + [f"{get_cluster_emoji(c)} {get_cluster_name(c)}" for c in [1, 3, 7, 30]],
-    index=0
-)
+CLUSTER_OPTIONS = {"All": None}
+CLUSTER_OPTIONS.update({f"{get_cluster_emoji(c)} {get_cluster_name(c)}": c for c in [1, 3, 7, 30]})
 
-# Filter messages
-if selected_cluster == "All":
-    filtered_messages = messages
-else:
-    cluster_num = int(selected_cluster.split()[1])
-    filtered_messages = [msg for msg in messages if msg['cluster'] == cluster_num]
+col1, col2, col3 = st.columns([2, 3, 1])
+
+with col1:
+    # Cluster filter
+    selected_cluster = st.selectbox("Filter by Cluster", options=list(CLUSTER_OPTIONS), index=0)
+
+with col2:
+    search = st.text_input("Search by name or phone", placeholder="e.g. Priya or 98765")
+
+with col3:
+    page_size = st.selectbox("Per page", options=[20, 50, 100], index=0)
+
+cluster_filter = CLUSTER_OPTIONS[selected_cluster]
+
+# Cursors of the pages already visited; reset whenever the listing changes
+listing_key = (batch_id, cluster_filter, search.strip(), page_size)
+if st.session_state.get('message_listing') != listing_key:
+    st.session_state['message_listing'] = listing_key
+    st.session_state['message_cursors'] = [None]
+
+cursors = st.session_state['message_cursors']
+
+page = db.get_message_page(
+    batch_id,
+    cluster=cluster_filter,
+    search=search,
+    after=cursors[-1],
+    page_size=page_size
+)
+page_messages = page['messages']
 
 # Display messages in table
-st.markdown(f"#### Showing {len(filtered_messages)} messages")
+first_row = (len(cursors) - 1) * page_size
+if page_messages:
+    st.markdown(
+        f"#### Showing {first_row + 1}-{first_row + len(page_messages)} of {page['total']} messages"
+    )
+else:
+    st.markdown("#### No messages match your filters")
 
-# Create display dataframe
+# Create display dataframe for this page only
 display_data = []
-for msg in filtered_messages:
+for msg in page_messages:
     display_data.append({
         '': get_cluster_emoji(msg['cluster']),
         'Name': msg['customer_name'],
@@ -224,11 +235,27 @@ st.dataframe(
     height=400
 )
 
+# Page navigation
+col1, col2, col3 = st.columns([1, 2, 1])
+
+with col1:
+    st.button("⬅️ Previous", disabled=len(cursors) == 1, use_container_width=True,
+              on_click=cursors.pop)
+
+with col2:
+    total_pages = max(1, -(-page['total'] // page_size))
+    st.markdown(f"<div style='text-align: center'>Page {len(cursors)} of {total_pages}</div>",
+                unsafe_allow_html=True)
+
+with col3:
+    st.button("Next ➡️", disabled=page['next_cursor'] is None, use_container_width=True,
+              on_click=cursors.append, args=(page['next_cursor'],))
+
 # Expandable detailed view
 st.markdown("---")
 st.subheader("📄 Detailed Messages")
 
-for msg in filtered_messages[:20]:  # Show first 20
+for msg in page_messages:
     with st.expander(f"{get_cluster_emoji(msg['cluster'])} {msg['customer_name']} - {msg['phone_number']}"):
         col1, col2 = st.columns(2)
 
@@ -246,9 +273,6 @@ for msg in filtered_messages[:20]:  # Show first 20
         # Copy button (for convenience)
         st.caption("💡 Tip: Use the export buttons above to download all messages")
 
-if len(filtered_messages) > 20:
-    st.info(f"Showing first 20 of {len(filtered_messages)} messages. Download to see all.")
-
 st.markdown("---")
 
 # Next steps
@@ -95,7 +95,8 @@ if history:
             'Filename': record['filename'],
             'Total Rows': record['total_rows'],
             'Processed': record['processed_rows'],
-            'Success Rate': f"{(record['processed_rows'] / record['total_rows'] * 100):.1f}%"
+            'Success Rate': f"{(record['processed_rows'] / record['total_rows'] * 100):.1f}%",
+            'Processing Time': f"{sum(record['timings'].values()):.1f}s" if record['timings'] else "-"
         })
 
     import pandas as pd
@@ -107,6 +108,13 @@ if history:
         hide_index=True
     )
 
+    # Per-stage breakdown of the latest timed upload
+    timed = next((h for h in history if h['timings']), None)
+    if timed:
+        with st.expander(f"⏱️ Processing breakdown: {timed['filename']}"):
+            for stage, seconds in timed['timings'].items():
+                st.write(f"**{stage.replace('_', ' ').title()}:** {seconds:.2f}s")
+
     # Option to view old uploads
     st.markdown("#### View Previous Upload")
 
@@ -119,7 +127,8 @@ if history:
     if st.button("📱 View Messages", use_container_width=True):
         # Get batch_id for selected upload
         selected_index = [f"{h['filename']} - {h['upload_date'][:10]}" for h in history].index(selected_upload)
-        selected_batch_id = history[selected_index]['batch_id']
+        # A delta upload's members are in its live batch
+        selected_batch_id = history[selected_index]['base_batch_id'] or history[selected_index]['batch_id']
 
         st.session_state['latest_batch_id'] = selected_batch_id
         st.success("Batch selected! Go to Messages page in sidebar to view.")
@@ -142,6 +151,13 @@ with col2:
     st.markdown("**Status:** Active")
     st.markdown("**Phase 2:** Coming Soon (Automated WhatsApp Sending)")
 
+cache_stats = db.cache.stats()
+st.caption(
+    f"Read cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses, "
+    f"{cache_stats['entries']} entries, {cache_stats['bytes'] / 1e6:.1f} of "
+    f"{cache_stats['max_bytes'] / 1e6:.0f} MB"
+)
+
 st.markdown("---")
 
 # Support section
@@ -0,0 +1,211 @@
+"""Daily re-clustering of stored batches.
+
+A batch's days_remaining and clusters are counted from the day it was
+uploaded. Once a day (after IST midnight) each user's latest batch is
+aged to the new day: listed members' days_remaining drop by the days
+passed, and only the members whose cluster or message changed are
+re-classified and get new messages. Those members are found by end date
+(idx_subscriptions_batch_end), so a day's work follows the listed and
+changed members, not the batch size.
+
+Runs only in the app process (see get_refresh_scheduler): a refresh
+invalidates the process's BatchCache, which another process could not
+reach, so the app would keep serving the old counts and messages.
+"""
+
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+import pandas as pd
+from database.db_manager import DatabaseManager
+from services.message_generator import MessageGenerator
+from utils.date_helpers import (
+    IST,
+    calculate_days_remaining_series,
+    classify_by_expiry_series,
+    get_current_date_ist
+)
+
+
+# Days remaining below which a member's cluster or message text changes:
+# cluster boundaries (30, 7, 3, 1) and the cluster 1 texts "expires
+# today" (0) and "has expired" (-1); below -1 nothing changes any more
+CHANGE_THRESHOLDS = (30, 7, 3, 1, 0, -1)
+
+# Seconds after IST midnight the scheduler refreshes
+REFRESH_DELAY_SECONDS = 60
+
+
+def changed_end_date_ranges(as_of: datetime, today: datetime) -> List[Tuple[str, str]]:
+    """
+    End date ranges of members whose cluster or message changes between two days.
+
+    A member ending on day E crosses threshold b when E - as_of > b >= E - today,
+    i.e. E is in [as_of + b + 1, today + b]. Overlapping ranges are merged.
+
+    Args:
+        as_of, today: Naive IST midnights, as_of before today
+
+    Returns:
+        Sorted, disjoint inclusive ('YYYY-MM-DD', 'YYYY-MM-DD') ranges
+    """
+    ranges = sorted(
+        (as_of + timedelta(days=threshold + 1), today + timedelta(days=threshold))
+        for threshold in CHANGE_THRESHOLDS
+    )
+
+    merged: List[List[datetime]] = []
+    for first, last in ranges:
+        if merged and first <= merged[-1][1] + timedelta(days=1):
+            merged[-1][1] = max(merged[-1][1], last)
+        else:
+            merged.append([first, last])
+
+    return [(first.strftime('%Y-%m-%d'), last.strftime('%Y-%m-%d')) for first, last in merged]
+
+
+class ClusterRefresher:
+    """Ages stored batches to the current IST day."""
+
+    def __init__(self, db: Optional[DatabaseManager] = None, build_exports: bool = True,
+                 templates: Optional[Dict[int, str]] = None):
+        """
+        Args:
+            build_exports: Rebuild the cached export files of refreshed
+                batches (see services.export_cache)
+            templates: Message templates by cluster, as given to
+                SubscriptionAgent (default: MessageGenerator's)
+        """
+        self.db = db or DatabaseManager()
+        self.build_exports = build_exports
+        self.templates = templates
+
+    def refresh_batch(self, batch_id: str, gym_name: str,
+                      today: Optional[datetime] = None,
+                      templates: Optional[Dict[int, str]] = None) -> Dict:
+        """
+        Age one batch to `today`.
+
+        Args:
+            batch_id: Batch to refresh
+            gym_name: Gym named in the regenerated messages
+            today: Naive IST midnight to age to (defaults to today in IST)
+            templates: Message templates by cluster (default: the refresher's)
+
+        Returns:
+            {'batch_id', 'days': days aged, 'changed': members re-classified
+            or re-worded, 'applied': whether anything was written}
+        """
+        today = today or get_current_date_ist().replace(tzinfo=None)
+        result = {'batch_id': batch_id, 'days': 0, 'changed': 0, 'applied': False}
+
+        as_of = self.db.get_batch_as_of(batch_id)
+        if as_of is None or as_of >= today:
+            return result
+
+        rows = self.db.get_subscriptions_ending_between(batch_id, changed_end_date_ranges(as_of, today))
+        changed = pd.DataFrame(
+            rows, columns=['id', 'customer_name', 'subscription_end_date', 'days_remaining', 'cluster']
+        )
+        changed['previous_cluster'] = changed['cluster']
+        changed['days_remaining'] = calculate_days_remaining_series(changed['subscription_end_date'], today)
+        changed['cluster'] = classify_by_expiry_series(changed['days_remaining'])
+        # Same generator as the upload's generate_messages node
+        message_gen = MessageGenerator(gym_name, templates=templates or self.templates)
+        changed['message_text'] = message_gen.render_batch(changed)
+
+        days = (today - as_of).days
+        applied = self.db.apply_day_shift(
+            batch_id, as_of, days,
+            changed[['id', 'days_remaining', 'cluster', 'previous_cluster', 'message_text']].to_dict('records')
+        )
+
+        if applied and self.build_exports:
+            # Lazy import: the export cache pulls in the exporters
+            from services.export_cache import get_export_cache
+            get_export_cache(self.db).invalidate(batch_id)
+
+        return {**result, 'days': days, 'changed': len(changed), 'applied': applied}
+
+    def refresh_all(self, today: Optional[datetime] = None) -> List[Dict]:
+        """
+        Age every user's latest batch to `today`.
+
+        A batch that fails is reported with an 'error' and does not stop the others.
+
+        Returns:
+            refresh_batch() results, one per user with a batch
+        """
+        today = today or get_current_date_ist().replace(tzinfo=None)
+        results = []
+
+        for user_id in self.db.get_uploader_ids():
+            batch_id = self.db.get_latest_batch_id(user_id)
+            user = self.db.get_user(user_id)
+            if not batch_id or user is None:
+                continue
+
+            try:
+                results.append(self.refresh_batch(batch_id, user['gym_name'], today))
+            except Exception as e:
+                results.append({'batch_id': batch_id, 'days': 0, 'changed': 0,
+                                'applied': False, 'error': str(e)})
+
+        return results
+
+
+def seconds_until_next_refresh(now: Optional[datetime] = None) -> float:
+    """Seconds from now (IST) until REFRESH_DELAY_SECONDS past the next IST midnight."""
+    now = now or datetime.now(IST)
+    next_day = now.replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=1)
+    return (next_day - now).total_seconds() + REFRESH_DELAY_SECONDS
+
+
+class RefreshScheduler:
+    """
+    Background thread refreshing every batch once a day.
+
+    On start it catches up right away (e.g. after the app was down over
+    midnight), then runs shortly after each IST midnight.
+    """
+
+    def __init__(self, refresher: Optional[ClusterRefresher] = None):
+        self.refresher = refresher or ClusterRefresher()
+        self.last_results: List[Dict] = []
+        self.last_run: Optional[datetime] = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._loop, name="hercules-refresh", daemon=True)
+
+    def start(self) -> "RefreshScheduler":
+        self._thread.start()
+        return self
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                self.last_results = self.refresher.refresh_all()
+                self.last_run = datetime.now(IST)
+            except Exception as e:
+                print(f"[FAIL] Cluster refresh failed: {e}")
+            self._stop.wait(seconds_until_next_refresh())
+
+    def stop(self, wait: bool = True):
+        """Stop the thread after its current run."""
+        self._stop.set()
+        if wait and self._thread.is_alive():
+            self._thread.join()
+
+
+_scheduler: Optional[RefreshScheduler] = None
+_scheduler_lock = threading.Lock()
+
+
+def get_refresh_scheduler() -> RefreshScheduler:
+    """Get the process-wide refresh scheduler, starting it on first use."""
+    global _scheduler
+
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = RefreshScheduler().start()
+        return _scheduler
+
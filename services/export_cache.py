@@ -0,0 +1,326 @@
+"""On-disk cache of a batch's export files."""
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import zipfile
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+from database.db_manager import DatabaseManager
+from services.export_service import ALL_MESSAGES, BatchExcelExporter, CsvExporter
+
+
+DEFAULT_EXPORT_BYTES = 1024 * 1024 * 1024
+
+# Directory next to the database file holding its exports
+EXPORT_DIR_NAME = "exports"
+
+HASH_CHUNK_BYTES = 1024 * 1024
+
+
+def _sha256(path: str) -> str:
+    """Hex SHA-256 of a file, read in chunks."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as handle:
+        for chunk in iter(lambda: handle.read(HASH_CHUNK_BYTES), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ExportCache:
+    """
+    Export files of each batch, built once and kept on disk.
+
+    Files are stored content-addressed under objects/<sha256>, and a
+    manifest per batch (batches/<batch_id>.json) maps artifact names to
+    their objects:
+
+    - 'csv':       every message
+    - 'xlsx':      every message, colour-coded
+    - 'cluster_N': messages of cluster N (only clusters with messages)
+    - 'zip':       all of the above in one archive
+
+    A manifest stays valid until it is evicted, or invalidated when the
+    batch's messages changed (the daily refresh, a delta upload). Each
+    invalidation starts a new generation of the batch: a build of an older
+    generation still running then does not record its manifest. When the
+    objects outgrow max_bytes, the least recently read batches are
+    dropped; a batch whose files went missing is rebuilt by ensure().
+    """
+
+    def __init__(self, db: DatabaseManager, cache_dir: Optional[str] = None,
+                 max_bytes: int = DEFAULT_EXPORT_BYTES):
+        self.db = db
+        self.cache_dir = cache_dir or os.path.join(os.path.dirname(os.path.abspath(db.db_path)), EXPORT_DIR_NAME)
+        self.max_bytes = max_bytes
+        self.objects_dir = os.path.join(self.cache_dir, "objects")
+        self.batches_dir = os.path.join(self.cache_dir, "batches")
+
+        os.makedirs(self.objects_dir, exist_ok=True)
+        os.makedirs(self.batches_dir, exist_ok=True)
+
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="hercules-export")
+        # Batch ID -> (generation, future) of its queued or running build
+        self._builds: Dict[str, Tuple[int, Future]] = {}
+        self._generations: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def _manifest_path(self, batch_id: str) -> str:
+        return os.path.join(self.batches_dir, f"{batch_id}.json")
+
+    def _object_path(self, digest: str) -> str:
+        return os.path.join(self.objects_dir, digest)
+
+    def _read_manifest(self, path: str) -> Optional[Dict]:
+        try:
+            with open(path) as handle:
+                return json.load(handle)
+        except (OSError, ValueError):
+            return None
+
+    def get(self, batch_id: str) -> Optional[Dict[str, Dict]]:
+        """
+        Get the cached exports of a batch.
+
+        Returns:
+            Artifact name -> {'path', 'file_name', 'size'}, or None when the
+            batch has not been built or any of its files is missing
+        """
+        manifest_path = self._manifest_path(batch_id)
+        manifest = self._read_manifest(manifest_path)
+        if manifest is None:
+            return None
+
+        artifacts = {}
+        for name, artifact in manifest['artifacts'].items():
+            path = self._object_path(artifact['sha256'])
+            if not os.path.exists(path) or os.path.getsize(path) != artifact['size']:
+                return None
+            artifacts[name] = {'path': path, 'file_name': artifact['file_name'], 'size': artifact['size']}
+
+        # The manifest's mtime is the batch's last use, for eviction
+        try:
+            os.utime(manifest_path)
+        except OSError:
+            pass
+
+        return artifacts
+
+    def submit(self, batch_id: str) -> Future:
+        """
+        Build a batch's exports in the background.
+
+        A build of the batch's current generation already queued or running
+        is shared rather than repeated.
+        """
+        with self._lock:
+            return self._submit(batch_id)
+
+    def _submit(self, batch_id: str) -> Future:
+        """submit() with the lock held."""
+        generation = self._generations.get(batch_id, 0)
+        build = self._builds.get(batch_id)
+        if build is not None and build[0] == generation and not build[1].done():
+            return build[1]
+
+        future = self.executor.submit(self._build, batch_id, generation)
+        self._builds[batch_id] = (generation, future)
+        future.add_done_callback(lambda _: self._forget(batch_id, future))
+        return future
+
+    def _forget(self, batch_id: str, future: Future):
+        with self._lock:
+            build = self._builds.get(batch_id)
+            if build is not None and build[1] is future:
+                del self._builds[batch_id]
+
+    def invalidate(self, batch_id: str) -> Future:
+        """
+        Rebuild a batch's exports after its messages changed.
+
+        The cached exports are dropped at once, and a build of an older
+        generation still queued or running will not record its manifest.
+
+        Returns:
+            The new build
+        """
+        with self._lock:
+            self._generations[batch_id] = self._generations.get(batch_id, 0) + 1
+            self._discard(batch_id)
+            return self._submit(batch_id)
+
+    def ensure(self, batch_id: str) -> Dict[str, Dict]:
+        """Get a batch's exports, (re)building them first if needed."""
+        artifacts = self.get(batch_id)
+        if artifacts is None:
+            self.submit(batch_id).result()
+            artifacts = self.get(batch_id)
+        return artifacts
+
+    def is_building(self, batch_id: str) -> bool:
+        """Whether a build of the batch's exports is queued or running."""
+        with self._lock:
+            build = self._builds.get(batch_id)
+            return build is not None and not build[1].done()
+
+    def _build(self, batch_id: str, generation: int = 0):
+        """
+        Write every export of a batch, store the files and record the manifest.
+
+        If the batch was invalidated since this build was queued, its files
+        are dropped instead (a newer build follows).
+        """
+        prefix = batch_id[:8]
+
+        with tempfile.TemporaryDirectory(dir=self.cache_dir) as work_dir:
+            files = {}
+            csv_paths = CsvExporter(self.db).write(batch_id, work_dir)
+            for key, path in csv_paths.items():
+                files['csv' if key == ALL_MESSAGES else f"cluster_{key}"] = path
+
+            files['xlsx'] = os.path.join(work_dir, f"gym_messages_{prefix}.xlsx")
+            BatchExcelExporter(self.db, batch_id).save(files['xlsx'])
+
+            files['zip'] = os.path.join(work_dir, f"gym_messages_{prefix}.zip")
+            with zipfile.ZipFile(files['zip'], 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+                for name, path in files.items():
+                    if name != 'zip':
+                        archive.write(path, arcname=os.path.basename(path))
+
+            artifacts = {}
+            for name, path in files.items():
+                digest = _sha256(path)
+                size = os.path.getsize(path)
+                target = self._object_path(digest)
+                if not os.path.exists(target):
+                    os.replace(path, target)
+                artifacts[name] = {'sha256': digest, 'size': size, 'file_name': os.path.basename(path)}
+
+        manifest = {
+            'batch_id': batch_id,
+            'created_at': datetime.now().isoformat(timespec='seconds'),
+            'artifacts': artifacts,
+        }
+        manifest_path = self._manifest_path(batch_id)
+        with self._lock:
+            if self._generations.get(batch_id, 0) != generation:
+                self._remove_unreferenced(artifact['sha256'] for artifact in artifacts.values())
+                return
+            with open(f"{manifest_path}.tmp", 'w') as handle:
+                json.dump(manifest, handle)
+            os.replace(f"{manifest_path}.tmp", manifest_path)
+
+        self.evict(keep=batch_id)
+
+    def evict(self, keep: Optional[str] = None) -> List[str]:
+        """
+        Drop the least recently used batches until the files fit max_bytes.
+
+        Objects no longer listed by any manifest are deleted as well.
+
+        Returns:
+            Batch IDs whose exports were dropped
+        """
+        with self._lock:
+            manifests = []
+            for entry in os.scandir(self.batches_dir):
+                if not entry.name.endswith(".json"):
+                    continue
+                manifest = self._read_manifest(entry.path)
+                if manifest is not None:
+                    manifests.append((entry.stat().st_mtime, entry.path, manifest))
+            manifests.sort(key=lambda item: item[0])
+
+            sizes = {entry.name: entry.stat().st_size for entry in os.scandir(self.objects_dir)}
+            total = sum(sizes.values())
+
+            def referenced(remaining) -> set:
+                return {
+                    artifact['sha256']
+                    for _, _, manifest in remaining
+                    for artifact in manifest['artifacts'].values()
+                }
+
+            evicted = []
+            while total > self.max_bytes:
+                candidates = [item for item in manifests if item[2]['batch_id'] != keep]
+                if not candidates:
+                    break
+                oldest = candidates[0]
+                manifests.remove(oldest)
+                os.remove(oldest[1])
+                evicted.append(oldest[2]['batch_id'])
+
+                in_use = referenced(manifests)
+                for digest in [digest for digest in sizes if digest not in in_use]:
+                    total -= sizes.pop(digest)
+                    os.remove(self._object_path(digest))
+
+            return evicted
+
+    def discard(self, batch_id: str) -> bool:
+        """
+        Drop a batch's exports after its messages changed.
+
+        Objects no other manifest lists are deleted as well.
+
+        Returns:
+            Whether the batch had cached exports
+        """
+        with self._lock:
+            return self._discard(batch_id)
+
+    def _discard(self, batch_id: str) -> bool:
+        """discard() with the lock held."""
+        manifest = self._read_manifest(self._manifest_path(batch_id))
+        if manifest is None:
+            return False
+        os.remove(self._manifest_path(batch_id))
+
+        self._remove_unreferenced(artifact['sha256'] for artifact in manifest['artifacts'].values())
+        return True
+
+    def _remove_unreferenced(self, digests: Iterable[str]):
+        """Delete the objects among digests that no manifest lists."""
+        in_use = set()
+        for entry in os.scandir(self.batches_dir):
+            other = self._read_manifest(entry.path) if entry.name.endswith(".json") else None
+            if other is not None:
+                in_use.update(artifact['sha256'] for artifact in other['artifacts'].values())
+
+        for digest in set(digests) - in_use:
+            try:
+                os.remove(self._object_path(digest))
+            except OSError:
+                pass
+
+    def clear(self):
+        """Remove every cached export."""
+        with self._lock:
+            shutil.rmtree(self.cache_dir, ignore_errors=True)
+            os.makedirs(self.objects_dir, exist_ok=True)
+            os.makedirs(self.batches_dir, exist_ok=True)
+
+    def shutdown(self, wait: bool = True):
+        """Stop accepting builds and optionally wait for running ones."""
+        self.executor.shutdown(wait=wait)
+
+
+_caches: Dict[str, ExportCache] = {}
+_caches_lock = threading.Lock()
+
+
+def get_export_cache(db: DatabaseManager) -> ExportCache:
+    """Get the process-wide export cache for a database file."""
+    db_path = os.path.abspath(db.db_path)
+
+    with _caches_lock:
+        cache = _caches.get(db_path)
+        if cache is None:
+            cache = ExportCache(db)
+            _caches[db_path] = cache
+        return cache
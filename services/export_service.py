@@ -0,0 +1,249 @@
+"""Export generated messages to CSV and Excel."""
+
+import csv
+import os
+import pandas as pd
+from io import BytesIO
+from typing import BinaryIO, Dict, Iterator, List, Union
+from database.db_manager import DatabaseManager
+
+
+EXPORT_COLUMNS = ['Customer Name', 'Phone Number', 'Expiry Date', 'Days Remaining', 'Cluster', 'Message']
+
+# Per-cluster files leave out the Cluster column
+CLUSTER_EXPORT_COLUMNS = [column for column in EXPORT_COLUMNS if column != 'Cluster']
+
+EXPORT_CLUSTERS = [1, 3, 7, 30]
+
+# Rows fetched from the database and written per step
+EXPORT_CHUNK_SIZE = 5000
+
+# Cluster cell fills of the Excel export, matching the cluster emojis
+CLUSTER_FILLS = {
+    1: 'FFC7CE',   # red
+    3: 'FFEB9C',   # yellow
+    7: 'C6EFCE',   # green
+    30: 'DDEBF7',  # blue
+}
+
+HEADER_STYLE = 'export_header'
+
+MAX_COLUMN_WIDTH = 50
+
+# Key of the full export in the dict returned by CsvExporter.write
+ALL_MESSAGES = 'all'
+
+
+class CsvExporter:
+    """
+    Writes a batch's CSV exports straight from a database cursor.
+
+    One pass over the batch's messages produces the full file and one file
+    per cluster. Rows are streamed chunk by chunk, so memory use depends
+    on chunk_size rather than on the batch size.
+    """
+
+    def __init__(self, db: DatabaseManager, chunk_size: int = EXPORT_CHUNK_SIZE):
+        self.db = db
+        self.chunk_size = chunk_size
+
+    @staticmethod
+    def _open(path: str, columns: List[str]):
+        """Open a CSV file for writing (same dialect as DataFrame.to_csv)."""
+        handle = open(path, 'w', newline='', encoding='utf-8')
+        writer = csv.writer(handle, lineterminator='\n')
+        writer.writerow(columns)
+        return handle, writer
+
+    def write(self, batch_id: str, out_dir: str) -> Dict[Union[str, int], str]:
+        """
+        Write the exports of a batch into out_dir.
+
+        Returns:
+            Paths keyed by ALL_MESSAGES for the full file and by cluster
+            number for the cluster files (clusters without messages have
+            no file)
+        """
+        os.makedirs(out_dir, exist_ok=True)
+        paths = {ALL_MESSAGES: os.path.join(out_dir, f"gym_messages_{batch_id[:8]}.csv")}
+
+        full_handle, full_writer = self._open(paths[ALL_MESSAGES], EXPORT_COLUMNS)
+        cluster_handle = None
+        current_cluster = None
+
+        try:
+            for rows in self.db.iter_message_rows(batch_id, self.chunk_size):
+                full_writer.writerows(
+                    (name, phone, end_date, days, f"{cluster}-day", text)
+                    for name, phone, end_date, days, cluster, text in rows
+                )
+
+                # Rows arrive ordered by cluster, so each cluster file is
+                # written in one go and closed when the next cluster starts
+                start = 0
+                while start < len(rows):
+                    cluster = rows[start][4]
+                    end = start
+                    while end < len(rows) and rows[end][4] == cluster:
+                        end += 1
+
+                    if cluster != current_cluster:
+                        if cluster_handle is not None:
+                            cluster_handle.close()
+                        paths[cluster] = os.path.join(out_dir, f"cluster_{cluster}day_{batch_id[:8]}.csv")
+                        cluster_handle, cluster_writer = self._open(paths[cluster], CLUSTER_EXPORT_COLUMNS)
+                        current_cluster = cluster
+
+                    cluster_writer.writerows(
+                        (name, phone, end_date, days, text)
+                        for name, phone, end_date, days, _, text in rows[start:end]
+                    )
+                    start = end
+        finally:
+            full_handle.close()
+            if cluster_handle is not None:
+                cluster_handle.close()
+
+        return paths
+
+
+class ExcelExporter:
+    """
+    Builds the Excel download shown on the Messages page.
+
+    Uses openpyxl's write-only mode: column widths are computed up front
+    from the string lengths of each column, then rows are streamed into
+    the sheet. Cluster cells are filled with the cluster's colour through
+    named styles shared by the whole workbook.
+
+    Messages are read through pages(), once for the widths and once for
+    the rows (see BatchExcelExporter).
+    """
+
+    def __init__(self, messages: List[Dict]):
+        """
+        Args:
+            messages: Rows from DatabaseManager.get_messages_by_batch
+        """
+        self.messages = messages
+
+    def pages(self) -> Iterator[List[Dict]]:
+        """The messages to export, in export order, a list at a time."""
+        yield self.messages
+
+    @staticmethod
+    def _frame(messages: List[Dict]) -> pd.DataFrame:
+        """Export columns for the given messages."""
+        frame = pd.DataFrame.from_records(messages, columns=[
+            'customer_name', 'phone_number', 'subscription_end_date',
+            'days_remaining', 'cluster', 'message_text'
+        ])
+        frame.columns = EXPORT_COLUMNS
+        frame['Cluster'] = frame['Cluster'].astype(str) + '-day'
+        return frame
+
+    def to_dataframe(self) -> pd.DataFrame:
+        """Export columns for every message."""
+        return self._frame(self.messages)
+
+    @staticmethod
+    def column_widths(frame: pd.DataFrame) -> List[int]:
+        """Widths fitting the longest value (or header) of each column."""
+        widths = []
+        for column in frame.columns:
+            longest = frame[column].astype(str).str.len().max() if len(frame) else 0
+            widths.append(min(max(int(longest), len(column)) + 2, MAX_COLUMN_WIDTH))
+        return widths
+
+    @staticmethod
+    def _add_styles(workbook):
+        """Register the header and cluster styles."""
+        from openpyxl.styles import Font, NamedStyle, PatternFill
+
+        workbook.add_named_style(NamedStyle(name=HEADER_STYLE, font=Font(bold=True)))
+        for cluster, color in CLUSTER_FILLS.items():
+            workbook.add_named_style(NamedStyle(
+                name=f"cluster_{cluster}",
+                fill=PatternFill(fill_type='solid', start_color=color, end_color=color)
+            ))
+
+    def to_excel(self) -> bytes:
+        """All messages as an .xlsx workbook with fitted, colour-coded columns."""
+        output = BytesIO()
+        self.save(output)
+        return output.getvalue()
+
+    def save(self, target: Union[str, BinaryIO]):
+        """Write the workbook to a path or binary file object."""
+        # openpyxl is only loaded when a workbook is actually built
+        from openpyxl import Workbook
+        from openpyxl.cell import WriteOnlyCell
+        from openpyxl.utils import get_column_letter
+
+        widths = [len(column) + 2 for column in EXPORT_COLUMNS]
+        for messages in self.pages():
+            widths = [max(pair) for pair in zip(widths, self.column_widths(self._frame(messages)))]
+
+        workbook = Workbook(write_only=True)
+        self._add_styles(workbook)
+        worksheet = workbook.create_sheet('Messages')
+
+        # Write-only sheets need their dimensions before the first row
+        for index, width in enumerate(widths, 1):
+            worksheet.column_dimensions[get_column_letter(index)].width = width
+        worksheet.freeze_panes = 'A2'
+
+        header = []
+        for column in EXPORT_COLUMNS:
+            cell = WriteOnlyCell(worksheet, value=column)
+            cell.style = HEADER_STYLE
+            header.append(cell)
+        worksheet.append(header)
+
+        # One styled Cluster cell per cluster, reused for every row:
+        # append() serialises the row before returning. Plain values take
+        # openpyxl's fast path, so only the Cluster column is filled.
+        cluster_cells = {}
+        for cluster in CLUSTER_FILLS:
+            cluster_cells[cluster] = WriteOnlyCell(worksheet)
+            cluster_cells[cluster].style = f"cluster_{cluster}"
+
+        for messages in self.pages():
+            frame = self._frame(messages)
+            clusters = [message['cluster'] for message in messages]
+            columns = [frame[column].tolist() for column in EXPORT_COLUMNS]
+
+            for cluster, (name, phone, end_date, days, label, text) in zip(clusters, zip(*columns)):
+                cell = cluster_cells.get(cluster)
+                if cell is None:
+                    worksheet.append((name, phone, end_date, days, label, text))
+                    continue
+                cell.value = label
+                worksheet.append((name, phone, end_date, days, cell, text))
+
+        workbook.save(target)
+
+
+class BatchExcelExporter(ExcelExporter):
+    """
+    Builds a stored batch's Excel export page by page.
+
+    Messages are read with DatabaseManager.get_message_page (keyset
+    pagination) rather than loaded whole, and are not kept in the batch
+    cache, so memory use depends on page_size rather than on the batch size.
+    """
+
+    def __init__(self, db: DatabaseManager, batch_id: str, page_size: int = EXPORT_CHUNK_SIZE):
+        super().__init__([])
+        self.db = db
+        self.batch_id = batch_id
+        self.page_size = page_size
+
+    def pages(self) -> Iterator[List[Dict]]:
+        after = None
+        while True:
+            page = self.db.get_message_page(self.batch_id, after=after, page_size=self.page_size)
+            yield page['messages']
+            after = page['next_cursor']
+            if after is None:
+                return
@@ -0,0 +1,313 @@
+"""Background processing of uploaded member files."""
+
+import io
+import os
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional
+from database.db_manager import DatabaseManager
+from utils import tracing
+from utils.validators import STREAMING_MAX_FILE_SIZE_MB
+
+
+DEFAULT_WORKERS = 2
+DEFAULT_UPLOAD_DIR = "uploads"
+
+# Job stage while the file is read and processed chunk by chunk
+STREAM_STAGE = "process_chunks"
+
+# Number of messages/errors kept in a job result for display
+PREVIEW_MESSAGES = 5
+PREVIEW_ERRORS = 20
+
+ACTIVE_STATUSES = ('queued', 'running')
+
+
+class StoredUpload(io.BufferedReader):
+    """Saved upload read back with the name/size attributes of a Streamlit upload."""
+
+    def __init__(self, path: str, name: str):
+        super().__init__(io.FileIO(path, 'rb'))
+        self._upload_name = name
+        self.size = os.path.getsize(path)
+
+    @property
+    def name(self) -> str:
+        return self._upload_name
+
+
+class JobQueue:
+    """
+    Persistent queue of upload processing jobs.
+
+    Jobs are recorded in the jobs table and run on a small thread pool, so
+    an upload returns immediately and the page polls for progress. Jobs that
+    were queued or running when the process stopped are picked up again on
+    start.
+    """
+
+    def __init__(self, db: Optional[DatabaseManager] = None,
+                 max_workers: int = DEFAULT_WORKERS,
+                 upload_dir: str = DEFAULT_UPLOAD_DIR):
+        """Initialize queue and resume unfinished jobs."""
+        self.db = db or DatabaseManager()
+        self.upload_dir = upload_dir
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="hercules-job")
+
+        os.makedirs(upload_dir, exist_ok=True)
+
+        for job in self.db.requeue_unfinished_jobs():
+            self.executor.submit(self._run, job['id'])
+
+    def submit_upload(self, user_id: int, gym_name: str, filename: str, data: bytes,
+                      delta: bool = False, force: bool = False) -> str:
+        """
+        Save an uploaded file and queue it for processing.
+
+        Args:
+            delta: Write only the members that changed since the gym's last
+                delta upload (see SubscriptionAgent.process)
+            force: Process the file even if the same file was already
+                processed today (see _duplicate_of)
+
+        Returns:
+            Job ID
+        """
+        job_id = str(uuid.uuid4())
+        extension = os.path.splitext(filename)[1]
+        file_path = os.path.join(self.upload_dir, f"{job_id}{extension}")
+
+        with open(file_path, 'wb') as handle:
+            handle.write(data)
+
+        options = {'delta': delta, 'force': force}
+        self.db.create_job(job_id, user_id, gym_name, filename, file_path,
+                           options={key: True for key, value in options.items() if value} or None)
+        self.executor.submit(self._run, job_id)
+        return job_id
+
+    def get_job(self, job_id: str) -> Optional[Dict]:
+        """Get a job with its result ready for display."""
+        job = self.db.get_job(job_id)
+        if job and job['result']:
+            # JSON object keys are strings; clusters are ints everywhere else
+            job['result']['cluster_counts'] = {
+                int(cluster): count
+                for cluster, count in job['result']['cluster_counts'].items()
+            }
+        return job
+
+    def get_active_job(self, user_id: int) -> Optional[Dict]:
+        """Get the user's most recent job if it is still queued or running."""
+        jobs = self.db.get_jobs_by_user(user_id, limit=1)
+        if jobs and jobs[0]['status'] in ACTIVE_STATUSES:
+            return jobs[0]
+        return None
+
+    def _duplicate_of(self, job: Dict, content_hash: str) -> Optional[Dict]:
+        """
+        The user's earlier job that already processed this file today, if any.
+
+        It must be a completed job of the user with the same content hash
+        and delta option, finished on the current IST day, and its batch
+        must still hold what it wrote: its rows are still there, and no
+        delta upload has changed it since (delta uploads all write to the
+        user's live batch; other uploads get a batch of their own).
+        """
+        # Imported here to keep this module free of pandas/numpy
+        from utils.date_helpers import get_current_date_ist
+
+        if job['options'].get('force'):
+            return None
+
+        delta = bool(job['options'].get('delta'))
+        # finished_at is local time, like datetime.now()
+        day_start = get_current_date_ist().astimezone().replace(tzinfo=None)
+
+        for previous in self.db.get_completed_jobs_by_hash(job['user_id'], content_hash, day_start):
+            if (bool(previous['options'].get('delta')) != delta or not previous['result']
+                    or previous['result'].get('duplicate_of')):
+                continue
+
+            changed = any(
+                other['id'] != previous['id'] and other['batch_id'] == previous['batch_id']
+                and other['options'].get('delta') and not other['result'].get('duplicate_of')
+                for other in self.db.get_completed_jobs_since(job['user_id'], previous['finished_at'])
+            )
+            if changed or self.db.get_batch_as_of(previous['batch_id']) is None:
+                continue
+
+            return previous
+
+        return None
+
+    def _run(self, job_id: str):
+        """
+        Process one job (runs on a worker thread).
+
+        The file is streamed through the agent chunk by chunk (see
+        SubscriptionAgent.process_stream), so rows are in the database while
+        the rest of the file is still being read. A delta upload needs every
+        row before it can tell which members were removed, so its chunks
+        are collected and diffed in one go.
+
+        A file the user already processed today is not processed again;
+        the job completes with the earlier job's batch and result.
+
+        The batch ID is recorded on the job before any row is written. A
+        job resumed after a restart reuses it, and first deletes the rows
+        the interrupted run saved.
+        """
+        # Imported here so pages that only poll jobs don't load langgraph/openpyxl
+        import pandas as pd
+        from agents.excel_processor import ExcelProcessor
+        from agents.subscription_agent import get_agent
+
+        new_batch_id = str(uuid.uuid4())
+        if not self.db.claim_job(job_id, new_batch_id):
+            return
+
+        job = self.db.get_job(job_id)
+        batch_id = job['batch_id']
+        if batch_id != new_batch_id:
+            # Resumed: drop the chunks the interrupted run committed
+            self.db.delete_batch_rows(batch_id)
+        errors = []
+        error_count = 0
+        valid_rows = 0
+
+        try:
+            self.db.update_job_progress(job_id, "parse_file", 0.0, {})
+
+            processor = ExcelProcessor()
+            with tracing.batch_trace(batch_id), StoredUpload(job['file_path'], job['filename']) as upload:
+                with tracing.span("excel.validate_file"):
+                    is_valid, message = processor.validate_file(upload, STREAMING_MAX_FILE_SIZE_MB)
+                if is_valid:
+                    with tracing.span("excel.hash"):
+                        content_hash = processor.hash_content(upload)
+
+                    previous = self._duplicate_of(job, content_hash)
+                    if previous is not None:
+                        self.db.finish_job(job_id, 'completed', batch_id=previous['batch_id'], result={
+                            **previous['result'],
+                            'message': "This file was already processed today; showing those results",
+                            'duplicate_of': previous['id'],
+                        }, content_hash=content_hash)
+                        return
+
+                    with tracing.span("excel.open"):
+                        is_valid, message, chunks = processor.load_stream(upload)
+
+                if not is_valid:
+                    self.db.finish_job(job_id, 'failed', error=message, result={
+                        'message': message,
+                        'cluster_counts': {},
+                        'errors': [message],
+                        'error_count': 1,
+                    })
+                    return
+
+                # Raw phone numbers of every row, rejected ones included, so a
+                # delta upload does not remove members whose rows had errors
+                listed_phones = []
+
+                def cleaned_chunks():
+                    # Keep only the first errors; the rest are just counted
+                    nonlocal error_count, valid_rows
+                    for chunk in chunks:
+                        if job['options'].get('delta'):
+                            listed_phones.append(chunk['phone_number'])
+                        cleaned_chunk, chunk_errors = processor.validate_and_clean_data(chunk)
+                        errors.extend(chunk_errors[:PREVIEW_ERRORS - len(errors)])
+                        error_count += len(chunk_errors)
+                        valid_rows += len(cleaned_chunk)
+                        yield cleaned_chunk
+
+                def report(rows_saved: int, timings: Dict[str, float]):
+                    progress = processor.total_rows / processor.expected_rows if processor.expected_rows else 0.0
+                    self.db.update_job_progress(job_id, STREAM_STAGE, min(progress, 1.0), timings)
+
+                if job['options'].get('delta'):
+                    frames = []
+                    for cleaned_chunk in cleaned_chunks():
+                        frames.append(cleaned_chunk)
+                        report(valid_rows, {})
+
+                    def report_stage(stage: str, progress: float, timings: Dict[str, float]):
+                        self.db.update_job_progress(job_id, stage, progress, timings)
+
+                    # An empty file must not remove every member
+                    result = get_agent(self.db).process(
+                        pd.concat(frames), job['filename'],
+                        progress_callback=report_stage,
+                        batch_id=batch_id,
+                        user_id=job['user_id'],
+                        gym_name=job['gym_name'],
+                        delta=True,
+                        listed_phones=pd.concat(listed_phones)
+                    ) if valid_rows else None
+                else:
+                    # Chunks are saved as they are read, so the file stays open throughout
+                    result = get_agent(self.db).process_stream(
+                        cleaned_chunks(), job['filename'],
+                        progress_callback=report,
+                        batch_id=batch_id,
+                        user_id=job['user_id'],
+                        gym_name=job['gym_name']
+                    )
+
+            if valid_rows == 0:
+                message = "No valid rows found after validation"
+                self.db.finish_job(job_id, 'failed', error=message, result={
+                    'message': message,
+                    'cluster_counts': {},
+                    'errors': errors,
+                    'error_count': error_count,
+                })
+                return
+
+            if not result['success']:
+                self.db.finish_job(job_id, 'failed', error=result['error'])
+                return
+
+            self.db.finish_job(job_id, 'completed', batch_id=result['batch_id'], result={
+                'message': processor.summary_message(valid_rows, processor.total_rows, error_count),
+                'batch_id': result['batch_id'],
+                'total_processed': result['total_processed'],
+                'cluster_counts': {
+                    int(cluster): int(count)
+                    for cluster, count in result['cluster_counts'].items()
+                },
+                'messages': result['messages'][:PREVIEW_MESSAGES],
+                'delta': result.get('delta'),
+                'stage_timings': result['stage_timings'],
+                'errors': errors,
+                'error_count': error_count,
+            }, content_hash=processor.content_hash)
+
+        except Exception as e:
+            self.db.finish_job(job_id, 'failed', error=str(e))
+
+        finally:
+            if os.path.exists(job['file_path']):
+                os.remove(job['file_path'])
+
+    def shutdown(self, wait: bool = True):
+        """Stop accepting jobs and optionally wait for running ones."""
+        self.executor.shutdown(wait=wait)
+
+
+_queue: Optional[JobQueue] = None
+_queue_lock = threading.Lock()
+
+
+def get_job_queue() -> JobQueue:
+    """Get the process-wide job queue, starting it on first use."""
+    global _queue
+
+    with _queue_lock:
+        if _queue is None:
+            _queue = JobQueue()
+        return _queue
@@ -1,15 +1,41 @@
 """WhatsApp message template generator."""
 
-from typing import Dict
+from string import Formatter
+from typing import Dict, Optional
+import numpy as np
+import pandas as pd
+from utils.date_helpers import get_expiry_text, format_date_indian
+
+
+# Placeholders render_batch can fill column-wise; templates using anything
+# else (format specs, conversions, unknown fields) are rendered row by row
+TEMPLATE_FIELDS = {'name', 'gym_name', 'expiry_text', 'date'}
+
+
+def _first_name(customer_name: str) -> str:
+    """First name as generate_message extracts it."""
+    return customer_name.split()[0] if customer_name else "Member"
+
+
+def _map_distinct(column: pd.Series, func) -> np.ndarray:
+    """Apply func once per distinct value and broadcast the results."""
+    codes, uniques = pd.factorize(column, use_na_sentinel=False)
+    results = np.array([func(value) for value in uniques], dtype=object)
+    return results[codes]
 
 
 class MessageGenerator:
     """Generates personalized WhatsApp messages for gym members."""
 
-    def __init__(self, gym_name: str):
-        """Initialize generator with gym name."""
+    def __init__(self, gym_name: str, templates: Optional[Dict[int, str]] = None):
+        """
+        Initialize generator with gym name.
+
+        Args:
+            templates: Templates by cluster (default: the built-in ones)
+        """
         self.gym_name = gym_name
-        self.templates = self._create_templates()
+        self.templates = dict(templates) if templates else self._create_templates()
 
     def _create_templates(self) -> Dict[int, str]:
         """Create message templates for each cluster."""
@@ -51,6 +77,71 @@ class MessageGenerator:
 
         return message
 
+    def render_batch(self, frame: pd.DataFrame) -> pd.Series:
+        """
+        Render messages for a whole frame at once.
+
+        Produces exactly what generate_message would for each row, but works
+        out first names, expiry texts and DD-MM-YYYY dates once per distinct
+        value and fills each cluster's template for all of its rows in one
+        pass.
+
+        Args:
+            frame: Frame with customer_name, days_remaining,
+                subscription_end_date ('YYYY-MM-DD') and cluster columns
+
+        Returns:
+            Series of message strings aligned with frame.index
+        """
+        messages = np.empty(len(frame), dtype=object)
+
+        if not frame.empty:
+            columns = {
+                'name': _map_distinct(frame['customer_name'], _first_name),
+                'gym_name': self.gym_name,
+                'expiry_text': _map_distinct(frame['days_remaining'], get_expiry_text),
+                'date': _map_distinct(frame['subscription_end_date'], format_date_indian)
+            }
+
+            clusters = frame['cluster'].to_numpy()
+            for cluster in pd.unique(clusters):
+                rows = clusters == cluster
+                template = self.templates.get(cluster, self.templates[1])
+                messages[rows] = self._fill_template(template, columns, rows)
+
+        return pd.Series(messages, index=frame.index, dtype=object)
+
+    def _fill_template(self, template: str, columns: Dict, rows: np.ndarray) -> np.ndarray:
+        """Fill one template for the selected rows."""
+        values = {
+            key: column if isinstance(column, str) else column[rows]
+            for key, column in columns.items()
+        }
+
+        parts = list(Formatter().parse(template))
+        simple = all(
+            field is None or (field in TEMPLATE_FIELDS and not spec and not conversion)
+            for _, field, spec, conversion in parts
+        )
+
+        if not simple:
+            # Same str.format call as generate_message
+            return np.array([
+                template.format(name=name, gym_name=self.gym_name,
+                                expiry_text=expiry_text, date=date)
+                for name, expiry_text, date in zip(values['name'], values['expiry_text'], values['date'])
+            ], dtype=object)
+
+        # Concatenate literal text and placeholder columns element-wise
+        filled = np.full(int(rows.sum()), '', dtype=object)
+        for literal, field, _, _ in parts:
+            if literal:
+                filled = filled + literal
+            if field is not None:
+                filled = filled + values[field]
+
+        return filled
+
     def update_gym_name(self, gym_name: str):
         """Update gym name in templates."""
         self.gym_name = gym_name
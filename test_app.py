@@ -133,7 +133,1573 @@ except Exception as e:
     traceback.print_exc()
     sys.exit(1)
 
+# Test 8: Atomic batch ingest
+print("\n[TEST 8] Testing atomic batch ingest...")
+try:
+    import tempfile
+    from database.db_manager import DatabaseManager
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        tmp_db = DatabaseManager(os.path.join(tmp_dir, "test.db"))
+
+        subscriptions = [{
+            'user_id': 1,
+            'upload_batch_id': 'batch-a',
+            'customer_name': name,
+            'phone_number': f"+91-98765432{i:02d}",
+            'subscription_start_date': '2025-01-01',
+            'subscription_end_date': '2025-02-01',
+            'days_remaining': days,
+            'cluster': cluster
+        } for i, (name, days, cluster) in enumerate([("Zara Khan", 0, 1), ("Amit Shah", 20, 30), ("Ravi Rao", 2, 3)])]
+        messages = [{'message_text': f"Hi {sub['customer_name']}", 'cluster': sub['cluster']} for sub in subscriptions]
+
+        ids = tmp_db.save_upload_batch(1, 'batch-a', 'test.xlsx', 3, subscriptions, messages)
+        linked = {msg['subscription_id']: msg['customer_name'] for msg in tmp_db.get_messages_by_batch('batch-a')}
+        assert linked == {sub_id: sub['customer_name'] for sub_id, sub in zip(ids, subscriptions)}, "Messages linked to wrong members"
+        assert all(msg['message_text'] == f"Hi {msg['customer_name']}" for msg in tmp_db.get_messages_by_batch('batch-a'))
+
+        # A failing message must roll back the whole batch
+        broken = [dict(sub, upload_batch_id='batch-b') for sub in subscriptions]
+        try:
+            tmp_db.save_upload_batch(1, 'batch-b', 'test.xlsx', 3, broken, messages[:2] + [{'cluster': 1}])
+        except KeyError:
+            pass
+        assert not tmp_db.get_subscriptions_by_batch('batch-b'), "Partial batch was committed"
+        assert tmp_db.get_latest_batch_id(1) == 'batch-a'
+
+    print("[OK] Batch ingest is atomic and links messages by ID")
+except Exception as e:
+    print(f"[FAIL] Batch ingest error: {e}")
+    import traceback
+    traceback.print_exc()
+    sys.exit(1)
+
+# Test 9: Column validation parity with per-row validators
+print("\n[TEST 9] Testing column validation parity...")
+try:
+    import random
+    import numpy as np
+    from agents.excel_processor import ExcelProcessor
+    from utils.validators import (
+        validate_customer_name,
+        validate_phone_number,
+        validate_date_format,
+        validate_date_range
+    )
+
+    def validate_rows_reference(df):
+        """Row-by-row validation with the scalar validators."""
+        errors, rows = [], []
+        columns = [df[col].tolist() for col in ['customer_name', 'phone_number', 'start_date', 'end_date']]
+        for idx, name, phone, start, end in zip(df.index, *columns):
+            row_num = idx + 2
+            is_valid, error = validate_customer_name(name)
+            if not is_valid:
+                errors.append(f"Row {row_num}: {error}")
+                continue
+            is_valid, error, formatted_phone = validate_phone_number(phone)
+            if not is_valid:
+                errors.append(f"Row {row_num}: {error}")
+                continue
+            is_valid, error, start_date = validate_date_format(start)
+            if not is_valid:
+                errors.append(f"Row {row_num}: Start date - {error}")
+                continue
+            is_valid, error, end_date = validate_date_format(end)
+            if not is_valid:
+                errors.append(f"Row {row_num}: End date - {error}")
+                continue
+            is_valid, error = validate_date_range(start_date, end_date)
+            if not is_valid:
+                errors.append(f"Row {row_num}: {error}")
+                continue
+            rows.append({
+                'customer_name': str(name).strip(),
+                'phone_number': formatted_phone,
+                'subscription_start_date': start_date.strftime('%Y-%m-%d'),
+                'subscription_end_date': end_date.strftime('%Y-%m-%d'),
+            })
+        return (pd.DataFrame(rows) if rows else pd.DataFrame()), errors
+
+    rng = random.Random(42)
+    names = ['Amit Kumar', '  Priya Sharma  ', 'A', '', None, np.nan, 0, '   ', 'Ravi', 123]
+    phones = ['9876543210', '+91 98765 43210', '(987) 654-3210', '12345', None, np.nan, '', 9876543210, 9876543210.0, 'abc']
+    dates = [
+        '01-02-2025', '1-2-2025', '01/02/2025', '2025-02-01', '2025-2-1', ' 05-06-2025 ',
+        '31-02-2025', '29-02-2024', '29-02-2023', '32-01-2025', '2025/02/01', '20250201',
+        '2025-02-01 00:00:00', '01-01-0999', '01-01-2263', '', None, np.nan, 45000,
+        pd.Timestamp('2025-02-01'), datetime(2025, 3, 1)
+    ]
+    size = 3000
+    messy_df = pd.DataFrame({
+        'customer_name': [rng.choice(names) for _ in range(size)],
+        'phone_number': [rng.choice(phones) for _ in range(size)],
+        'start_date': [rng.choice(dates) for _ in range(size)],
+        'end_date': [rng.choice(dates) for _ in range(size)],
+    })
+
+    for frame in (messy_df, messy_df.dropna().iloc[::-1]):
+        cleaned_df, errors = ExcelProcessor().validate_and_clean_data(frame)
+        expected_df, expected_errors = validate_rows_reference(frame)
+        assert errors == expected_errors, "Errors differ from per-row validators"
+        assert cleaned_df.equals(expected_df), "Cleaned rows differ from per-row validators"
+
+    print(f"[OK] Column validation matches per-row validators ({len(cleaned_df)} valid, {len(errors)} errors)")
+except Exception as e:
+    print(f"[FAIL] Column validation error: {e}")
+    import traceback
+    traceback.print_exc()
+    sys.exit(1)
+
+# Test 10: Vectorized expiry helpers match scalar helpers
+print("\n[TEST 10] Testing vectorized expiry helpers...")
+try:
+    from utils.date_helpers import (
+        get_current_date_ist,
+        calculate_days_remaining_series,
+        classify_by_expiry_series
+    )
+
+    today = get_current_date_ist().replace(tzinfo=None)
+    end_dates = pd.Series([(today + timedelta(days=d)).strftime('%Y-%m-%d') for d in range(-400, 400)])
+
+    days_series = calculate_days_remaining_series(end_dates, today)
+    clusters_series = classify_by_expiry_series(days_series)
+
+    assert days_series.tolist() == [calculate_days_remaining(d) for d in end_dates]
+    assert clusters_series.tolist() == [classify_by_expiry(d) for d in days_series]
+
+    print("[OK] Vectorized days/cluster match scalar helpers")
+except Exception as e:
+    print(f"[FAIL] Vectorized expiry error: {e}")
+    import traceback
+    traceback.print_exc()
+    sys.exit(1)
+
+# Test 11: Batch message rendering matches per-row rendering
+print("\n[TEST 11] Testing batch message rendering...")
+try:
+    from utils.date_helpers import format_date_indian
+
+    today = get_current_date_ist().replace(tzinfo=None)
+    days = list(range(-3, 31))
+    render_df = pd.DataFrame({
+        'customer_name': [["Priya Sharma", "Ravi", "Amit  Kumar Singh", "Zoë Ådams"][d % 4] for d in days],
+        'subscription_end_date': [(today + timedelta(days=d)).strftime('%Y-%m-%d') for d in days],
+        'days_remaining': days,
+        'cluster': [classify_by_expiry(d) for d in days],
+    }, index=range(100, 100 + len(days)))
+
+    render_gen = MessageGenerator("Test Gym")
+    render_gen.customize_template(3, "{{Hi}} {name} from {gym_name}, due {date}")
+    # Format specs/conversions take the row-by-row path
+    render_gen.templates[7] = "{name:>12}|{gym_name!r}: {date} {expiry_text}"
+
+    batch = render_gen.render_batch(render_df)
+    expected = [
+        render_gen.generate_message(
+            cluster=row['cluster'],
+            customer_name=row['customer_name'],
+            expiry_text=get_expiry_text(row['days_remaining']),
+            expiry_date=format_date_indian(row['subscription_end_date']),
+            days_remaining=row['days_remaining']
+        )
+        for _, row in render_df.iterrows()
+    ]
+
+    assert batch.index.equals(render_df.index)
+    assert batch.tolist() == expected, "Batch messages differ from per-row messages"
+
+    print(f"[OK] render_batch matches generate_message for {len(expected)} rows")
+except Exception as e:
+    print(f"[FAIL] Batch rendering error: {e}")
+    import traceback
+    traceback.print_exc()
+    sys.exit(1)
+
+# Test 12: Background job queue
+print("\n[TEST 12] Testing background job queue...")
+try:
+    import io
+    import time
+    import tempfile
+    from agents.subscription_agent import SubscriptionAgent
+    from database.db_manager import DatabaseManager
+    from services.job_queue import JobQueue
+    from services.export_cache import get_export_cache
+
+    def wait_for(queue, job_id, timeout=60):
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            job = queue.get_job(job_id)
+            if job['status'] not in ('queued', 'running'):
+                return job
+            time.sleep(0.05)
+        raise TimeoutError(f"Job {job_id} did not finish")
+
+    today = get_current_date_ist().replace(tzinfo=None)
+    upload_df = pd.DataFrame({
+        'Customer Name': ["Priya Sharma", "Ravi Kumar", "Amit Singh", "X"],
+        'Contact': ["9876543210", "98765 43211", "+91 9876543212", "9876543213"],
+        'Subscription Start Date': [(today - timedelta(days=30)).strftime('%d-%m-%Y')] * 4,
+        'Subscription End Date': [(today + timedelta(days=d)).strftime('%d-%m-%Y') for d in (0, 2, 20, 5)],
+    })
+    buffer = io.BytesIO()
+    upload_df.to_excel(buffer, index=False)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        tmp_db = DatabaseManager(os.path.join(tmp_dir, "test.db"))
+        upload_dir = os.path.join(tmp_dir, "uploads")
+        queue = JobQueue(db=tmp_db, max_workers=2, upload_dir=upload_dir)
+
+        job_id = queue.submit_upload(1, "Test Gym", "members.xlsx", buffer.getvalue())
+        job = wait_for(queue, job_id)
+
+        assert job['status'] == 'completed', job['error']
+        assert job['progress'] == 1
+        assert list(job['stage_timings']) == [
+            'parse_file', 'calculate_days', 'classify_clusters', 'generate_messages', 'save_to_database'
+        ], job['stage_timings']
+        result = job['result']
+        assert result['cluster_counts'] == {1: 1, 3: 1, 30: 1}, result['cluster_counts']
+        assert result['error_count'] == 1 and len(result['messages']) == 3
+        assert job['batch_id'] == result['batch_id'] == tmp_db.get_latest_batch_id(1)
+        assert tmp_db.get_upload_history(1)[0]['timings'] == job['stage_timings']
+        assert not os.listdir(upload_dir), "Upload file was not removed"
+
+        bad_id = queue.submit_upload(1, "Test Gym", "broken.xlsx", b"not a workbook")
+        assert wait_for(queue, bad_id)['status'] == 'failed'
+        queue.shutdown()
+
+        # Jobs interrupted by a restart are resumed by the next queue
+        interrupted_path = os.path.join(upload_dir, "interrupted.xlsx")
+        with open(interrupted_path, 'wb') as handle:
+            handle.write(buffer.getvalue())
+        tmp_db.create_job("interrupted", 1, "Test Gym", "members.xlsx", interrupted_path)
+        assert tmp_db.claim_job("interrupted") and not tmp_db.claim_job("interrupted")
+
+        # A job that crashed mid-stream left its first chunk in its batch
+        crashed_path = os.path.join(upload_dir, "crashed.xlsx")
+        upload_df.iloc[::-1].to_excel(crashed_path, index=False)
+        tmp_db.create_job("crashed", 1, "Test Gym", "members.xlsx", crashed_path)
+        assert tmp_db.claim_job("crashed", "crashed-batch") and tmp_db.get_job("crashed")['batch_id'] == "crashed-batch"
+        SubscriptionAgent(db=tmp_db, build_exports=False).process_stream([pd.DataFrame({
+            'customer_name': ["Partial Member"],
+            'phone_number': ["+91-9123456780"],
+            'subscription_start_date': [(today - timedelta(days=30)).strftime('%Y-%m-%d')],
+            'subscription_end_date': [today.strftime('%Y-%m-%d')],
+        })], "members.xlsx", batch_id="crashed-batch", user_id=1, gym_name="Test Gym")
+        conn = tmp_db._get_connection()
+        conn.execute("DELETE FROM upload_history WHERE batch_id = 'crashed-batch'")
+        conn.commit()
+        tmp_db._release_connection(conn)
+
+        restarted = JobQueue(db=tmp_db, max_workers=1, upload_dir=upload_dir)
+        assert wait_for(restarted, "interrupted")['status'] == 'completed'
+        crashed = wait_for(restarted, "crashed")
+        assert crashed['status'] == 'completed' and crashed['batch_id'] == "crashed-batch"
+        assert tmp_db.count_messages("crashed-batch") == crashed['result']['total_processed'] == 3
+        conn = tmp_db._get_connection()
+        partial = conn.execute("SELECT COUNT(*) FROM subscriptions WHERE customer_name = 'Partial Member'").fetchone()[0]
+        tmp_db._release_connection(conn)
+        assert partial == 0, "Rows of the interrupted run were kept"
+        assert restarted.get_active_job(1) is None
+        restarted.shutdown()
+
+        # Let the background export builds finish before the directory goes
+        get_export_cache(tmp_db).shutdown()
+
+    print("[OK] Jobs run in the background, report stage timings and resume after restart")
+except Exception as e:
+    print(f"[FAIL] Job queue error: {e}")
+    import traceback
+    traceback.print_exc()
+    sys.exit(1)
+
+# Test 13: Tracing instrumentation
+print("\n[TEST 13] Testing tracing instrumentation...")
+try:
+    import json
+    import subprocess
+    import tempfile
+    from database.db_manager import DatabaseManager
+    from utils import tracing
+
+    # Off by default: query methods are left undecorated
+    assert not tracing.ENABLED
+    assert not hasattr(DatabaseManager.get_messages_by_batch, '__wrapped__')
+
+    trace_script = """
+import io, sys
+import pandas as pd
+from database.db_manager import DatabaseManager
+from agents.excel_processor import ExcelProcessor
+from agents.subscription_agent import SubscriptionAgent
+from utils import tracing
+
+buffer = io.BytesIO()
+pd.DataFrame({
+    'Name': ['Priya Sharma', 'Ravi Kumar', 'X'],
+    'Phone': ['9876543210', '9876543211', '9876543212'],
+    'Start Date': ['01-01-2025'] * 3,
+    'End Date': ['01-01-2026'] * 3,
+}).to_excel(buffer, index=False)
+buffer.name, buffer.size = 'members.xlsx', len(buffer.getvalue())
+
+db = DatabaseManager(sys.argv[1])
+with tracing.batch_trace('traced-batch'):
+    ok, message, df, errors = ExcelProcessor().process_file(buffer, streaming=True)
+result = SubscriptionAgent(1, 'Test Gym', db=db, build_exports=False).process(df, 'members.xlsx', batch_id='traced-batch')
+assert result['success'], result
+db.get_cluster_counts('traced-batch')
+
+# tracemalloc runs only while spans are open, unless something else started it
+import threading, tracemalloc
+assert not tracemalloc.is_tracing()
+
+# Spans of a shared trace nest only within their own thread: another
+# thread's allocations are not folded into this thread's open span
+shared = tracing.Trace('threaded-batch')
+opened, done = threading.Event(), threading.Event()
+
+def outer():
+    with shared.span('outer'):
+        opened.set()
+        done.wait()
+
+def other():
+    opened.wait()
+    with shared.span('big'):
+        block = bytearray(10 * 1024 * 1024)
+    del block
+    with shared.span('small'):
+        pass
+    done.set()
+
+threads = [threading.Thread(target=outer), threading.Thread(target=other)]
+for thread in threads:
+    thread.start()
+for thread in threads:
+    thread.join()
+assert not tracemalloc.is_tracing()
+
+tracemalloc.start()
+with tracing.batch_trace('kept'):
+    with tracing.span('kept'):
+        pass
+assert tracemalloc.is_tracing()
+"""
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        env = dict(os.environ, HERCULES_TRACE="1", HERCULES_TRACE_DIR=os.path.join(tmp_dir, "traces"))
+        completed = subprocess.run(
+            [sys.executable, "-c", trace_script, os.path.join(tmp_dir, "test.db")],
+            env=env, capture_output=True, text=True
+        )
+        assert completed.returncode == 0, completed.stderr
+
+        with open(os.path.join(tmp_dir, "traces", "traced-batch.jsonl")) as handle:
+            spans = [json.loads(line) for line in handle]
+        names = [record['span'] for record in spans]
+
+        for expected in ["excel.validate_file", "excel.read_chunk", "excel.validate_chunk",
+                         "node.calculate_days", "node.save_to_database",
+                         "db.save_upload_batch", "db.update_upload_timings"]:
+            assert expected in names, f"Missing span {expected}: {names}"
+        assert all(record['batch_id'] == 'traced-batch' for record in spans)
+        assert {'wall_s', 'cpu_s', 'rows', 'peak_mem_bytes'} <= set(spans[0])
+        save_span = next(record for record in spans if record['span'] == 'db.save_upload_batch')
+        assert save_span['rows'] == 2, save_span
+
+        with open(os.path.join(tmp_dir, "traces", "threaded-batch.jsonl")) as handle:
+            threaded = {record['span']: record for record in map(json.loads, handle)}
+        assert threaded['big']['peak_mem_bytes'] >= 10 * 1024 * 1024
+        assert threaded['outer']['peak_mem_bytes'] < 1024 * 1024, threaded['outer']
+
+        # Queries outside a batch go to the shared query trace
+        with open(os.path.join(tmp_dir, "traces", "queries.jsonl")) as handle:
+            assert any(json.loads(line)['span'] == 'db.get_cluster_counts' for line in handle)
+
+        timings = DatabaseManager(os.path.join(tmp_dir, "test.db")).get_upload_history(1)[0]['timings']
+        assert list(timings) == ['calculate_days', 'classify_clusters', 'generate_messages', 'save_to_database']
+
+    print(f"[OK] Traced {len(spans)} spans for one batch; tracing is free when disabled")
+except Exception as e:
+    print(f"[FAIL] Tracing error: {e}")
+    import traceback
+    traceback.print_exc()
+    sys.exit(1)
+
+# Test 14: Synthetic benchmark data
+print("\n[TEST 14] Testing synthetic member generator...")
+try:
+    from benchmarks.synthetic import generate_members, make_upload
+    from agents.excel_processor import ExcelProcessor
+    from utils.date_helpers import calculate_days_remaining_series, classify_by_expiry_series
+
+    members = generate_members(2000, seed=3)
+    assert members.equals(generate_members(2000, seed=3)), "Generator is not deterministic"
+    assert not members.equals(generate_members(2000, seed=4))
+
+    upload = make_upload(2000, seed=3)
+    success, message, synthetic_df, synthetic_errors = ExcelProcessor().process_file(upload, streaming=True)
+    assert success, message
+    assert 0 < len(synthetic_errors) < 200, len(synthetic_errors)
+    assert len(synthetic_df) + len(synthetic_errors) == 2000
+
+    clusters = classify_by_expiry_series(calculate_days_remaining_series(synthetic_df['subscription_end_date']))
+    assert set(clusters.unique()) == {0, 1, 3, 7, 30}, "Expiries not spread across clusters"
+
+    print(f"[OK] Generated 2000 rows: {len(synthetic_errors)} invalid, all clusters present")
+except Exception as e:
+    print(f"[FAIL] Synthetic generator error: {e}")
+    import traceback
+    traceback.print_exc()
+    sys.exit(1)
+
+# Test 15: Batch read cache
+print("\n[TEST 15] Testing batch read cache...")
+try:
+    import tempfile
+    from database.db_manager import DatabaseManager
+    from database.batch_cache import BatchCache
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        tmp_db = DatabaseManager(os.path.join(tmp_dir, "test.db"))
+        subscriptions = [{
+            'user_id': 1, 'upload_batch_id': 'batch-a', 'customer_name': f"Member {i}",
+            'phone_number': f"+91-98765432{i:02d}", 'subscription_start_date': '2025-01-01',
+            'subscription_end_date': '2025-02-01', 'days_remaining': i, 'cluster': 7
+        } for i in range(5)]
+        messages = [{'message_text': f"Hi {sub['customer_name']}", 'cluster': 7} for sub in subscriptions]
+        tmp_db.save_upload_batch(1, 'batch-a', 'a.xlsx', 5, subscriptions, messages)
+
+        first = tmp_db.get_messages_by_batch('batch-a')
+        before = tmp_db.cache.stats()
+        # Another manager on the same file shares the cache
+        again = DatabaseManager(os.path.join(tmp_dir, "test.db")).get_messages_by_batch('batch-a')
+        assert again is first and tmp_db.cache.stats()['hits'] == before['hits'] + 1
+        assert tmp_db.get_latest_batch_id(1) == 'batch-a'
+
+        # Writing a batch invalidates the cached reads it affects
+        tmp_db.save_upload_batch(1, 'batch-b', 'b.xlsx', 5,
+                                 [dict(sub, upload_batch_id='batch-b') for sub in subscriptions], messages)
+        assert tmp_db.get_latest_batch_id(1) == 'batch-b'
+        assert len(tmp_db.get_upload_history(1)) == 2
+        tmp_db.delete_subscriptions_by_batch('batch-a')
+        assert tmp_db.get_cluster_counts('batch-a') == {}
+
+    # LRU eviction under the memory budget
+    lru = BatchCache(max_bytes=20000)
+    for key in range(10):
+        lru.get_or_load('messages', key, lambda: ['x' * 1000] * 5)
+    assert lru.stats()['bytes'] <= 20000 and lru.stats()['evictions'] > 0
+    lru.get_or_load('messages', 9, lambda: None)
+    assert lru.stats()['hits'] == 1, "Most recent entry was evicted"
+
+    print(f"[OK] Cache hits {tmp_db.cache.stats()['hits']}, misses {tmp_db.cache.stats()['misses']}; writes invalidate")
+except Exception as e:
+    print(f"[FAIL] Batch cache error: {e}")
+    import traceback
+    traceback.print_exc()
+    sys.exit(1)
+
+# Test 16: Paginated message browsing
+print("\n[TEST 16] Testing paginated message queries...")
+try:
+    import tempfile
+    from database.db_manager import DatabaseManager
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        tmp_db = DatabaseManager(os.path.join(tmp_dir, "test.db"))
+        names = ["Priya Sharma", "Ravi 100% Fit", "Amit_Kumar", "priyanka Rao"]
+        subscriptions = [{
+            'user_id': 1, 'upload_batch_id': 'batch-p', 'customer_name': names[i % 4],
+            'phone_number': f"+91-98765{i:05d}", 'subscription_start_date': '2025-01-01',
+            'subscription_end_date': '2025-02-01', 'days_remaining': i % 9,
+            'cluster': [1, 3, 7, 30][i % 4]
+        } for i in range(103)]
+        messages = [{'message_text': f"Msg {i}", 'cluster': sub['cluster']} for i, sub in enumerate(subscriptions)]
+        tmp_db.save_upload_batch(1, 'batch-p', 'p.xlsx', 103, subscriptions, messages)
+
+        def walk(**filters):
+            rows, cursor = [], None
+            while True:
+                page = tmp_db.get_message_page('batch-p', after=cursor, page_size=10, **filters)
+                assert len(page['messages']) <= 10
+                rows.extend(page['messages'])
+                cursor = page['next_cursor']
+                if cursor is None:
+                    return rows, page['total']
+
+        rows, total = walk()
+        assert total == len(rows) == 103
+        keys = [(r['cluster'], r['days_remaining'], r['subscription_id']) for r in rows]
+        assert keys == sorted(keys) and len(set(keys)) == 103, "Pages overlap or are out of order"
+        assert set(rows[0]) == {'subscription_id', 'customer_name', 'phone_number',
+                                'subscription_end_date', 'days_remaining', 'cluster', 'message_text'}
+
+        rows, total = walk(cluster=7)
+        assert total == len(rows) == 26 and all(r['cluster'] == 7 for r in rows)
+
+        # Case-insensitive name search, LIKE wildcards taken literally, phone by digits
+        assert walk(search="PRIYA")[1] == 26 + 25
+        assert walk(search="% Fit")[1] == 26
+        assert walk(search="_")[1] == 26
+        assert [r['phone_number'] for r in walk(search="98765 00042")[0]] == ["+91-9876500042"]
+
+    print("[OK] Keyset pages cover the batch once, in order, with filters and counts")
+except Exception as e:
+    print(f"[FAIL] Pagination error: {e}")
+    import traceback
+    traceback.print_exc()
+    sys.exit(1)
+
+# Test 17: Query plans of hot queries
+print("\n[TEST 17] Testing query plans...")
+try:
+    import tempfile
+    from database.db_manager import DatabaseManager
+    from database.models import SCHEMA_VERSION
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        tmp_db = DatabaseManager(os.path.join(tmp_dir, "test.db"))
+        subscription = {
+            'user_id': 1, 'upload_batch_id': 'batch-q', 'customer_name': "Priya Sharma",
+            'phone_number': "+91-9876543210", 'subscription_start_date': '2025-01-01',
+            'subscription_end_date': '2025-02-01', 'days_remaining': 3, 'cluster': 3
+        }
+        tmp_db.save_upload_batch(1, 'batch-q', 'q.xlsx', 1, [subscription], [{'message_text': "Hi", 'cluster': 3}])
+        tmp_db.cache.invalidate()
+
+        # Capture the SQL each hot read actually runs on this thread's connection
+        conn = tmp_db.pool.acquire()
+        assert conn.execute("PRAGMA user_version").fetchone()[0] == SCHEMA_VERSION
+        statements = []
+        conn.set_trace_callback(statements.append)
+        try:
+            tmp_db.get_messages_by_batch('batch-q')
+            tmp_db.get_subscriptions_by_batch('batch-q')
+            tmp_db.get_subscriptions_by_cluster('batch-q', 3)
+            tmp_db.get_cluster_counts('batch-q')
+            tmp_db.get_upload_history(1)
+            tmp_db.get_latest_batch_id(1)
+            tmp_db.get_message_page('batch-q', after=(1, 0, 0))
+            tmp_db.get_message_page('batch-q', cluster=3, after=(3, 0, 0))
+            tmp_db.count_messages('batch-q', search="Priya 98765")
+            tmp_db.get_jobs_by_user(1)
+            tmp_db.requeue_unfinished_jobs()
+        finally:
+            conn.set_trace_callback(None)
+
+        selects = [sql for sql in statements if sql.lstrip().upper().startswith("SELECT")]
+        assert len(selects) >= 11, selects
+        for sql in selects:
+            plan = [row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + sql)]
+            for step in plan:
+                assert not step.startswith("SCAN"), f"Full scan: {step}\n{sql}"
+                assert "TEMP B-TREE" not in step, f"Temp sort: {step}\n{sql}"
+        tmp_db.pool.release(conn)
+
+    print(f"[OK] {len(selects)} hot queries use indexes without full scans or temp sorts")
+except Exception as e:
+    print(f"[FAIL] Query plan error: {e}")
+    import traceback
+    traceback.print_exc()
+    sys.exit(1)
+
 # Summary
+# Test 18: Streaming CSV export
+print("\n[TEST 18] Testing streaming CSV export...")
+try:
+    import tempfile
+    import pandas as pd
+    from database.db_manager import DatabaseManager
+    from services.export_service import ALL_MESSAGES, CsvExporter
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        tmp_db = DatabaseManager(os.path.join(tmp_dir, "test.db"))
+        subscriptions = [{
+            'user_id': 1, 'upload_batch_id': 'batch-csv', 'customer_name': f"Member {i}",
+            'phone_number': f"+91-98765{i:05d}", 'subscription_start_date': '2025-01-01',
+            'subscription_end_date': '2025-02-01', 'days_remaining': i % 5,
+            'cluster': [1, 3, 7][i % 3]
+        } for i in range(23)]
+        messages = [{'message_text': f'Hi "Member {i}",\nrenew, today!', 'cluster': sub['cluster']}
+                    for i, sub in enumerate(subscriptions)]
+        tmp_db.save_upload_batch(1, 'batch-csv', 'c.xlsx', 23, subscriptions, messages)
+
+        # Small chunks so clusters span chunk boundaries
+        paths = CsvExporter(tmp_db, chunk_size=4).write('batch-csv', os.path.join(tmp_dir, "out"))
+        assert set(paths) == {ALL_MESSAGES, 1, 3, 7}, "Empty clusters get no file"
+
+        # Same bytes as the DataFrame.to_csv export it replaces
+        expected = pd.DataFrame([{
+            'Customer Name': m['customer_name'], 'Phone Number': m['phone_number'],
+            'Expiry Date': m['subscription_end_date'], 'Days Remaining': m['days_remaining'],
+            'Cluster': f"{m['cluster']}-day", 'Message': m['message_text']
+        } for m in tmp_db.get_messages_by_batch('batch-csv')])
+
+        with open(paths[ALL_MESSAGES], 'rb') as handle:
+            assert handle.read() == expected.to_csv(index=False).encode('utf-8')
+
+        for cluster in (1, 3, 7):
+            cluster_df = expected[expected['Cluster'] == f"{cluster}-day"].drop(columns=['Cluster'])
+            with open(paths[cluster], 'rb') as handle:
+                assert handle.read() == cluster_df.to_csv(index=False).encode('utf-8'), cluster
+
+    print("[OK] One pass writes the full and per-cluster CSVs, matching pandas output")
+except Exception as e:
+    print(f"[FAIL] CSV export error: {e}")
+    import traceback
+    traceback.print_exc()
+    sys.exit(1)
+
+# Test 19: Excel export
+print("\n[TEST 19] Testing Excel export...")
+try:
+    from io import BytesIO
+    from openpyxl import load_workbook
+    from services.export_service import CLUSTER_FILLS, EXPORT_COLUMNS, ExcelExporter
+
+    messages = [{
+        'id': i, 'subscription_id': i, 'customer_name': f"Member {i}",
+        'phone_number': f"+91-98765{i:05d}", 'subscription_end_date': '2025-02-01',
+        'days_remaining': i, 'cluster': [1, 3, 7, 30][i % 4],
+        'message_text': "Renew today! " * (i + 1)
+    } for i in range(8)]
+
+    workbook = load_workbook(BytesIO(ExcelExporter(messages).to_excel()))
+    sheet = workbook['Messages']
+    rows = list(sheet.iter_rows(values_only=True))
+
+    assert list(rows[0]) == EXPORT_COLUMNS and sheet['A1'].font.b
+    assert rows[1] == ('Member 0', '+91-9876500000', '2025-02-01', 0, '1-day', "Renew today! ")
+    assert len(rows) == 9
+
+    # Fills come from the shared named styles, one per cluster
+    assert {f"cluster_{c}" for c in CLUSTER_FILLS} <= set(workbook.named_styles)
+    for row_idx, message in enumerate(messages, 2):
+        cell = sheet.cell(row=row_idx, column=5)
+        assert cell.style == f"cluster_{message['cluster']}"
+        assert cell.fill.fgColor.rgb.endswith(CLUSTER_FILLS[message['cluster']])
+
+    # Widths fit the longest value or header, capped at 50
+    widths = [sheet.column_dimensions[letter].width for letter in "ABCDEF"]
+    assert widths == [len("Customer Name") + 2, len("+91-9876500000") + 2, len("Expiry Date") + 2,
+                      len("Days Remaining") + 2, len("Cluster") + 2, 50], widths
+
+    print("[OK] Write-only workbook with fitted widths and cluster fills")
+except Exception as e:
+    print(f"[FAIL] Excel export error: {e}")
+    import traceback
+    traceback.print_exc()
+    sys.exit(1)
+
+# Test 20: Export artifact cache
+print("\n[TEST 20] Testing export artifact cache...")
+try:
+    import hashlib
+    import tempfile
+    import zipfile
+    import pandas as pd
+    from agents.subscription_agent import SubscriptionAgent
+    from database.db_manager import DatabaseManager
+    from io import BytesIO
+    from openpyxl import load_workbook
+    from services.export_cache import ExportCache, get_export_cache
+    from services.export_service import BatchExcelExporter, ExcelExporter
+
+    today = datetime.now()
+    members = pd.DataFrame({
+        'customer_name': ['Priya Sharma', 'Ravi Kumar', 'Anjali Nair'],
+        'phone_number': ['+91-9876543210', '+91-9876543211', '+91-9876543212'],
+        'subscription_start_date': [(today - timedelta(days=30)).strftime('%Y-%m-%d')] * 3,
+        'subscription_end_date': [(today + timedelta(days=d)).strftime('%Y-%m-%d') for d in (1, 3, 20)],
+    })
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        tmp_db = DatabaseManager(os.path.join(tmp_dir, "test.db"))
+        cache = get_export_cache(tmp_db)
+        assert cache.cache_dir == os.path.join(tmp_dir, "exports")
+
+        # Processing a batch queues its exports
+        batch_id = SubscriptionAgent(1, "Test Gym", db=tmp_db).process(members, "m.xlsx")['batch_id']
+        cache.submit(batch_id).result()
+        artifacts = cache.get(batch_id)
+        assert set(artifacts) == {'csv', 'xlsx', 'zip', 'cluster_1', 'cluster_3', 'cluster_30'}, set(artifacts)
+
+        # Content-addressed: each file is stored under its SHA-256
+        for artifact in artifacts.values():
+            with open(artifact['path'], 'rb') as handle:
+                assert os.path.basename(artifact['path']) == hashlib.sha256(handle.read()).hexdigest()
+
+        with zipfile.ZipFile(artifacts['zip']['path']) as archive:
+            assert sorted(archive.namelist()) == sorted(
+                a['file_name'] for name, a in artifacts.items() if name != 'zip'
+            )
+            assert archive.read(artifacts['csv']['file_name']) == open(artifacts['csv']['path'], 'rb').read()
+
+        # The workbook is built page by page, without filling the batch cache
+        assert ('messages', batch_id) not in tmp_db.cache._entries
+        paged = BatchExcelExporter(tmp_db, batch_id, page_size=2)
+        assert [len(page) for page in paged.pages()] == [2, 1]
+        expected = load_workbook(BytesIO(ExcelExporter(tmp_db.get_messages_by_batch(batch_id)).to_excel()))
+        stored = open(artifacts['xlsx']['path'], 'rb').read()
+        for built in (load_workbook(BytesIO(stored)), load_workbook(BytesIO(paged.to_excel()))):
+            assert list(built['Messages'].values) == list(expected['Messages'].values)
+            assert [built['Messages'].column_dimensions[c].width for c in "ABCDEF"] == \
+                [expected['Messages'].column_dimensions[c].width for c in "ABCDEF"]
+
+        # Missing files are rebuilt
+        os.remove(artifacts['xlsx']['path'])
+        assert cache.get(batch_id) is None
+        rebuilt = cache.ensure(batch_id)
+        # Workbooks record when they were saved, so only the CSVs keep their hash
+        assert {name: a['file_name'] for name, a in rebuilt.items()} == \
+            {name: a['file_name'] for name, a in artifacts.items()}
+        assert rebuilt['csv'] == artifacts['csv'] and os.path.exists(rebuilt['xlsx']['path'])
+
+        # Over the size limit, the least recently used batch is dropped
+        small = ExportCache(tmp_db, cache_dir=os.path.join(tmp_dir, "small"), max_bytes=1)
+        other_id = SubscriptionAgent(1, "Other Gym", db=tmp_db, build_exports=False).process(members, "o.xlsx")['batch_id']
+        small.ensure(batch_id)
+        small.ensure(other_id)
+        assert small.get(batch_id) is None and small.get(other_id) is not None
+        referenced = {a['path'] for a in small.get(other_id).values()}
+        assert {os.path.join(small.objects_dir, f) for f in os.listdir(small.objects_dir)} == referenced
+
+        small.shutdown()
+        cache.shutdown()
+
+    print("[OK] Exports are built once per batch, stored by hash, rebuilt and evicted")
+except Exception as e:
+    print(f"[FAIL] Export cache error: {e}")
+    import traceback
+    traceback.print_exc()
+    sys.exit(1)
+
+# Test 21: Schema bootstrap and lazy imports
+print("\n[TEST 21] Testing schema bootstrap and lazy imports...")
+try:
+    import sqlite3
+    import subprocess
+    import tempfile
+    from database import db_manager
+    from database.db_manager import DatabaseManager
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, "db", "test.db")
+        calls = []
+        create_tables = DatabaseManager._create_tables
+        DatabaseManager._create_tables = lambda self: calls.append(self.db_path) or create_tables(self)
+        try:
+            DatabaseManager(path)
+            DatabaseManager(path)
+            assert calls == [path], "Schema set up more than once per process"
+
+            # A database already at SCHEMA_VERSION skips the DDL entirely
+            raw = sqlite3.connect(path)
+            raw.execute("DROP INDEX idx_jobs_status_created")
+            raw.commit()
+            db_manager._schema_ready.discard(os.path.abspath(path))
+            DatabaseManager(path)
+            assert len(calls) == 2
+            assert not raw.execute(
+                "SELECT 1 FROM sqlite_master WHERE name = 'idx_jobs_status_created'"
+            ).fetchall(), "Migrations ran on a current database"
+            raw.close()
+        finally:
+            DatabaseManager._create_tables = create_tables
+
+    # Polling jobs and serving exports must not pull in the processing stack
+    completed = subprocess.run([sys.executable, "-c", """
+import sys
+import services.auth_service, services.job_queue, services.export_cache, services.cluster_refresh
+heavy = [name for name in ('langgraph', 'openpyxl') if name in sys.modules]
+assert not heavy, heavy
+"""], capture_output=True, text=True, timeout=120)
+    assert completed.returncode == 0, completed.stderr
+
+    print("[OK] Schema is created once per process; langgraph/openpyxl load lazily")
+except Exception as e:
+    print(f"[FAIL] Bootstrap error: {e}")
+    import traceback
+    traceback.print_exc()
+    sys.exit(1)
+
+# Test 22: Shared workflow and pooled agents
+print("\n[TEST 22] Testing shared workflow and pooled agents...")
+try:
+    import tempfile
+    from concurrent.futures import ThreadPoolExecutor
+    import pandas as pd
+    from agents.subscription_agent import SubscriptionAgent, get_agent, get_workflow
+    from database.db_manager import DatabaseManager
+
+    members = pd.DataFrame({
+        'customer_name': ['Priya Sharma', 'Ravi Kumar'],
+        'phone_number': ['+91-9876543210', '+91-9876543211'],
+        'subscription_start_date': [(datetime.now() - timedelta(days=30)).strftime('%Y-%m-%d')] * 2,
+        'subscription_end_date': [(datetime.now() + timedelta(days=d)).strftime('%Y-%m-%d') for d in (1, 5)],
+    })
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        tmp_db = DatabaseManager(os.path.join(tmp_dir, "test.db"))
+        agent = get_agent(tmp_db, build_exports=False)
+
+        assert agent is get_agent(DatabaseManager(tmp_db.db_path), build_exports=False)
+        assert agent.workflow is get_workflow()
+        assert SubscriptionAgent(1, "Gym", db=tmp_db, build_exports=False).workflow is get_workflow()
+
+        # One agent, several gyms at once; tenant values travel with the call
+        def upload(user_id):
+            return agent.process(members, f"{user_id}.xlsx", user_id=user_id, gym_name=f"Gym {user_id}")
+
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            results = list(pool.map(upload, range(1, 9)))
+
+        for user_id, result in enumerate(results, 1):
+            assert result['success'], result.get('error')
+            assert all(f"this is Gym {user_id}." in m['message'] for m in result['messages'])
+            assert tmp_db.get_latest_batch_id(user_id) == result['batch_id']
+
+        custom = {cluster: "Hey {name}, {gym_name} misses you" for cluster in (1, 3, 7, 30)}
+        result = agent.process(members, "c.xlsx", user_id=9, gym_name="Custom Gym", templates=custom)
+        assert [m['message'] for m in result['messages']] == ["Hey Priya, Custom Gym misses you",
+                                                              "Hey Ravi, Custom Gym misses you"]
+
+        try:
+            agent.process(members, "x.xlsx")
+            raise AssertionError("Pooled agent accepted an upload without a gym")
+        except ValueError:
+            pass
+
+    print("[OK] Workflow compiled once; one pooled agent serves concurrent gyms")
+except Exception as e:
+    print(f"[FAIL] Agent pooling error: {e}")
+    import traceback
+    traceback.print_exc()
+    sys.exit(1)
+
+# Test 23: Streaming execution mode
+print("\n[TEST 23] Testing chunked streaming mode...")
+try:
+    import tempfile
+    import pandas as pd
+    from agents.subscription_agent import STREAM_PREFETCH_CHUNKS, SubscriptionAgent
+    from database.db_manager import DatabaseManager
+
+    today = get_current_date_ist().replace(tzinfo=None)
+    offsets = [0, 1, 2, 3, 5, 7, 10, 20, 30, 31, 45, -3, 4, 6, 14, 29, 60, 2, 1, 8, 25, 3, 0]
+    members = pd.DataFrame({
+        'customer_name': [f"Member {i}" for i in range(len(offsets))],
+        'phone_number': [f"+91-98765{i:05d}" for i in range(len(offsets))],
+        'subscription_start_date': [(today - timedelta(days=30)).strftime('%Y-%m-%d')] * len(offsets),
+        'subscription_end_date': [(today + timedelta(days=d)).strftime('%Y-%m-%d') for d in offsets],
+    })
+
+    def rows_of(db, batch_id):
+        return [
+            {key: row[key] for key in ('customer_name', 'days_remaining', 'cluster', 'message_text')}
+            for row in db.get_messages_by_batch(batch_id)
+        ]
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        tmp_db = DatabaseManager(os.path.join(tmp_dir, "test.db"))
+        agent = SubscriptionAgent(db=tmp_db, build_exports=False)
+
+        whole = agent.process(members, "m.xlsx", user_id=1, gym_name="Test Gym")
+
+        # Rows are committed chunk by chunk, before the batch is in history
+        batch_id = "stream-batch"
+        saved = []
+
+        def report(rows_saved, timings):
+            saved.append((rows_saved, tmp_db.count_messages(batch_id), tmp_db.get_latest_batch_id(2)))
+
+        chunks = (members.iloc[start:start + 5] for start in range(0, len(members), 5))
+        streamed = agent.process_stream(chunks, "m.xlsx", progress_callback=report, batch_id=batch_id,
+                                        user_id=2, gym_name="Test Gym", preview_size=4)
+
+        assert streamed['success'], streamed.get('error')
+        assert [rows for rows, _, _ in saved] == [5, 10, 15, 20, 23]
+        assert saved[0][1] > 0 and all(latest is None for _, _, latest in saved)
+
+        assert streamed['total_processed'] == whole['total_processed']
+        assert streamed['cluster_counts'] == whole['cluster_counts']
+        assert streamed['messages'] == list(whole['messages'][:4])
+        assert set(streamed['stage_timings']) == {'parse_file'} | set(whole['stage_timings'])
+        assert rows_of(tmp_db, batch_id) == rows_of(tmp_db, whole['batch_id'])
+
+        history = {h['batch_id']: h for h in tmp_db.get_upload_history(1) + tmp_db.get_upload_history(2)}
+        for key in ('filename', 'total_rows', 'processed_rows'):
+            assert history[batch_id][key] == history[whole['batch_id']][key], key
+
+        # Reading stays at most a few chunks ahead of processing
+        produced = []
+
+        def counted_chunks():
+            for start in range(0, len(members), 2):
+                produced.append(start)
+                yield members.iloc[start:start + 2]
+
+        def check_lag(rows_saved, timings):
+            assert len(produced) - rows_saved // 2 <= STREAM_PREFETCH_CHUNKS + 1
+
+        assert agent.process_stream(counted_chunks(), "m.xlsx", progress_callback=check_lag,
+                                    user_id=3, gym_name="Test Gym")['success']
+
+        # A failure part-way leaves neither rows nor history behind
+        def failing_chunks():
+            yield members.iloc[:10]
+            raise ValueError("corrupt sheet")
+
+        failed = agent.process_stream(failing_chunks(), "bad.xlsx", batch_id="failed-batch",
+                                      user_id=4, gym_name="Test Gym")
+        assert not failed['success'] and failed['error'] == "corrupt sheet"
+        assert tmp_db.count_messages("failed-batch") == 0 and not tmp_db.get_upload_history(4)
+
+        empty = agent.process_stream(iter([members.iloc[:0]]), "e.xlsx", user_id=5, gym_name="Test Gym")
+        assert not empty['success'] and not tmp_db.get_upload_history(5)
+
+    print("[OK] Streaming commits chunks as it goes and matches whole-file processing")
+except Exception as e:
+    print(f"[FAIL] Streaming mode error: {e}")
+    import traceback
+    traceback.print_exc()
+    sys.exit(1)
+
+# Test 24: Per-tenant sharding
+print("\n[TEST 24] Testing per-tenant database shards...")
+try:
+    import sqlite3
+    import tempfile
+    import time
+    import pandas as pd
+    from agents.subscription_agent import SubscriptionAgent
+    from database.db_manager import DatabaseManager
+    from database.migrate_shards import migrate
+    from database.sharding import shard_path
+
+    members = pd.DataFrame({
+        'customer_name': ['Priya Sharma', 'Ravi Kumar', 'Amit Singh'],
+        'phone_number': ['+91-9876543210', '+91-9876543211', '+91-9876543212'],
+        'subscription_start_date': [(datetime.now() - timedelta(days=30)).strftime('%Y-%m-%d')] * 3,
+        'subscription_end_date': [(datetime.now() + timedelta(days=d)).strftime('%Y-%m-%d') for d in (1, 5, 20)],
+    })
+
+    def snapshot(db, user_id):
+        batch_id = db.get_latest_batch_id(user_id)
+        history = [{key: h[key] for key in ('batch_id', 'filename', 'total_rows', 'processed_rows')}
+                   for h in db.get_upload_history(user_id)]
+        page = db.get_message_page(batch_id)
+        return batch_id, history, db.get_cluster_counts(batch_id), [m['message_text'] for m in page['messages']]
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_path = os.path.join(tmp_dir, "gym.db")
+        shard_dir = os.path.join(tmp_dir, "tenants")
+
+        # A single-file database with two gyms, split by the migration tool
+        single = DatabaseManager(db_path, sharded=False)
+        alice = single.create_user("alice@example.com", "x", "Alice Gym")
+        bob = single.create_user("bob@example.com", "x", "Bob Gym")
+        agent = SubscriptionAgent(db=single, build_exports=False)
+        for user_id, gym in ((alice, "Alice Gym"), (bob, "Bob Gym")):
+            assert agent.process(members, f"{gym}.xlsx", user_id=user_id, gym_name=gym)['success']
+        before = {user_id: snapshot(single, user_id) for user_id in (alice, bob)}
+
+        copied = migrate(db_path, shard_dir)
+        assert set(copied) == {alice, bob} and copied[alice]['messages'] == 3
+        assert migrate(db_path, shard_dir)  == {}, "Second run found rows left in the shared file"
+
+        with sqlite3.connect(db_path) as shared:
+            assert shared.execute("SELECT COUNT(*) FROM subscriptions").fetchone()[0] == 0
+            assert shared.execute("SELECT COUNT(*) FROM users").fetchone()[0] == 2
+
+        # Reads route to each gym's shard and see the same data as before
+        sharded = DatabaseManager(db_path, sharded=True, shard_dir=shard_dir, max_open_shards=1)
+        for user_id in (alice, bob):
+            assert snapshot(sharded, user_id) == before[user_id]
+        assert sharded.get_user_by_email("bob@example.com")['id'] == bob
+        assert sharded.get_message_page("no-such-batch")['messages'] == []
+        assert sharded.shards.stats()['evictions'] >= 1 and len(sharded.shards.stats()['open']) == 1
+
+        # New uploads (including streamed ones) land in the uploader's shard only
+        agent = SubscriptionAgent(db=sharded, build_exports=False)
+        result = agent.process(members, "new.xlsx", user_id=alice, gym_name="Alice Gym")
+        streamed = agent.process_stream(iter([members.iloc[:2], members.iloc[2:]]), "s.xlsx",
+                                        user_id=bob, gym_name="Bob Gym")
+        assert result['success'] and streamed['success'], (result, streamed)
+        assert sharded.get_latest_batch_id(alice) == result['batch_id']
+        assert sharded.count_messages(streamed['batch_id']) == 3
+        with sqlite3.connect(shard_path(shard_dir, bob)) as bob_shard:
+            assert bob_shard.execute("SELECT COUNT(DISTINCT upload_batch_id) FROM subscriptions").fetchone()[0] == 2
+            assert bob_shard.execute(
+                "SELECT COUNT(*) FROM subscriptions WHERE upload_batch_id = ?", (result['batch_id'],)
+            ).fetchone()[0] == 0
+
+        # A long write on one gym's shard does not hold up another gym
+        blocker = sqlite3.connect(shard_path(shard_dir, alice))
+        blocker.execute("BEGIN IMMEDIATE")
+        start = time.perf_counter()
+        assert agent.process(members, "b.xlsx", user_id=bob, gym_name="Bob Gym")['success']
+        assert time.perf_counter() - start < 2, "Bob waited for Alice's write lock"
+        blocker.rollback()
+        blocker.close()
+
+        try:
+            sharded.save_batch_chunk(alice, streamed['batch_id'], [], [])
+            raise AssertionError("Saved into another gym's batch")
+        except ValueError:
+            pass
+
+    print("[OK] Tenants live in their own files; routing, migration and LRU cap work")
+except Exception as e:
+    print(f"[FAIL] Sharding error: {e}")
+    import traceback
+    traceback.print_exc()
+    sys.exit(1)
+
+# Test 25: Daily re-clustering
+print("\n[TEST 25] Testing daily cluster refresh...")
+try:
+    import tempfile
+    import threading
+    import pandas as pd
+    from agents.subscription_agent import SubscriptionAgent
+    from database.db_manager import DatabaseManager
+    from services.cluster_refresh import ClusterRefresher, changed_end_date_ranges, seconds_until_next_refresh
+    from services.export_cache import ExportCache
+    from services.message_generator import MessageGenerator
+    from utils.date_helpers import IST, calculate_days_remaining_series, classify_by_expiry_series
+
+    today = get_current_date_ist().replace(tzinfo=None)
+    offsets = [-5, -1, 0, 1, 2, 3, 4, 5, 7, 8, 9, 20, 30, 31, 32, 33, 45, 60]
+    members = pd.DataFrame({
+        'customer_name': [f"Member {i}" for i in range(len(offsets))],
+        'phone_number': [f"+91-98765{i:05d}" for i in range(len(offsets))],
+        'subscription_start_date': [(today - timedelta(days=30)).strftime('%Y-%m-%d')] * len(offsets),
+        'subscription_end_date': [(today + timedelta(days=d)).strftime('%Y-%m-%d') for d in offsets],
+    })
+
+    def expected_rows(day, templates=None):
+        frame = members.copy()
+        frame['days_remaining'] = calculate_days_remaining_series(frame['subscription_end_date'], day)
+        frame['cluster'] = classify_by_expiry_series(frame['days_remaining'])
+        frame = frame[frame['cluster'] > 0]
+        frame['message_text'] = MessageGenerator("Test Gym", templates=templates).render_batch(frame)
+        return sorted(
+            (row.customer_name, row.days_remaining, row.cluster, row.message_text)
+            for row in frame.itertuples()
+        )
+
+    def stored_rows(db, batch_id):
+        return sorted(
+            (row['customer_name'], row['days_remaining'], row['cluster'], row['message_text'])
+            for row in db.get_messages_by_batch(batch_id)
+        )
+
+    # Ranges cover exactly the members crossing a threshold
+    as_of, day = datetime(2024, 3, 1), datetime(2024, 3, 2)
+    assert changed_end_date_ranges(as_of, day) == [
+        ('2024-03-01', '2024-03-03'), ('2024-03-05', '2024-03-05'),
+        ('2024-03-09', '2024-03-09'), ('2024-04-01', '2024-04-01'),
+    ]
+    assert changed_end_date_ranges(as_of, datetime(2024, 3, 10))[0] == ('2024-03-01', '2024-03-17')
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        tmp_db = DatabaseManager(os.path.join(tmp_dir, "test.db"))
+        user_id = tmp_db.create_user("refresh@test.com", "x", "Test Gym")
+        result = SubscriptionAgent(db=tmp_db, build_exports=False).process(
+            members, "m.xlsx", user_id=user_id, gym_name="Test Gym"
+        )
+        batch_id = result['batch_id']
+
+        # Members beyond 30 days are stored but not listed
+        assert stored_rows(tmp_db, batch_id) == expected_rows(today)
+        assert tmp_db.count_messages(batch_id) == result['total_processed'] == len(expected_rows(today))
+        assert sum(tmp_db.get_cluster_counts(batch_id).values()) == result['total_processed']
+        assert tmp_db.get_upload_history(user_id)[0]['processed_rows'] == result['total_processed']
+        assert len(tmp_db.get_subscriptions_by_cluster(batch_id, 0)) == 5
+
+        conn = tmp_db._get_connection()
+        plan = " ".join(row[3] for row in conn.execute(
+            """EXPLAIN QUERY PLAN SELECT id FROM subscriptions
+            WHERE upload_batch_id = ? AND subscription_end_date BETWEEN ? AND ?""", ("b", "x", "y")
+        ))
+        tmp_db._release_connection(conn)
+        assert "idx_subscriptions_batch_end" in plan, plan
+
+        cache = ExportCache(tmp_db, cache_dir=os.path.join(tmp_dir, "exports"))
+        cache.ensure(batch_id)
+        refresher = ClusterRefresher(tmp_db, build_exports=False)
+
+        # Each day only the members crossing a threshold are re-worded
+        for days, changed in ((1, 6), (3, 8)):
+            day = today + timedelta(days=days)
+            results = refresher.refresh_all(day)
+            assert [r['changed'] for r in results] == [changed] and results[0]['applied'], results
+            assert tmp_db.get_batch_as_of(batch_id) == day
+            assert stored_rows(tmp_db, batch_id) == expected_rows(day)
+
+        # Refreshing the same day again writes nothing; a stale as_of is refused
+        assert not refresher.refresh_batch(batch_id, "Test Gym", day)['applied']
+        assert not tmp_db.apply_day_shift(batch_id, today, 1, [])
+        assert stored_rows(tmp_db, batch_id) == expected_rows(day)
+
+        # A gym's own templates word refreshed messages like freshly generated ones
+        custom = {1: "{name}: {expiry_text} at {gym_name}", 3: "{name:>10} ends {date}",
+                  7: "{name} ends {date}", 30: "{gym_name} misses {name}"}
+        custom_batch = SubscriptionAgent(db=tmp_db, build_exports=False, templates=custom).process(
+            members, "m.xlsx", user_id=user_id + 1, gym_name="Test Gym"
+        )['batch_id']
+        assert stored_rows(tmp_db, custom_batch) == expected_rows(today, custom)
+        ClusterRefresher(tmp_db, build_exports=False, templates=custom).refresh_batch(custom_batch, "Test Gym", day)
+        assert stored_rows(tmp_db, custom_batch) == expected_rows(day, custom)
+
+        # So does the refresh a delta upload gives the live batch first
+        custom_agent = SubscriptionAgent(db=tmp_db, build_exports=False, templates=custom)
+        live_batch = custom_agent.process(
+            members, "m.xlsx", user_id=user_id + 2, gym_name="Test Gym", delta=True
+        )['batch_id']
+        assert tmp_db.apply_day_shift(live_batch, today, -3, [])
+        assert tmp_db.get_batch_as_of(live_batch) == today - timedelta(days=3)
+        again = custom_agent.process(members, "m.xlsx", user_id=user_id + 2, gym_name="Test Gym", delta=True)
+        assert again['delta']['unchanged'] == len(members)
+        assert stored_rows(tmp_db, live_batch) == expected_rows(today, custom)
+
+        # Invalidating during a build: the older build records nothing, a new one follows
+        gate = threading.Event()
+        cache.executor.submit(gate.wait)
+        stale = cache.submit(batch_id)
+        fresh = cache.invalidate(batch_id)
+        assert fresh is not stale and cache.submit(batch_id) is fresh and cache.get(batch_id) is None
+        gate.set()
+        fresh.result()
+        manifest = open(cache._manifest_path(batch_id)).read()
+        objects = sorted(os.listdir(cache.objects_dir))
+        refresher.refresh_all(day + timedelta(days=1))
+        cache._build(batch_id, generation=0)
+        assert open(cache._manifest_path(batch_id)).read() == manifest
+        assert sorted(os.listdir(cache.objects_dir)) == objects
+
+        # Cached exports of a refreshed batch are dropped
+        assert cache.discard(batch_id) and cache.get(batch_id) is None
+        assert not os.listdir(cache.objects_dir) and not cache.discard(batch_id)
+        cache.shutdown()
+
+    # The scheduler wakes just after IST midnight
+    assert seconds_until_next_refresh(datetime(2024, 3, 1, 23, 59, tzinfo=IST)) == 60 + 60
+
+    print("[OK] Daily refresh ages batches and re-words only the members that changed")
+except Exception as e:
+    print(f"[FAIL] Cluster refresh error: {e}")
+    import traceback
+    traceback.print_exc()
+    sys.exit(1)
+
+# Test 26: Delta uploads keyed by phone number
+print("\n[TEST 26] Testing delta uploads...")
+try:
+    import tempfile
+    import threading
+    import pandas as pd
+    from agents.subscription_agent import SubscriptionAgent
+    from database.db_manager import DatabaseManager
+    from services.export_cache import get_export_cache
+
+    today = get_current_date_ist().replace(tzinfo=None)
+
+    def members_frame(rows):
+        return pd.DataFrame([
+            {
+                'customer_name': name,
+                'phone_number': f"+91-{phone}",
+                'subscription_start_date': (today - timedelta(days=30)).strftime('%Y-%m-%d'),
+                'subscription_end_date': (today + timedelta(days=offset)).strftime('%Y-%m-%d'),
+            }
+            for name, phone, offset in rows
+        ])
+
+    week_one = [(f"Member {i}", f"98765{i:05d}", offset)
+                for i, offset in enumerate([0, 1, 2, 4, 8, 20, 31, 45, -2, 6])]
+    # Member 0 renewed, Member 6 comes into the 30-day window, Member 3 left,
+    # Member 9 changed name, one new member, and Member 1's phone listed
+    # twice (the last row wins)
+    week_two = [row for row in week_one if row[0] != "Member 3"]
+    week_two[0] = ("Member 0", week_two[0][1], 25)
+    week_two[5] = ("Member 6", week_two[5][1], 3)
+    week_two[-1] = ("Member Nine", week_two[-1][1], 6)
+    week_two += [("New Member", "9123456789", 1), ("Member 1 again", week_one[1][1], 1)]
+
+    def listed(db, batch_id):
+        return sorted(
+            (row['customer_name'], row['phone_number'], row['days_remaining'], row['cluster'], row['message_text'])
+            for row in db.get_messages_by_batch(batch_id)
+        )
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        tmp_db = DatabaseManager(os.path.join(tmp_dir, "test.db"))
+        agent = SubscriptionAgent(db=tmp_db, build_exports=False)
+
+        first = agent.process(members_frame(week_one), "w1.xlsx", user_id=1, gym_name="Test Gym", delta=True)
+        assert first['success'], first.get('error')
+        assert first['batch_id'] == first['delta_batch_id']
+        assert first['delta'] == {'insert': 10, 'update': 0, 'remove': 0, 'unchanged': 0, 'duplicate': 0}
+
+        conn = tmp_db._get_connection()
+        ids_before = dict(conn.execute("SELECT phone_number, id FROM subscriptions").fetchall())
+        tmp_db._release_connection(conn)
+
+        second = agent.process(members_frame(week_two), "w2.xlsx", user_id=1, gym_name="Test Gym", delta=True)
+        assert second['success'], second.get('error')
+        assert second['batch_id'] == first['batch_id'] != second['delta_batch_id']
+        assert second['delta'] == {'insert': 1, 'update': 4, 'remove': 1, 'unchanged': 5, 'duplicate': 1}, second['delta']
+        assert tmp_db.get_member_changes(second['delta_batch_id']) == {'insert': 1, 'update': 4, 'remove': 1}
+        assert len(second['messages']) == 5
+
+        # The live batch now matches a full upload of the same file
+        full = agent.process(members_frame(week_two).drop_duplicates('phone_number', keep='last'),
+                             "w2.xlsx", user_id=2, gym_name="Test Gym")
+        assert listed(tmp_db, second['batch_id']) == listed(tmp_db, full['batch_id'])
+        assert second['cluster_counts'] == full['cluster_counts']
+        assert second['total_processed'] == full['total_processed']
+
+        # Unchanged members kept their rows; the table did not grow
+        conn = tmp_db._get_connection()
+        ids_after = dict(conn.execute(
+            "SELECT phone_number, id FROM subscriptions WHERE upload_batch_id = ?", (second['batch_id'],)
+        ).fetchall())
+        tmp_db._release_connection(conn)
+        kept = [phone for phone in ids_after if phone in ids_before]
+        assert len(kept) == 9 and all(ids_after[phone] == ids_before[phone] for phone in kept)
+        assert len(ids_after) == len(tmp_db.get_members(1)) == 10
+
+        # The Messages page and the daily refresh follow the live batch
+        assert tmp_db.get_latest_batch_id(1) == first['batch_id']
+        history = tmp_db.get_upload_history(1)
+        assert history[0]['base_batch_id'] == first['batch_id'] and history[0]['batch_id'] == second['delta_batch_id']
+
+        # Re-uploading the same file changes nothing
+        again = agent.process(members_frame(week_two), "w2.xlsx", user_id=1, gym_name="Test Gym", delta=True)
+        assert again['delta']['unchanged'] == 10 and not again['messages']
+        assert tmp_db.get_member_changes(again['delta_batch_id']) == {'insert': 0, 'update': 0, 'remove': 0}
+        assert listed(tmp_db, first['batch_id']) == listed(tmp_db, full['batch_id'])
+
+        # A member whose row now fails validation is kept, not removed
+        from services.job_queue import JobQueue
+
+        def delta_file(end_dates):
+            path = os.path.join(tmp_dir, "delta.xlsx")
+            pd.DataFrame({
+                'Customer Name': [f"Member {i}" for i in range(len(end_dates))],
+                'Contact': [f"98765{i:05d}" for i in range(len(end_dates))],
+                'Subscription Start Date': [(today - timedelta(days=30)).strftime('%d-%m-%Y')] * len(end_dates),
+                'Subscription End Date': end_dates,
+            }).to_excel(path, index=False)
+            with open(path, 'rb') as handle:
+                return handle.read()
+
+        end_dates = [(today + timedelta(days=d)).strftime('%d-%m-%Y') for d in [0, 2, 20]]
+        job_queue = JobQueue(db=tmp_db, max_workers=1, upload_dir=os.path.join(tmp_dir, "uploads"))
+        valid = wait_for(job_queue, job_queue.submit_upload(4, "Test Gym", "m.xlsx", delta_file(end_dates), delta=True))
+        assert valid['status'] == 'completed' and valid['result']['delta']['insert'] == 3, valid['error']
+        invalid = wait_for(job_queue, job_queue.submit_upload(
+            4, "Test Gym", "m.xlsx", delta_file(end_dates[:1] + ["not a date"] + end_dates[2:]), delta=True
+        ))
+        assert invalid['status'] == 'completed' and invalid['result']['error_count'] == 1
+        assert invalid['result']['delta'] == {'insert': 0, 'update': 0, 'remove': 0, 'unchanged': 2, 'duplicate': 0}
+        assert len(tmp_db.get_members(4)) == 3
+        assert "Member 1" in [row['customer_name'] for row in tmp_db.get_messages_by_batch(valid['batch_id'])]
+        job_queue.shutdown()
+
+        # Exports of the live batch follow the last delta, even if an older build was still queued
+        cache = get_export_cache(tmp_db)
+        gate = threading.Event()
+        cache.executor.submit(gate.wait)
+        exporting = SubscriptionAgent(db=tmp_db)
+        live = exporting.process(members_frame(week_one), "w1.xlsx", user_id=3, gym_name="Test Gym", delta=True)
+        exporting.process(members_frame(week_two), "w2.xlsx", user_id=3, gym_name="Test Gym", delta=True)
+        gate.set()
+        with open(cache.ensure(live['batch_id'])['csv']['path'], encoding='utf-8-sig') as handle:
+            exported = handle.read()
+        assert "New Member" in exported and "Member Nine" in exported
+        cache.shutdown()
+
+        tmp_db.create_job("delta-job", 1, "Test Gym", "w2.xlsx", "unused.xlsx", options={'delta': True})
+        assert tmp_db.get_job("delta-job")['options'] == {'delta': True}
+
+    print("[OK] Delta uploads write only new, changed and removed members")
+except Exception as e:
+    print(f"[FAIL] Delta upload error: {e}")
+    import traceback
+    traceback.print_exc()
+    sys.exit(1)
+
+# Test 27: Re-uploads of the same file reuse today's results
+print("\n[TEST 27] Testing duplicate upload detection...")
+try:
+    import hashlib
+    import io
+    import tempfile
+    from agents.excel_processor import ExcelProcessor
+    from database.db_manager import DatabaseManager
+    from services.export_cache import get_export_cache
+    from services.job_queue import JobQueue
+
+    today = get_current_date_ist().replace(tzinfo=None)
+
+    def workbook(offsets):
+        buffer = io.BytesIO()
+        pd.DataFrame({
+            'Customer Name': [f"Member {i}" for i in range(len(offsets))],
+            'Contact': [f"98765{i:05d}" for i in range(len(offsets))],
+            'Subscription Start Date': [(today - timedelta(days=30)).strftime('%d-%m-%Y')] * len(offsets),
+            'Subscription End Date': [(today + timedelta(days=d)).strftime('%d-%m-%Y') for d in offsets],
+        }).to_excel(buffer, index=False)
+        return buffer.getvalue()
+
+    first_file, other_file = workbook([0, 2, 20]), workbook([5, 6])
+
+    processor = ExcelProcessor()
+    upload = io.BytesIO(first_file)
+    upload.seek(7)
+    assert processor.hash_content(upload) == hashlib.sha256(first_file).hexdigest() == processor.content_hash
+    assert upload.tell() == 7
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        tmp_db = DatabaseManager(os.path.join(tmp_dir, "test.db"))
+        queue = JobQueue(db=tmp_db, max_workers=1, upload_dir=os.path.join(tmp_dir, "uploads"))
+
+        first = wait_for(queue, queue.submit_upload(1, "Test Gym", "members.xlsx", first_file))
+        assert first['status'] == 'completed' and first['content_hash'] == hashlib.sha256(first_file).hexdigest()
+
+        # Same file again: the earlier batch and results, nothing written
+        again = wait_for(queue, queue.submit_upload(1, "Test Gym", "members.xlsx", first_file))
+        assert again['status'] == 'completed'
+        assert again['batch_id'] == first['batch_id'] and again['result']['duplicate_of'] == first['id']
+        assert again['result']['cluster_counts'] == first['result']['cluster_counts']
+        assert len(tmp_db.get_upload_history(1)) == 1
+
+        # Forced, a delta upload, another gym, or after another file: processed again
+        forced = wait_for(queue, queue.submit_upload(1, "Test Gym", "members.xlsx", first_file, force=True))
+        assert forced['batch_id'] != first['batch_id'] and 'duplicate_of' not in forced['result']
+        delta = wait_for(queue, queue.submit_upload(1, "Test Gym", "members.xlsx", first_file, delta=True))
+        assert 'duplicate_of' not in delta['result']
+        other_gym = wait_for(queue, queue.submit_upload(2, "Other Gym", "members.xlsx", first_file))
+        assert 'duplicate_of' not in other_gym['result']
+
+        # After another file, the latest upload of this file is still found by its hash
+        wait_for(queue, queue.submit_upload(1, "Test Gym", "other.xlsx", other_file))
+        after_other = wait_for(queue, queue.submit_upload(1, "Test Gym", "members.xlsx", first_file))
+        assert after_other['result']['duplicate_of'] == forced['id'] and after_other['batch_id'] == forced['batch_id']
+
+        # A delta upload is reused until another delta upload changes the live batch
+        delta_again = wait_for(queue, queue.submit_upload(1, "Test Gym", "members.xlsx", first_file, delta=True))
+        assert delta_again['result']['duplicate_of'] == delta['id']
+        wait_for(queue, queue.submit_upload(1, "Test Gym", "other.xlsx", other_file, delta=True))
+        delta_after_other = wait_for(queue, queue.submit_upload(1, "Test Gym", "members.xlsx", first_file, delta=True))
+        assert 'duplicate_of' not in delta_after_other['result']
+        assert delta_after_other['batch_id'] == delta['batch_id']
+
+        conn = tmp_db._get_connection()
+        plan = " ".join(row[3] for row in conn.execute(
+            """EXPLAIN QUERY PLAN SELECT * FROM jobs
+            WHERE user_id = ? AND content_hash = ? AND finished_at >= ? AND status = 'completed'""", (1, "x", "y")
+        ))
+        tmp_db._release_connection(conn)
+        assert "idx_jobs_user_hash_finished" in plan, plan
+
+        # Processed on an earlier day: processed again
+        conn = tmp_db._get_connection()
+        conn.execute("UPDATE jobs SET finished_at = ? WHERE user_id = 1", (datetime.now() - timedelta(days=1),))
+        conn.commit()
+        tmp_db._release_connection(conn)
+        next_day = wait_for(queue, queue.submit_upload(1, "Test Gym", "members.xlsx", first_file))
+        assert 'duplicate_of' not in next_day['result']
+        assert len(tmp_db.get_upload_history(1)) == 7
+
+        queue.shutdown()
+        get_export_cache(tmp_db).shutdown()
+
+    print("[OK] Identical files processed earlier the same day reuse that batch unless forced")
+except Exception as e:
+    print(f"[FAIL] Duplicate upload error: {e}")
+    import traceback
+    traceback.print_exc()
+    sys.exit(1)
+
+# Test 28: Dry run counts clusters from the end dates alone
+print("\n[TEST 28] Testing dry-run cluster preview...")
+try:
+    import io
+    import re
+    import tempfile
+    import zipfile
+    from agents.excel_processor import ExcelProcessor
+    from agents.subscription_agent import SubscriptionAgent
+    from benchmarks.synthetic import SyntheticUpload, write_xlsx
+    from database.db_manager import DatabaseManager
+    from utils.xlsx_columns import UnsupportedSheet, read_column
+
+    today = get_current_date_ist().replace(tzinfo=None)
+    offsets = [-3, 0, 1, 2, 3, 5, 7, 12, 30, 31, 90]
+    members = pd.DataFrame({
+        'Customer Name': [f"Member {i}" for i in range(len(offsets) + 3)],
+        'Contact': [f"98765{i:05d}" for i in range(len(offsets) + 3)],
+        'Subscription Start Date': [(today - timedelta(days=400)).strftime('%d-%m-%Y')] * (len(offsets) + 3),
+        'Subscription End Date': [(today + timedelta(days=d)).strftime(fmt) for d, fmt in
+                                  zip(offsets, ['%d-%m-%Y', '%d/%m/%Y', '%Y-%m-%d'] * 4)]
+                                 + ["31-02-2026", None, "soon"],
+    }, dtype=object)
+
+    def to_bytes(frame, write_only):
+        buffer = io.BytesIO()
+        if write_only:
+            write_xlsx(frame, buffer)
+        else:
+            frame.to_excel(buffer, index=False)
+        return buffer.getvalue()
+
+    def rewritten(data, prefix, pattern, replacement):
+        # Valid .xlsx that the XML reader rejects, to exercise the openpyxl fallback
+        source, target = zipfile.ZipFile(io.BytesIO(data)), io.BytesIO()
+        with zipfile.ZipFile(target, 'w') as archive:
+            for name in source.namelist():
+                part = source.read(name)
+                if name.startswith(prefix):
+                    part = re.sub(pattern, replacement, part)
+                archive.writestr(name, part)
+        return target.getvalue()
+
+    def without_cell_references(data):
+        return rewritten(data, 'xl/worksheets/', rb'<c r="[A-Z]+\d+"', b'<c')
+
+    def with_row_spans_first(data):
+        # The header row keeps its reference first, so only the data rows differ
+        return rewritten(data, 'xl/worksheets/', rb'<row r="(?!1")(\d+)"', rb'<row spans="1:4" r="\1"')
+
+    def with_1904_dates(data):
+        return rewritten(data, 'xl/workbook.xml', rb'<workbookPr\b', b'<workbookPr date1904="1"')
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        tmp_db = DatabaseManager(os.path.join(tmp_dir, "test.db"))
+        agent = SubscriptionAgent(db=tmp_db, build_exports=False)
+
+        shared = to_bytes(members, write_only=False)
+        for data in (shared, to_bytes(members, write_only=True), without_cell_references(shared),
+                     with_row_spans_first(shared), with_1904_dates(shared)):
+            success, _, end_dates, errors = ExcelProcessor().process_end_dates(SyntheticUpload(data, "m.xlsx"))
+            assert success and len(end_dates) == len(offsets)
+            assert [error.split(':')[0] for error in errors] == ["Row 13", "Row 14", "Row 15"], errors
+
+            result = agent.process(end_dates, "m.xlsx", dry_run=True)
+            assert result['success'] and result['dry_run']
+            assert result['cluster_counts'] == {1: 3, 3: 2, 7: 2, 30: 2}, result['cluster_counts']
+            assert result['beyond_window'] == 2 and result['total_processed'] == 9
+            assert [row['row'] for row in result['preview']] == [2, 3, 4, 5, 6]
+            assert result['preview'][0]['days_remaining'] == -3 and result['preview'][0]['cluster'] == 1
+
+        # Same counts as the full agent; the dry run wrote nothing
+        assert tmp_db.get_upload_history(1) == []
+        success, _, cleaned, _ = ExcelProcessor().process_file(SyntheticUpload(shared, "m.xlsx"), streaming=True)
+        full = agent.process(cleaned, "m.xlsx", user_id=1, gym_name="Test Gym")
+        assert full['cluster_counts'] == result['cluster_counts']
+
+    for data in (without_cell_references(shared), with_row_spans_first(shared), with_1904_dates(shared)):
+        try:
+            read_column(io.BytesIO(data), lambda header: 3)
+            raise AssertionError("An unsupported sheet was read")
+        except UnsupportedSheet:
+            pass
+
+    # Blank rows keep their place: errors and the preview cite the sheet's rows
+    from openpyxl import Workbook
+    from openpyxl.styles import Font
+    workbook = Workbook()
+    sheet = workbook.active
+    sheet.append(list(members.columns))
+    sheet.append([None] * 4)                                                      # row 2: blank
+    sheet.append(["Amit Singh", "98765 43210", "01-01-2026", (today + timedelta(days=2)).strftime('%d-%m-%Y')])
+    sheet.append([None] * 4)                                                      # row 4: blank
+    sheet.append(["Ravi Kumar", "98765 43211", "01-01-2026", "soon"])             # row 5: bad end date
+    sheet.cell(row=6, column=2).font = Font(bold=True)                            # row 6: formatted, blank
+    sheet.append(["Priya Sharma", "98765 43212", "01-01-2026", (today + timedelta(days=9)).strftime('%d-%m-%Y')])
+    sheet.cell(row=9, column=2).font = Font(bold=True)                            # trailing, dropped
+    buffer = io.BytesIO()
+    workbook.save(buffer)
+    blank_rows = buffer.getvalue()
+
+    _, _, _, full_errors = ExcelProcessor().process_file(SyntheticUpload(blank_rows, "m.xlsx"), streaming=True)
+    full_error_rows = [error.split(':')[0] for error in full_errors]
+    assert full_error_rows == ["Row 2", "Row 4", "Row 5", "Row 6"], full_errors
+    for data in (blank_rows, without_cell_references(blank_rows)):
+        success, _, end_dates, errors = ExcelProcessor().process_end_dates(SyntheticUpload(data, "m.xlsx"))
+        assert success and [error.split(':')[0] for error in errors] == full_error_rows, errors
+        result = agent.process(end_dates, "m.xlsx", dry_run=True)
+        assert [row['row'] for row in result['preview']] == [3, 7], result['preview']
+
+    renamed = members.rename(columns={'Contact': 'Email'})
+    success, message, _, _ = ExcelProcessor().process_end_dates(
+        SyntheticUpload(to_bytes(renamed, write_only=True), "m.xlsx")
+    )
+    assert not success and message == "Missing required columns: contact", message
+
+    print("[OK] Dry run counts clusters from end dates only, matching the agent, without writes")
+except Exception as e:
+    print(f"[FAIL] Dry run error: {e}")
+    import traceback
+    traceback.print_exc()
+    sys.exit(1)
+
+# Test 29: Streaming reader keeps row numbers across blank rows
+print("\n[TEST 29] Testing streamed row numbers with blank rows...")
+try:
+    import io
+    from openpyxl import Workbook
+    from openpyxl.styles import Font
+    from agents.excel_processor import ExcelProcessor
+    from benchmarks.synthetic import SyntheticUpload
+
+    end_date = (get_current_date_ist() + timedelta(days=5)).strftime('%d-%m-%Y')
+    workbook = Workbook()
+    sheet = workbook.active
+    sheet.append(['Customer Name', 'Contact', 'Subscription Start Date', 'Subscription End Date'])
+    sheet.append([None] * 4)                                            # row 2: blank
+    sheet.append(['Amit Singh', '98765 43210', '01-01-2026', end_date])
+    sheet.append([None] * 4)                                            # row 4: blank
+    sheet.append([None] * 4)                                            # row 5: blank
+    sheet.append(['Priya Sharma', '98765', '01-01-2026', end_date])     # row 6: phone too short
+    sheet.append(['Ravi Kumar', '98765 43211', '01-01-2026', end_date])
+    sheet.cell(row=10, column=2).font = Font(bold=True)                 # trailing formatted blank row
+    buffer = io.BytesIO()
+    workbook.save(buffer)
+    data = buffer.getvalue()
+
+    expected = pd.read_excel(io.BytesIO(data))
+    processor = ExcelProcessor()
+    is_valid, _, chunks = processor.load_stream(io.BytesIO(data), chunk_size=2)
+    streamed = pd.concat(chunks)
+    assert is_valid and len(streamed) == len(expected) == 6, (len(streamed), len(expected))
+    assert list(streamed.index) == list(expected.index)
+    assert streamed['customer_name'].isna().tolist() == expected['Customer Name'].isna().tolist()
+
+    streaming = ExcelProcessor().process_file(SyntheticUpload(data, "m.xlsx"), streaming=True)
+    whole = ExcelProcessor().process_file(SyntheticUpload(data, "m.xlsx"))
+    assert streaming[1] == whole[1], (streaming[1], whole[1])
+    assert [error.split(':')[0] for error in streaming[3]] == [error.split(':')[0] for error in whole[3]]
+    assert "Row 6: Phone number too short: 98765" in streaming[3], streaming[3]
+    assert streaming[2]['customer_name'].tolist() == ['Amit Singh', 'Ravi Kumar']
+
+    print("[OK] Streamed rows keep Excel row numbers and totals across blank rows")
+except Exception as e:
+    print(f"[FAIL] Streamed row numbers error: {e}")
+    import traceback
+    traceback.print_exc()
+    sys.exit(1)
+
 print("\n" + "=" * 60)
 print("ALL TESTS PASSED!")
 print("=" * 60)
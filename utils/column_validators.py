@@ -0,0 +1,254 @@
+"""Column-wise validation for member data frames.
+
+Vectorized counterpart of the per-row validators in utils.validators. The
+rules, error messages and their priority within a row are the same; the
+per-row functions remain the reference implementation.
+"""
+
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+import pandas as pd
+from utils.validators import (
+    validate_phone_number,
+    validate_date_format,
+    validate_date_range,
+    validate_customer_name
+)
+
+
+# Tried in order, same as validate_date_format
+DATE_FORMATS = ["%d-%m-%Y", "%d/%m/%Y", "%Y-%m-%d"]
+
+# Row outcome codes, in the order the per-row validators check them
+OK = 0
+NAME_EMPTY = 1
+NAME_TOO_SHORT = 2
+PHONE_EMPTY = 3
+PHONE_TOO_SHORT = 4
+START_DATE_INVALID = 5
+END_DATE_INVALID = 6
+END_BEFORE_START = 7
+SCALAR_FALLBACK = 8  # Date valid for strptime but outside pandas' range
+
+OUTPUT_COLUMNS = [
+    'customer_name',
+    'phone_number',
+    'subscription_start_date',
+    'subscription_end_date'
+]
+
+
+def _as_objects(column: pd.Series) -> np.ndarray:
+    """Return column values as Python objects (like df.iterrows() yields)."""
+    return column.to_numpy(dtype=object)
+
+
+def _is_falsy(values: np.ndarray) -> np.ndarray:
+    """Element-wise `not value`, matching the `if not x` checks."""
+    return ~values.astype(bool)
+
+
+def _as_text(values: np.ndarray) -> pd.Series:
+    """Element-wise str(value)."""
+    return pd.Series(values, dtype=object).astype(str)
+
+
+def validate_name_column(values: np.ndarray) -> Tuple[np.ndarray, np.ndarray, pd.Series]:
+    """
+    Validate customer names.
+    Returns (empty_mask, too_short_mask, stripped_names).
+    """
+    stripped = _as_text(values).str.strip()
+    empty = _is_falsy(values) | (stripped == '').to_numpy()
+    too_short = ~empty & (stripped.str.len() < 2).to_numpy()
+    return empty, too_short, stripped
+
+
+def validate_phone_column(values: np.ndarray) -> Tuple[np.ndarray, np.ndarray, pd.Series, pd.Series]:
+    """
+    Validate and format Indian phone numbers.
+    Returns (empty_mask, too_short_mask, formatted_numbers, original_text).
+    """
+    text = _as_text(values)
+    digits = text.str.replace(r'\D', '', regex=True)
+    empty = _is_falsy(values)
+    too_short = ~empty & (digits.str.len() < 10).to_numpy()
+    formatted = '+91-' + digits.str[-10:]
+    return empty, too_short, formatted, text
+
+
+def parse_date_column(values: np.ndarray) -> Tuple[pd.Series, Dict[int, str], Dict[int, object]]:
+    """
+    Parse dates trying each of DATE_FORMATS as a whole-column pass.
+
+    Values no pass could parse are re-checked with validate_date_format,
+    which supplies the exact error message (or, rarely, a date outside the
+    range pandas can represent).
+
+    Returns (parsed, errors_by_position, out_of_range_by_position).
+    """
+    stripped = _as_text(values).str.strip()
+    parsed = pd.Series(pd.NaT, index=stripped.index, dtype='datetime64[ns]')
+
+    remaining = ~_is_falsy(values)
+    for date_format in DATE_FORMATS:
+        if not remaining.any():
+            break
+        attempt = pd.to_datetime(stripped[remaining], format=date_format, errors='coerce')
+        parsed[remaining] = attempt
+        remaining[remaining] = attempt.isna().to_numpy()
+
+    errors = {}
+    out_of_range = {}
+
+    # Empty values and whatever the vectorized passes rejected
+    for pos in np.flatnonzero(pd.isna(parsed).to_numpy()):
+        is_valid, error, date_obj = validate_date_format(values[pos])
+        if is_valid:
+            out_of_range[pos] = date_obj
+        else:
+            errors[pos] = error
+
+    return parsed, errors, out_of_range
+
+
+def _validate_row(row_num: int, name, phone, start, end) -> Tuple[Optional[str], Optional[Dict]]:
+    """Validate one row with the per-row validators. Returns (error, cleaned_row)."""
+    is_valid, error = validate_customer_name(name)
+    if not is_valid:
+        return f"Row {row_num}: {error}", None
+
+    is_valid, error, formatted_phone = validate_phone_number(phone)
+    if not is_valid:
+        return f"Row {row_num}: {error}", None
+
+    is_valid, error, start_date = validate_date_format(start)
+    if not is_valid:
+        return f"Row {row_num}: Start date - {error}", None
+
+    is_valid, error, end_date = validate_date_format(end)
+    if not is_valid:
+        return f"Row {row_num}: End date - {error}", None
+
+    is_valid, error = validate_date_range(start_date, end_date)
+    if not is_valid:
+        return f"Row {row_num}: {error}", None
+
+    return None, {
+        'customer_name': str(name).strip(),
+        'phone_number': formatted_phone,
+        'subscription_start_date': start_date.strftime('%Y-%m-%d'),
+        'subscription_end_date': end_date.strftime('%Y-%m-%d'),
+    }
+
+
+def validate_member_columns(df: pd.DataFrame) -> Tuple[pd.DataFrame, List[str]]:
+    """
+    Validate and clean member rows column by column.
+
+    Expects the standard column names (customer_name, phone_number,
+    start_date, end_date). Row numbers in errors are Excel row numbers
+    (index + 2, for the 1-indexed sheet and header row).
+
+    Returns (cleaned_dataframe, list_of_errors).
+    """
+    if df.empty:
+        return pd.DataFrame(), []
+
+    row_nums = np.asarray(df.index) + 2
+
+    names = _as_objects(df['customer_name'])
+    phones = _as_objects(df['phone_number'])
+    starts = _as_objects(df['start_date'])
+    ends = _as_objects(df['end_date'])
+
+    name_empty, name_short, clean_names = validate_name_column(names)
+    phone_empty, phone_short, clean_phones, phone_text = validate_phone_column(phones)
+    start_parsed, start_errors, start_out_of_range = parse_date_column(starts)
+    end_parsed, end_errors, end_out_of_range = parse_date_column(ends)
+
+    start_invalid = np.zeros(len(df), dtype=bool)
+    start_invalid[list(start_errors)] = True
+    end_invalid = np.zeros(len(df), dtype=bool)
+    end_invalid[list(end_errors)] = True
+
+    scalar_rows = np.zeros(len(df), dtype=bool)
+    scalar_rows[list(start_out_of_range)] = True
+    scalar_rows[list(end_out_of_range)] = True
+
+    end_before_start = (end_parsed < start_parsed).to_numpy()
+
+    # First failing check wins, as in the per-row validators
+    codes = np.select(
+        [
+            name_empty,
+            name_short,
+            phone_empty,
+            phone_short,
+            start_invalid,
+            end_invalid,
+            scalar_rows,
+            end_before_start,
+        ],
+        [
+            NAME_EMPTY,
+            NAME_TOO_SHORT,
+            PHONE_EMPTY,
+            PHONE_TOO_SHORT,
+            START_DATE_INVALID,
+            END_DATE_INVALID,
+            SCALAR_FALLBACK,
+            END_BEFORE_START,
+        ],
+        default=OK
+    )
+
+    # Error messages are only built for failing rows
+    errors = []
+    fallback_rows = {}
+    for pos in np.flatnonzero(codes):
+        row_num = row_nums[pos]
+        code = codes[pos]
+        if code == NAME_EMPTY:
+            errors.append(f"Row {row_num}: Customer name is empty")
+        elif code == NAME_TOO_SHORT:
+            errors.append(f"Row {row_num}: Customer name too short")
+        elif code == PHONE_EMPTY:
+            errors.append(f"Row {row_num}: Phone number is empty")
+        elif code == PHONE_TOO_SHORT:
+            errors.append(f"Row {row_num}: Phone number too short: {phone_text.iat[pos]}")
+        elif code == START_DATE_INVALID:
+            errors.append(f"Row {row_num}: Start date - {start_errors[pos]}")
+        elif code == END_DATE_INVALID:
+            errors.append(f"Row {row_num}: End date - {end_errors[pos]}")
+        elif code == END_BEFORE_START:
+            errors.append(f"Row {row_num}: End date cannot be before start date")
+        else:
+            error, cleaned_row = _validate_row(row_num, names[pos], phones[pos], starts[pos], ends[pos])
+            if error:
+                errors.append(error)
+            else:
+                fallback_rows[pos] = cleaned_row
+
+    valid = codes == OK
+    if fallback_rows:
+        valid[list(fallback_rows)] = True
+
+    if not valid.any():
+        return pd.DataFrame(), errors
+
+    cleaned_df = pd.DataFrame({
+        'customer_name': clean_names[valid].to_numpy(),
+        'phone_number': clean_phones[valid].to_numpy(),
+        'subscription_start_date': start_parsed[valid].dt.strftime('%Y-%m-%d').to_numpy(),
+        'subscription_end_date': end_parsed[valid].dt.strftime('%Y-%m-%d').to_numpy(),
+    }, columns=OUTPUT_COLUMNS)
+
+    if fallback_rows:
+        valid_positions = np.flatnonzero(valid)
+        for pos, cleaned_row in fallback_rows.items():
+            out_pos = np.searchsorted(valid_positions, pos)
+            for column, value in cleaned_row.items():
+                cleaned_df.iat[out_pos, cleaned_df.columns.get_loc(column)] = value
+
+    return cleaned_df, errors
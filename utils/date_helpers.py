@@ -2,12 +2,19 @@
 
 from datetime import datetime, timedelta
 from dateutil import tz
-from typing import Tuple
+from typing import Tuple, Optional
+import numpy as np
+import pandas as pd
 
 
 # IST timezone
 IST = tz.gettz('Asia/Kolkata')
 
+# Inclusive upper bound of each expiry cluster (see classify_by_expiry);
+# anything above the last bound falls into cluster 0
+CLUSTER_BOUNDARIES = np.array([1, 3, 7, 30])
+CLUSTER_BY_BUCKET = np.array([1, 3, 7, 30, 0])
+
 
 def get_current_date_ist() -> datetime:
     """Get current date in IST timezone."""
@@ -66,6 +73,39 @@ def classify_by_expiry(days_remaining: int) -> int:
         return 0  # Skip - more than 30 days
 
 
+def calculate_days_remaining_series(end_dates: pd.Series,
+                                    today: Optional[datetime] = None) -> pd.Series:
+    """
+    Vectorized calculate_days_remaining for a column of end dates.
+
+    Args:
+        end_dates: Series of date strings in 'YYYY-MM-DD' format
+        today: Naive IST midnight to count from (defaults to today in IST)
+
+    Returns:
+        Series of days remaining (negative if expired), same index
+    """
+    if today is None:
+        today = get_current_date_ist().replace(tzinfo=None)
+
+    parsed = pd.to_datetime(end_dates, format='%Y-%m-%d')
+    return (parsed - pd.Timestamp(today)).dt.days.astype('int64')
+
+
+def classify_by_expiry_series(days_remaining: pd.Series) -> pd.Series:
+    """
+    Vectorized classify_by_expiry: bucket lookup over CLUSTER_BOUNDARIES.
+
+    Args:
+        days_remaining: Series of days until expiry
+
+    Returns:
+        Series of cluster numbers (1, 3, 7, 30, or 0), same index
+    """
+    buckets = np.searchsorted(CLUSTER_BOUNDARIES, days_remaining.to_numpy(), side='left')
+    return pd.Series(CLUSTER_BY_BUCKET[buckets], index=days_remaining.index)
+
+
 def get_expiry_text(days_remaining: int) -> str:
     """
     Get human-readable expiry text.
@@ -0,0 +1,241 @@
+"""Optional per-batch tracing of processing stages and database queries.
+
+Set HERCULES_TRACE=1 to record wall time, CPU time, row counts and peak
+memory for every span. Spans are appended as JSON lines to
+<HERCULES_TRACE_DIR>/<batch_id>.jsonl (default directory: traces/);
+queries run outside a batch go to queries.jsonl.
+
+The switch is read once at import. When it is off, span() returns a
+shared no-op object and traced_query() leaves methods undecorated.
+"""
+
+import contextvars
+import functools
+import json
+import os
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Callable, Iterator, Optional, Tuple
+
+
+ENABLED = os.environ.get("HERCULES_TRACE", "").lower() in ("1", "true", "yes", "on")
+TRACE_DIR = os.environ.get("HERCULES_TRACE_DIR", "traces")
+
+UNBATCHED_TRACE = "queries"
+
+_current_trace: contextvars.ContextVar = contextvars.ContextVar("hercules_trace", default=None)
+# Spans open in this context (thread), innermost last
+_open_spans: contextvars.ContextVar = contextvars.ContextVar("hercules_open_spans", default=())
+_write_lock = threading.Lock()
+
+# Spans open in the whole process, and whether tracemalloc was started for them
+_memory_lock = threading.Lock()
+_memory_spans = 0
+_started_tracemalloc = False
+
+
+class Span:
+    """One timed section of work."""
+
+    def __init__(self, trace: "Trace", name: str, rows: Optional[int] = None):
+        self.trace = trace
+        self.name = name
+        self.rows = rows
+        self.wall_start = 0.0
+        self.cpu_start = 0.0
+        self.mem_start = 0
+        self.mem_peak = 0
+
+    def to_record(self, wall_s: float, cpu_s: float) -> dict:
+        return {
+            'batch_id': self.trace.batch_id,
+            'span': self.name,
+            'wall_s': round(wall_s, 6),
+            'cpu_s': round(cpu_s, 6),
+            'rows': self.rows,
+            'peak_mem_bytes': self.mem_peak - self.mem_start,
+            'thread': threading.current_thread().name,
+            'ended_at': datetime.now().isoformat(),
+        }
+
+
+class _NoOpSpan:
+    """Stand-in returned by span() when tracing is off."""
+
+    rows = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def __setattr__(self, name, value):
+        pass
+
+
+_NO_OP_SPAN = _NoOpSpan()
+
+
+class Trace:
+    """
+    JSON-lines trace for one batch.
+
+    Peak memory comes from tracemalloc, which is process-wide: with several
+    uploads processing at once a span's peak includes the others' allocations.
+    tracemalloc is started by the first open span if nothing else started
+    it, and stopped again when the last open span ends. CPU time is per
+    thread.
+
+    Enclosing spans are tracked per thread (in a context variable), so
+    spans of a trace shared by several threads only nest within their own
+    thread.
+    """
+
+    def __init__(self, batch_id: Optional[str] = None, trace_dir: Optional[str] = None):
+        self.batch_id = batch_id
+        self.trace_dir = trace_dir or TRACE_DIR
+        self.path = os.path.join(self.trace_dir, f"{batch_id or UNBATCHED_TRACE}.jsonl")
+
+    def _parents(self) -> Tuple[Span, ...]:
+        """Spans of this trace enclosing the current one in this thread."""
+        return tuple(span for span in _open_spans.get() if span.trace is self)
+
+    @contextmanager
+    def span(self, name: str, rows: Optional[int] = None) -> Iterator[Span]:
+        """Time a block. Set span.rows inside the block to record a row count."""
+        span = Span(self, name, rows)
+        _start_memory_tracing()
+
+        # Fold the peak so far into enclosing spans before resetting it
+        current, peak = tracemalloc.get_traced_memory()
+        for parent in self._parents():
+            parent.mem_peak = max(parent.mem_peak, peak)
+        tracemalloc.reset_peak()
+
+        span.mem_start = span.mem_peak = current
+        token = _open_spans.set(_open_spans.get() + (span,))
+        span.wall_start = time.perf_counter()
+        span.cpu_start = time.thread_time()
+
+        try:
+            yield span
+        finally:
+            wall_s = time.perf_counter() - span.wall_start
+            cpu_s = time.thread_time() - span.cpu_start
+            span.mem_peak = max(span.mem_peak, tracemalloc.get_traced_memory()[1])
+            _stop_memory_tracing()
+
+            _open_spans.reset(token)
+            for parent in self._parents():
+                parent.mem_peak = max(parent.mem_peak, span.mem_peak)
+
+            self.write(span.to_record(wall_s, cpu_s))
+
+    def write(self, record: dict):
+        """Append one record to the trace file."""
+        line = json.dumps(record, default=str)
+        with _write_lock:
+            os.makedirs(self.trace_dir, exist_ok=True)
+            with open(self.path, 'a', encoding='utf-8') as handle:
+                handle.write(line + "\n")
+
+
+def _start_memory_tracing():
+    """Count a span as open, starting tracemalloc for the first one if it is off."""
+    global _memory_spans, _started_tracemalloc
+    with _memory_lock:
+        if _memory_spans == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            _started_tracemalloc = True
+        _memory_spans += 1
+
+
+def _stop_memory_tracing():
+    """Count a span as ended, stopping tracemalloc after the last one if it was started here."""
+    global _memory_spans, _started_tracemalloc
+    with _memory_lock:
+        _memory_spans -= 1
+        if _memory_spans == 0 and _started_tracemalloc:
+            tracemalloc.stop()
+            _started_tracemalloc = False
+
+
+def current_trace() -> Optional[Trace]:
+    """Trace of the batch being processed in this context, if any."""
+    return _current_trace.get()
+
+
+@contextmanager
+def batch_trace(batch_id: str) -> Iterator[Optional[Trace]]:
+    """
+    Route spans opened in this block to the batch's trace.
+
+    Nested calls for the same batch reuse the active trace. Yields None
+    when tracing is off.
+    """
+    if not ENABLED:
+        yield None
+        return
+
+    active = _current_trace.get()
+    if active is not None and active.batch_id == batch_id:
+        yield active
+        return
+
+    token = _current_trace.set(Trace(batch_id))
+    try:
+        yield _current_trace.get()
+    finally:
+        _current_trace.reset(token)
+
+
+def span(name: str, rows: Optional[int] = None):
+    """
+    Time a block in the active batch trace.
+
+    Returns a no-op context manager when tracing is off or no batch is
+    being traced.
+    """
+    if not ENABLED:
+        return _NO_OP_SPAN
+
+    trace = _current_trace.get()
+    if trace is None:
+        return _NO_OP_SPAN
+    return trace.span(name, rows)
+
+
+def _count_rows(result) -> Optional[int]:
+    """Row count of a query method's return value."""
+    if isinstance(result, (list, tuple)):
+        return len(result)
+    if isinstance(result, dict):
+        return 1
+    return None
+
+
+def traced_query(func: Callable) -> Callable:
+    """
+    Record duration and row count of a DatabaseManager method.
+
+    Queries run outside a batch trace are written to queries.jsonl. The
+    method is returned unchanged when tracing is off.
+    """
+    if not ENABLED:
+        return func
+
+    name = f"db.{func.__name__}"
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        trace = _current_trace.get() or Trace()
+        with trace.span(name) as query_span:
+            result = func(*args, **kwargs)
+            query_span.rows = _count_rows(result)
+        return result
+
+    return wrapper
@@ -5,6 +5,11 @@ from datetime import datetime
 from typing import Tuple, Optional
 
 
+# Upload size limits: whole-workbook loading vs. streaming read-only mode
+MAX_FILE_SIZE_MB = 10
+STREAMING_MAX_FILE_SIZE_MB = 500
+
+
 def validate_phone_number(phone: str) -> Tuple[bool, str, Optional[str]]:
     """
     Validate and format Indian phone number.
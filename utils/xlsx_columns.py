@@ -0,0 +1,287 @@
+"""Read a single column of an .xlsx sheet without openpyxl.
+
+openpyxl builds a value for every cell of every row, which dominates the
+time to read a large upload. When only one column is needed (e.g. the end
+dates for a dry run), the sheet XML is instead scanned block by block for
+that column's cells, with regular expressions over the raw bytes.
+
+Values come back as the text openpyxl would give for text cells. Other
+cells (numbers, dates, booleans, errors) come back as their raw XML value
+wrapped in RawValue, so callers can tell them apart.
+
+Anything this reader does not understand (e.g. cells without a reference,
+rows whose first attribute is not their number, prefixed element names,
+or workbooks counting dates from 1904) raises UnsupportedSheet; callers
+fall back to openpyxl.
+"""
+
+import html
+import posixpath
+import re
+import zipfile
+from typing import Callable, Dict, List, Optional, Tuple
+
+
+# Decompressed bytes scanned at a time
+BLOCK_BYTES = 8 * 1024 * 1024
+
+_ATTRIBUTES = re.compile(rb'([\w:]+)="([^"]*)"')
+# Start tags of rows with cells (self-closing rows have none)
+_ROW = re.compile(rb'<row r="(\d+)"[^>/]*>')
+_ANY_ROW = re.compile(rb'<row[\s/>]')
+_DATE_1904 = re.compile(rb'<workbookPr\b[^>]*\bdate1904="(?:1|true)"')
+_CELL = re.compile(rb'<c r="([A-Z]+)\d+"([^>/]*)(?:/>|>(.*?)</c>)', re.S)
+_VALUE = re.compile(rb'<v>([^<]*)</v>')
+_TEXT = re.compile(rb'<t\b[^>]*>([^<]*)</t>')
+_PHONETIC = re.compile(rb'<rPh\b.*?</rPh>', re.S)
+_SHARED_STRING = re.compile(rb'<si>(.*?)</si>|<si/>', re.S)
+
+
+class UnsupportedSheet(ValueError):
+    """The sheet uses XML this reader does not handle; read it with openpyxl."""
+
+
+class RawValue(str):
+    """A non-text cell's raw XML value (number, date serial, boolean, error)."""
+
+
+def column_index(letters: str) -> int:
+    """Zero-based index of a column reference (A -> 0, AA -> 26)."""
+    index = 0
+    for letter in letters:
+        index = index * 26 + ord(letter) - ord('A') + 1
+    return index - 1
+
+
+def column_letters(index: int) -> str:
+    """Column reference of a zero-based index (0 -> A, 26 -> AA)."""
+    letters = ''
+    index += 1
+    while index:
+        index, remainder = divmod(index - 1, 26)
+        letters = chr(ord('A') + remainder) + letters
+    return letters
+
+
+def _attributes(text: bytes) -> Dict[bytes, bytes]:
+    return dict(_ATTRIBUTES.findall(text))
+
+
+def _text(inner: bytes) -> str:
+    """Concatenated <t> runs of a string item, without phonetic runs."""
+    if b'<rPh' in inner:
+        inner = _PHONETIC.sub(b'', inner)
+    return html.unescape(b''.join(_TEXT.findall(inner)).decode('utf-8'))
+
+
+def _blocks(stream, end_tag: bytes):
+    """Decompressed XML cut after the last end_tag of each block."""
+    pending = b''
+    while True:
+        block = stream.read(BLOCK_BYTES)
+        if not block:
+            if pending:
+                yield pending
+            return
+        pending += block
+        cut = pending.rfind(end_tag)
+        if cut != -1:
+            cut += len(end_tag)
+            yield pending[:cut]
+            pending = pending[cut:]
+
+
+def _active_sheet_paths(archive: zipfile.ZipFile) -> Tuple[str, Optional[str]]:
+    """Paths of the active worksheet and the shared strings part."""
+    workbook = archive.read('xl/workbook.xml')
+    relationships = archive.read('xl/_rels/workbook.xml.rels')
+
+    targets = {}
+    shared_strings = None
+    for attributes in re.findall(rb'<Relationship\b([^>]*?)/?>', relationships):
+        relationship = _attributes(attributes)
+        target = relationship.get(b'Target', b'').decode('utf-8')
+        target = target.lstrip('/') if target.startswith('/') else posixpath.join('xl', target)
+        targets[relationship.get(b'Id')] = target
+        if relationship.get(b'Type', b'').endswith(b'/sharedStrings'):
+            shared_strings = target
+
+    # Date serials would need the 1904 epoch
+    if _DATE_1904.search(workbook):
+        raise UnsupportedSheet("Workbook uses the 1904 date system")
+
+    sheets = [_attributes(attributes) for attributes in re.findall(rb'<sheet\b([^>]*?)/?>', workbook)]
+    if not sheets:
+        raise UnsupportedSheet("No worksheets found")
+
+    view = re.search(rb'<workbookView\b([^>]*?)/?>', workbook)
+    active = int(_attributes(view.group(1)).get(b'activeTab', 0)) if view else 0
+    sheet = sheets[active if active < len(sheets) else 0]
+
+    relationship_id = next((value for key, value in sheet.items() if key.endswith(b':id')), None)
+    if relationship_id not in targets:
+        raise UnsupportedSheet("Worksheet part not found")
+    return targets[relationship_id], shared_strings
+
+
+def _shared_strings(archive: zipfile.ZipFile, path: Optional[str], needed: set) -> Dict[int, str]:
+    """The shared strings at the needed indexes."""
+    strings = {}
+    if not needed:
+        return strings
+    if path is None or path not in archive.namelist():
+        raise UnsupportedSheet("Shared strings part not found")
+
+    last = max(needed)
+    index = 0
+    with archive.open(path) as stream:
+        for block in _blocks(stream, b'</si>'):
+            for match in _SHARED_STRING.finditer(block):
+                if index in needed:
+                    strings[index] = _text(match.group(1) or b'')
+                index += 1
+                if index > last:
+                    return strings
+    return strings
+
+
+def _value(attributes: bytes, inner: Optional[bytes]):
+    """A cell's value: text, a shared string index (int), a RawValue, or None."""
+    if not inner:
+        return None
+    if b' t="inlineStr"' in attributes:
+        return _text(inner)
+
+    value = _VALUE.search(inner)
+    return _typed(attributes, value.group(1)) if value else None
+
+
+def _typed(attributes: bytes, text: bytes):
+    """A <v> value by cell type: shared string index (int), text, or a RawValue."""
+    if b' t="s"' in attributes:
+        return int(text)
+    if b' t="str"' in attributes:
+        return html.unescape(text.decode('utf-8'))
+    return RawValue(text.decode('utf-8'))
+
+
+def _check_references(block: bytes):
+    """Rows and cells must carry their reference as first attribute."""
+    if len(_ANY_ROW.findall(block)) != block.count(b'<row r="'):
+        raise UnsupportedSheet("Rows without leading references")
+    if block.count(b'<c ') != block.count(b'<c r="') or b'<c>' in block:
+        raise UnsupportedSheet("Cells without references")
+
+
+def _has_value(row_inner: bytes) -> bool:
+    return b'<v>' in row_inner or b'<is>' in row_inner
+
+
+def _without_blank_rows(block: bytes, rows: List[bytes], cells: Dict[bytes, object]) -> List[bytes]:
+    """
+    Drop rows without any value (e.g. only formatted cells).
+
+    Only rows whose column cell is empty can be blank; each of those is
+    looked up in the block, in order.
+    """
+    blank = set()
+    position = 0
+    for row in rows:
+        if cells.get(row) is None:
+            start = block.find(b'<row r="' + row + b'"', position)
+            position = block.find(b'</row>', start)
+            if not _has_value(block[start:position]):
+                blank.add(row)
+    return [row for row in rows if row not in blank] if blank else rows
+
+
+def read_column(source, pick: Callable[[List[str]], Optional[int]]
+                ) -> Tuple[List[str], List[int], Optional[List[Optional[str]]]]:
+    """
+    Read the header row and one column of the active sheet.
+
+    Args:
+        source: Path or binary file object of an .xlsx workbook
+        pick: Called with the header (like load_stream builds it), returns
+            the index of the column to read, or None to read nothing more
+
+    Returns:
+        (header, rows, values). rows are the Excel row numbers of the data
+        rows holding any value, in order; rows without values are left
+        out, so callers place values by row number. values has the
+        column's value for each of those rows: the cell's text, a
+        RawValue, or None for an empty cell.
+
+    Raises:
+        UnsupportedSheet: The sheet needs openpyxl
+        zipfile.BadZipFile, KeyError: Not an .xlsx workbook
+    """
+    with zipfile.ZipFile(source) as archive:
+        sheet_path, shared_strings_path = _active_sheet_paths(archive)
+
+        header: Optional[List[str]] = None
+        rows: List[bytes] = []
+        cells: Dict[bytes, object] = {}
+
+        with archive.open(sheet_path) as stream:
+            for block in _blocks(stream, b'</row>'):
+                _check_references(block)
+
+                if header is None:
+                    first = _ROW.search(block)
+                    row_end = block.find(b'</row>', first.end()) if first else -1
+                    if first is None or first.group(1) != b'1' or not _has_value(block[first.end():row_end]):
+                        raise UnsupportedSheet("Header is not on the first row")
+                    header = _read_header(block[first.end():row_end], archive, shared_strings_path)
+
+                    index = pick(header)
+                    if index is None:
+                        return header, [], None
+                    letters = column_letters(index).encode('ascii')
+                    # Plain values and plain inline strings are captured directly
+                    cell_pattern = re.compile(
+                        rb'<c r="' + letters + rb'(\d+)"([^>/]*)'
+                        rb'(?:/>|>(?:<v>([^<]*)</v>|<is><t>([^<&]*)</t></is>|(.*?))</c>)', re.S
+                    )
+                    block = block[row_end:]
+
+                block_rows = _ROW.findall(block)
+                for row, attributes, value, text, inner in cell_pattern.findall(block):
+                    if text:
+                        cells[row] = text.decode('utf-8')
+                    elif value:
+                        cells[row] = _typed(attributes, value)
+                    else:
+                        cells[row] = _value(attributes, inner)
+                rows.extend(_without_blank_rows(block, block_rows, cells))
+
+        if header is None:
+            raise UnsupportedSheet("No rows found")
+
+        values = [cells.get(row) for row in rows]
+        row_numbers = [int(row) for row in rows]
+        needed = {value for value in values if type(value) is int}
+        if needed:
+            strings = _shared_strings(archive, shared_strings_path, needed)
+            values = [strings.get(value) if type(value) is int else value for value in values]
+
+    return header, row_numbers, values
+
+
+def _read_header(row_inner: bytes, archive: zipfile.ZipFile, shared_strings_path: Optional[str]) -> List[str]:
+    """Header names by column position, "Unnamed: i" for empty cells."""
+    cells = {
+        column_index(letters.decode('ascii')): _value(attributes, inner)
+        for letters, attributes, inner in _CELL.findall(row_inner)
+    }
+
+    needed = {value for value in cells.values() if type(value) is int}
+    strings = _shared_strings(archive, shared_strings_path, needed)
+
+    header = []
+    for i in range(max(cells) + 1 if cells else 0):
+        value = cells.get(i)
+        if type(value) is int:
+            value = strings.get(value)
+        header.append(str(value) if value is not None else f"Unnamed: {i}")
+    return header